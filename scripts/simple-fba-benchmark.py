@@ -0,0 +1,972 @@
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+
+from simple_fba.codec import (
+    CODECS,
+    get_codec,
+)
+from simple_fba.fba_consensus import (
+    Ballot,
+    BallotMessage,
+    BallotVoteResult,
+    Consensus,
+    State,
+    Storage,
+    load_message,
+)
+from simple_fba.ledger import FileLedger
+from simple_fba.metrics import Registry
+from simple_fba.network import (
+    HASH_ALGORITHMS,
+    HashVerifier,
+    LocalTransport,
+    Message,
+    Node,
+    Quorum,
+    set_hash_algorithm,
+)
+from simple_fba.signature import (
+    Keyring,
+    SignatureVerifier,
+)
+from simple_fba.simulation import (
+    ConstantLatency,
+    SimulatedNetwork,
+    SimulatedTransport,
+    Simulation,
+)
+from simple_fba.util import (
+    log,
+)
+
+
+def time_calls(timer, number, repeat):
+    '''
+    the time of one call in seconds of every round of `number` calls; the
+    `bench_*` and `micro` benchmarks are timed by it
+    '''
+    return list(map(lambda x: x / number, timer.repeat(repeat=repeat, number=number)))
+
+
+def measure(fn, number):
+    '''
+    returns the best time of one call in seconds
+    '''
+    return min(time_calls(timeit.Timer(fn), number, 5))
+
+
+Stats = collections.namedtuple('Stats', ('median', 'iqr', 'number', 'repeat'))
+
+
+def measure_stats(fn, repeat=7, warmup=1, min_time=0.05):
+    '''
+    the median and the interquartile range of the time of one call in
+    seconds; the number of calls of one round is calibrated to take about
+    `min_time` seconds and the first `warmup` rounds are dropped.
+    '''
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+
+    times = time_calls(timer, number, warmup + repeat)[warmup:]
+    if len(times) > 1:
+        q1, _, q3 = statistics.quantiles(times, n=4)
+    else:
+        q1 = q3 = times[0]
+
+    return Stats(statistics.median(times), q3 - q1, number, len(times))
+
+
+def report(name, **fields):
+    print('%-24s %s' % (name, ' '.join(map(lambda x: '%s=%s' % x, fields.items()))))
+
+    return
+
+
+def new_node(name='n0', validators=3, threshold=80):
+    quorum = Quorum(
+        threshold,
+        list(map(lambda x: Node('v%d' % x, 'sock://memory:%d' % x, None), range(validators))),
+    )
+
+    return Node(name, 'sock://memory:%d' % validators, quorum)
+
+
+def bench_storage(options):
+    node = new_node()
+
+    ledger = None
+    if options.ledger is not None:
+        ledger = FileLedger(options.ledger)
+
+    storage = Storage(node, ledger=ledger)
+
+    ballot = Ballot(node, State.all_confirm, BallotVoteResult.agree)
+    missing = Message.new('missing')
+
+    for size in sorted(options.sizes):
+        while len(storage) < size:
+            ballot.message = Message.new('%d' % len(storage), node='client0')
+            storage.add(ballot)
+
+        middle = storage.get_by_sequence(size // 2)
+
+        report(
+            'storage',
+            size=size,
+            hit_ns='%.1f' % (measure(lambda: storage.is_exists(middle), options.number) * 1e9),
+            miss_ns='%.1f' % (measure(lambda: storage.is_exists(missing), options.number) * 1e9),
+            hash_ns='%.1f' % (measure(lambda: storage.get_by_hash(middle.hash_id), options.number) * 1e9),
+        )
+
+    storage.close()
+
+    return
+
+
+def tally_rounds(validators, threshold):
+    '''
+    yields the number of validators, the number of votes and the round of
+    them; in one round, every voter votes and `check_threshold()` is called
+    after every vote
+    '''
+    for count in sorted(validators):
+        node = new_node(validators=count, threshold=threshold)
+        voters = node.quorum.validators + [node]
+        message = Message.new('tally')
+
+        def round():
+            ballot = Ballot(node, State.sign, BallotVoteResult.agree)
+            ballot.set_message(message)
+            for voter in voters:
+                ballot.vote(voter, BallotVoteResult.agree, State.sign)
+                ballot.check_threshold()
+
+            return
+
+        yield count, len(voters), round
+
+    return
+
+
+def bench_tally(options):
+    for validators, votes, round in tally_rounds(options.validators, options.trs):
+        elapsed = measure(round, max(1, options.number // votes))
+        report(
+            'tally',
+            validators=validators,
+            round_us='%.1f' % (elapsed * 1e6),
+            vote_ns='%.1f' % (elapsed / votes * 1e9),
+        )
+
+    return
+
+
+def bench_enum(options):
+    state = State.sign
+
+    def handle():
+        # the lookups of one ballot message in `Consensus._handle_ballot_message()`
+        State.from_name('sign')
+        BallotVoteResult.from_name('agree')
+        State.from_value(state.value)
+        state.get_next()
+
+        return
+
+    for name, fn in (
+        ('from_name', lambda: State.from_name('accept')),
+        ('from_value', lambda: State.from_value(4)),
+        ('get_next', lambda: state.get_next()),
+        ('code', lambda: state.code),
+        ('from_code', lambda: State.from_code(3)),
+        ('ballot_message', handle),
+    ):
+        report('enum', lookup=name, ns='%.1f' % (measure(fn, options.number) * 1e9))
+
+    return
+
+
+def codec_calls(sizes):
+    '''
+    yields the parameters, the encoded bytes and the encoding and decoding
+    calls of `Message` and `BallotMessage` by codec and size of message data
+    '''
+    node = new_node()
+
+    for size in sorted(sizes):
+        message = Message.new('x' * size, node='client0')
+        ballot_message = BallotMessage(node, State.sign, message, BallotVoteResult.agree)
+
+        for name in sorted(CODECS):
+            codec = get_codec(name)
+            for obj in (message, ballot_message):
+                encoded = codec.encode(obj, node)
+                yield (
+                    dict(codec=name, type=obj.__class__.__name__, size=size),
+                    encoded,
+                    lambda: codec.encode(obj, node),
+                    lambda: codec.decode(encoded),
+                )
+
+    return
+
+
+def bench_codec(options):
+    for params, encoded, encode, decode in codec_calls(options.sizes):
+        report(
+            'codec',
+            **params,
+            bytes=len(encoded),
+            encode_us='%.2f' % (measure(encode, options.number) * 1e6),
+            decode_us='%.2f' % (measure(decode, options.number) * 1e6),
+        )
+
+    return
+
+
+def measure_memory(fn):
+    '''
+    returns the allocated bytes, which are still alive after `fn()`, and the
+    result of `fn()`
+    '''
+    tracemalloc.start()
+    started = tracemalloc.get_traced_memory()[0]
+
+    result = fn()
+
+    allocated = tracemalloc.get_traced_memory()[0] - started
+    tracemalloc.stop()
+
+    return allocated, result
+
+
+def bench_memory(options):
+    node = new_node(validators=options.validators)
+    voters = node.quorum.validators + [node]
+
+    def store():
+        storage = Storage(node)
+        ballot = Ballot(node, State.all_confirm, BallotVoteResult.agree)
+        for i in range(options.count):
+            ballot.message = Message.new('%d' % i)
+            storage.add(ballot)
+
+        return storage
+
+    allocated, _ = measure_memory(store)
+    report('memory', type='stored message', count=options.count, bytes='%.1f' % (allocated / options.count))
+
+    def new_ballots():
+        ballots = list()
+        for i in range(options.count):
+            ballot = Ballot(node, State.init, BallotVoteResult.agree, slot=i)
+            ballot.set_message(Message.new('%d' % i))
+            for voter in voters:
+                ballot.vote(voter, BallotVoteResult.agree, State.init)
+
+            ballot.change_state(State.sign)
+            for voter in voters:
+                ballot.vote(voter, BallotVoteResult.agree, State.sign)
+
+            ballots.append(ballot)
+
+        return ballots
+
+    allocated, ballots = measure_memory(new_ballots)
+    report('memory', type='in-flight ballot', count=options.count, bytes='%.1f' % (allocated / options.count))
+
+    allocated, _ = measure_memory(lambda: list(map(lambda x: x.to_ballot_message(), ballots)))
+    report('memory', type='ballot message', count=options.count, bytes='%.1f' % (allocated / options.count))
+
+    return
+
+
+def bench_hash(options):
+    node = new_node()
+    codec = get_codec('binary')
+
+    for name in sorted(HASH_ALGORITHMS):
+        set_hash_algorithm(name)
+
+        for size in sorted(options.sizes):
+            message = Message.new('x' * size, node='client0')
+            encoded = codec.encode(BallotMessage(node, State.sign, message, BallotVoteResult.agree))
+
+            verifier = HashVerifier()
+            verifier.verify(message)
+
+            report(
+                'hash',
+                algorithm=name,
+                size=size,
+                hash_us='%.2f' % (measure(lambda: HashVerifier().verify(message), options.number) * 1e6),
+                cached_us='%.2f' % (measure(lambda: verifier.verify(message), options.number) * 1e6),
+                decode_us='%.2f' % (measure(lambda: codec.decode(encoded), options.number) * 1e6),
+            )
+
+    set_hash_algorithm('sha1')
+
+    return
+
+
+def bench_signature(options):
+    message = Message.new('x' * 100)
+
+    for validators in sorted(options.validators):
+        nodes = list(map(lambda x: Node('v%d' % x, 'sock://memory:%d' % x, None), range(validators)))
+        keyring = Keyring.generate(map(lambda x: x.name, nodes), 'benchmark')
+
+        ballot_messages = list(map(
+            lambda x: BallotMessage(x, State.sign, message, BallotVoteResult.agree),
+            nodes,
+        ))
+
+        def sign():
+            for ballot_message in ballot_messages:
+                ballot_message.signature = keyring.sign(ballot_message.node.name, ballot_message.get_digest())
+
+        sign()
+
+        uncached = SignatureVerifier(keyring, size=None)
+        cached = SignatureVerifier(keyring)
+        assert all(cached.verify(ballot_messages))
+
+        number = max(1, options.number // validators)
+        report(
+            'signature',
+            validators=validators,
+            sign_ops='%.0f' % (validators / measure(sign, number)),
+            verify_ops='%.0f' % (validators / measure(lambda: uncached.verify(ballot_messages), number)),
+            cached_ops='%.0f' % (validators / measure(lambda: cached.verify(ballot_messages), number)),
+        )
+
+    return
+
+
+def micro_message(options):
+    node = new_node()
+    for size in sorted(options.sizes):
+        message = Message.new('x' * size)
+        serialized = message.serialize(node)
+
+        yield 'Message.serialize', dict(size=size), lambda: message.serialize(node)
+        yield 'Message.from_json', dict(size=size), lambda: Message.from_json(serialized)
+
+    return
+
+
+def micro_ballot_message(options):
+    node = new_node()
+    for size in sorted(options.sizes):
+        ballot_message = BallotMessage(node, State.sign, Message.new('x' * size, node='client0'), BallotVoteResult.agree)
+        serialized = ballot_message.serialize()
+
+        yield 'BallotMessage.serialize', dict(size=size), ballot_message.serialize
+        yield 'BallotMessage.from_json', dict(size=size), lambda: BallotMessage.from_json(serialized)
+
+    return
+
+
+def micro_load_message(options):
+    node = new_node()
+    for size in sorted(options.sizes):
+        message = Message.new('x' * size)
+        for obj in (message, BallotMessage(node, State.sign, message, BallotVoteResult.agree)):
+            serialized = obj.serialize(node) if isinstance(obj, Message) else obj.serialize()
+
+            yield 'load_message', dict(type=obj.__class__.__name__, size=size), lambda: load_message(serialized)
+
+    return
+
+
+def micro_codec(options):
+    for params, _, encode, decode in codec_calls(options.sizes):
+        yield 'codec.encode', params, encode
+        yield 'codec.decode', params, decode
+
+    return
+
+
+def micro_framing(options):
+    '''
+    `options.frames` frames received in the chunks of `options.chunk` bytes
+    '''
+    node = new_node()
+    for size in sorted(options.sizes):
+        ballot_message = BallotMessage(node, State.sign, Message.new('x' * size, node='client0'), BallotVoteResult.agree)
+        for name in sorted(CODECS):
+            transport = LocalTransport('framing', 'sock://memory:0', None, codec=get_codec(name))
+            transport.message_received_callback = lambda x: None
+
+            stream = transport.codec.encode(ballot_message) * options.frames
+            chunks = list(map(lambda x: stream[x:x + options.chunk], range(0, len(stream), options.chunk)))
+
+            def receive():
+                for chunk in chunks:
+                    transport.receive(chunk)
+
+                return
+
+            yield (
+                'LocalTransport.receive',
+                dict(codec=name, size=size, frames=options.frames, chunks=len(chunks)),
+                receive,
+            )
+
+    return
+
+
+def micro_tally(options):
+    for validators, votes, round in tally_rounds(options.validators, options.trs):
+        yield 'Ballot.vote+check_threshold', dict(validators=validators, votes=votes), round
+
+    return
+
+
+def micro_quorum(options):
+    for validators in sorted(options.validators):
+        node = new_node(validators=validators)
+        inside = node.quorum.validators[-1]
+        outside = Node('outside', None, None)
+
+        yield 'Quorum.is_inside', dict(validators=validators, node='inside'), lambda: node.quorum.is_inside(inside)
+        yield 'Quorum.is_inside', dict(validators=validators, node='outside'), lambda: node.quorum.is_inside(outside)
+
+    return
+
+
+MICRO_BENCHMARKS = collections.OrderedDict((
+    ('message', micro_message),
+    ('ballot-message', micro_ballot_message),
+    ('load-message', micro_load_message),
+    ('codec', micro_codec),
+    ('framing', micro_framing),
+    ('tally', micro_tally),
+    ('quorum', micro_quorum),
+))
+
+
+def bench_micro(options):
+    results = list()
+    for group, fn in MICRO_BENCHMARKS.items():
+        if options.only and group not in options.only:
+            continue
+
+        for name, params, call in fn(options):
+            stats = measure_stats(call, repeat=options.repeat, warmup=options.warmup, min_time=options.min_time)
+            results.append(dict(name=name, params=params, **stats._asdict()))
+
+            report(
+                name,
+                **params,
+                median_us='%.3f' % (stats.median * 1e6),
+                iqr_us='%.3f' % (stats.iqr * 1e6),
+                iqr_pct='%.1f' % (stats.iqr / stats.median * 100 if stats.median > 0 else 0),
+                number=stats.number,
+            )
+
+    if options.output is not None:
+        with open(options.output, 'w') as f:
+            json.dump(dict(python=platform.python_version(), platform=platform.platform(), results=results), f, indent=2)
+
+    return
+
+
+class DisseminationConsensus(Consensus):
+    confirmed = None
+
+    def reached_all_confirm(self, ballot_message):
+        self.confirmed = self.loop.now
+
+        return
+
+
+def bench_dissemination(options):
+    '''
+    the nodes run in `simulation.SimulatedNetwork`, every frame is delivered
+    by itself after the latency of link, so the frames sent in the same loop
+    tick are not handled together unless they arrive at the same time
+    '''
+    for nodes in sorted(options.nodes):
+        for dissemination in ('flood', 'relay'):
+            simulation = Simulation()
+            network = SimulatedNetwork(simulation, latency=ConstantLatency(options.latency))
+            names = list(map(lambda x: 'n%d' % x, range(nodes)))
+            endpoints = dict(map(lambda x: (x[1], 'sock://memory:%d' % x[0]), enumerate(names)))
+
+            consensuses = list()
+            for name in names:
+                quorum = Quorum(
+                    options.trs,
+                    list(map(lambda x: Node(x, endpoints[x], None), filter(lambda x: x != name, names))),
+                    dissemination=dissemination,
+                    fanout=options.fanout,
+                )
+                node = Node(name, endpoints[name], quorum)
+                transport = SimulatedTransport(name, endpoints[name], network, codec=get_codec(options.codec))
+                consensus = DisseminationConsensus(
+                    node,
+                    quorum,
+                    transport,
+                    flush_window=options.flush_window,
+                    loop=simulation,
+                )
+                transport.start(consensus.receive_list)
+                consensuses.append(consensus)
+
+            client = Node('client0', None, None)
+            frames = list()
+            sizes = list()
+            latencies = list()
+            elapsed = list()
+            for _ in range(options.rounds):
+                message = Message.new('x' * options.size)
+                network.frames = network.bytes = 0
+                for consensus in consensuses:
+                    consensus.confirmed = None
+
+                injected = simulation.now
+                started = time.perf_counter()
+                consensuses[0].transport.send(
+                    consensuses[0].node.endpoint,
+                    consensuses[0].transport.codec.encode(message, client),
+                )
+                simulation.run()
+                elapsed.append(time.perf_counter() - started)
+
+                if not all(map(lambda x: x.storage.is_exists(message), consensuses)):
+                    raise SystemExit('message was not confirmed: nodes=%d dissemination=%s' % (nodes, dissemination))
+
+                frames.append(network.frames)
+                sizes.append(network.bytes)
+                latencies.append(max(map(lambda x: x.confirmed, consensuses)) - injected)
+
+            report(
+                'dissemination',
+                nodes=nodes,
+                mode=dissemination,
+                frames_round='%.0f' % statistics.mean(frames),
+                frames_node='%.1f' % (statistics.mean(frames) / nodes),
+                bytes_round='%.0f' % statistics.mean(sizes),
+                latency_ms='%.1f' % (max(latencies) * 1e3),
+                round_ms='%.1f' % (min(elapsed) * 1e3),
+            )
+
+    return
+
+
+class LoadConsensus(Consensus):
+    '''
+    the time of the confirmation of the injected messages by every node is
+    kept in `tracker`, `(<injected>, <number of nodes confirmed>, <done>)` by
+    `message_id`
+    '''
+
+    tracker = None
+
+    def reached_all_confirm(self, ballot_message):
+        now = time.perf_counter()
+        for message in ballot_message.message.get_messages():
+            record = self.tracker.get(message.message_id)
+            if record is None:
+                continue
+
+            record[1] += 1
+            if record[1] == self.tracker.nodes:
+                record[2] = now
+                self.tracker.remaining -= 1
+
+        if self.tracker.remaining < 1 and not self.tracker.done.done():
+            self.tracker.done.set_result(None)
+
+        return
+
+
+class LoadTracker(dict):
+    nodes = None
+    remaining = None
+    done = None
+
+
+def run_consensus(options, nodes, trs, load):
+    '''
+    runs one point of sweep in the separate process, so the peak rss is of
+    this point only
+    '''
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    tracker = LoadTracker()
+    tracker.nodes = nodes
+    tracker.remaining = options.count
+    tracker.done = loop.create_future()
+
+    names = list(map(lambda x: 'n%d' % x, range(nodes)))
+    endpoints = dict(map(lambda x: (x[1], 'sock://memory:%d' % x[0]), enumerate(names)))
+
+    # the frames and bytes sent are counted by the transports
+    metrics = Registry()
+
+    consensuses = list()
+    for name in names:
+        quorum = Quorum(
+            trs,
+            list(map(lambda x: Node(x, endpoints[x], None), filter(lambda x: x != name, names))),
+            dissemination=options.dissemination,
+        )
+        node = Node(name, endpoints[name], quorum)
+        transport = LocalTransport(name, endpoints[name], loop, codec=get_codec(options.codec), metrics=metrics)
+        consensus = LoadConsensus(node, quorum, transport, pipeline_depth=options.pipeline)
+        consensus.tracker = tracker
+        transport.start(consensus.receive_list)
+        consensuses.append(consensus)
+
+    client = Node('client0', None, None)
+    first = consensuses[0]
+
+    def inject():
+        message = Message.new('x' * options.size)
+        tracker[message.message_id] = [time.perf_counter(), 0, None]
+        first.transport.send(first.node.endpoint, first.transport.codec.encode(message, client))
+
+        return
+
+    started = time.perf_counter()
+    for i in range(options.count):
+        loop.call_at(loop.time() + i / load, inject)
+
+    try:
+        loop.run_until_complete(asyncio.wait_for(tracker.done, options.timeout))
+    except asyncio.TimeoutError:
+        pass
+
+    latencies = sorted(map(lambda x: x[2] - x[0], filter(lambda x: x[2] is not None, tracker.values())))
+    finished = max(map(lambda x: x[2], filter(lambda x: x[2] is not None, tracker.values())), default=started)
+    elapsed = finished - started
+
+    frames = sum(map(lambda x: x.value, metrics.get('simple_fba_transport_frames_sent_total').children.values()))
+    sent_bytes = sum(map(lambda x: x.value, metrics.get('simple_fba_transport_bytes_sent_total').children.values()))
+
+    result = dict(
+        nodes=nodes,
+        trs=trs,
+        load=load,
+        injected=options.count,
+        confirmed=len(latencies),
+        elapsed=elapsed,
+        messages_per_second=len(latencies) / elapsed if elapsed > 0 else 0,
+        p50_ms=statistics.median(latencies) * 1e3 if latencies else None,
+        p99_ms=latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3 if latencies else None,
+        frames=frames,
+        bytes=sent_bytes,
+        frames_per_confirm=frames / len(latencies) if latencies else None,
+        bytes_per_confirm=sent_bytes / len(latencies) if latencies else None,
+        # kilobytes on linux
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    )
+
+    loop.close()
+
+    return result
+
+
+def run_isolated(fn, *a):
+    '''
+    `fn(*a)` in the new process; returns it's result
+    '''
+    def run(conn):
+        conn.send(fn(*a))
+        conn.close()
+
+    context = multiprocessing.get_context('fork')
+    conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=run, args=(child_conn,))
+    process.start()
+    child_conn.close()
+
+    try:
+        result = conn.recv()
+    except EOFError:
+        raise SystemExit('benchmark process failed: %s' % (a,))
+    finally:
+        process.join()
+
+    return result
+
+
+def compare_baseline(results, baseline, tolerance):
+    '''
+    compares the results with the baseline of the same nodes, trs and load;
+    returns the regressions
+    '''
+    get_key = lambda x: (x['nodes'], x['trs'], x['load'])  # noqa
+    baselines = dict(map(lambda x: (get_key(x), x), baseline['results']))
+
+    regressions = list()
+    for result in results:
+        base = baselines.get(get_key(result))
+        if base is None:
+            continue
+
+        fields = dict()
+        for field, is_higher_better in (('messages_per_second', True), ('p99_ms', False), ('bytes_per_confirm', False)):
+            if not base.get(field) or result.get(field) is None:
+                continue
+
+            ratio = result[field] / base[field]
+            fields[field] = '%.2fx' % ratio
+            if (ratio < 1 - tolerance) if is_higher_better else (ratio > 1 + tolerance):
+                regressions.append((get_key(result), field, base[field], result[field]))
+
+        report('baseline', nodes=result['nodes'], trs=result['trs'], load=result['load'], **fields)
+
+    return regressions
+
+
+def bench_consensus(options):
+    results = list()
+    for nodes in sorted(options.nodes):
+        for trs in sorted(options.trs):
+            for load in sorted(options.loads):
+                result = run_isolated(run_consensus, options, nodes, trs, load)
+                results.append(result)
+
+                report(
+                    'consensus',
+                    nodes=nodes,
+                    trs=trs,
+                    load=load,
+                    confirmed='%d/%d' % (result['confirmed'], result['injected']),
+                    msgs_s='%.1f' % result['messages_per_second'],
+                    p50_ms='%.1f' % (result['p50_ms'] or 0),
+                    p99_ms='%.1f' % (result['p99_ms'] or 0),
+                    frames_confirm='%.0f' % (result['frames_per_confirm'] or 0),
+                    bytes_confirm='%.0f' % (result['bytes_per_confirm'] or 0),
+                    peak_rss_kb=result['peak_rss_kb'],
+                )
+
+    if options.output is not None:
+        with open(options.output, 'w') as f:
+            json.dump(
+                dict(
+                    python=platform.python_version(),
+                    platform=platform.platform(),
+                    codec=options.codec,
+                    dissemination=options.dissemination,
+                    pipeline=options.pipeline,
+                    size=options.size,
+                    results=results,
+                ),
+                f,
+                indent=2,
+            )
+
+    if options.baseline is not None:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare_baseline(results, baseline, options.tolerance)
+        for key, field, base, value in regressions:
+            report('regression', nodes=key[0], trs=key[1], load=key[2], field=field, baseline=base, result=value)
+
+        if regressions:
+            sys.exit(1)
+
+    return
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-number', type=int, default=100000, help='number of calls in one measurement')
+subparsers = parser.add_subparsers(dest='bench')
+
+parser_storage = subparsers.add_parser('storage', help='lookups in `Storage` by the ledger length')
+parser_storage.add_argument(
+    '-sizes',
+    type=int,
+    nargs='+',
+    default=(1000, 10000, 100000, 1000000),
+    help='number of confirmed messages',
+)
+parser_storage.add_argument('-ledger', default=None, help='directory of `FileLedger`; by default, `MemoryLedger`')
+parser_storage.set_defaults(func=bench_storage)
+
+parser_tally = subparsers.add_parser('tally', help='`Ballot.vote()` and `Ballot.check_threshold()` of one round')
+parser_tally.add_argument(
+    '-validators',
+    type=int,
+    nargs='+',
+    default=(10, 100, 500, 1000),
+    help='number of validators in the quorum',
+)
+parser_tally.add_argument('-trs', type=int, default=80, help='threshold; 0 < trs <= 100')
+parser_tally.set_defaults(func=bench_tally)
+
+parser_enum = subparsers.add_parser('enum', help='lookups of `State` and `BallotVoteResult`')
+parser_enum.set_defaults(func=bench_enum)
+
+parser_codec = subparsers.add_parser('codec', help='bytes and encoding/decoding time of message by codec')
+parser_codec.add_argument(
+    '-sizes',
+    type=int,
+    nargs='+',
+    default=(10, 1000, 100000),
+    help='size of message data',
+)
+parser_codec.set_defaults(func=bench_codec)
+
+parser_memory = subparsers.add_parser(
+    'memory',
+    help='allocated bytes of stored message, in-flight ballot and ballot message by tracemalloc',
+)
+parser_memory.add_argument('-count', type=int, default=100000, help='number of messages and ballots')
+parser_memory.add_argument('-validators', type=int, default=3, help='number of validators in the quorum')
+parser_memory.set_defaults(func=bench_memory)
+
+parser_hash = subparsers.add_parser('hash', help='verifying `hash_id` of message, first and cached')
+parser_hash.add_argument(
+    '-sizes',
+    type=int,
+    nargs='+',
+    default=(10, 1000, 100000),
+    help='size of message data',
+)
+parser_hash.set_defaults(func=bench_hash)
+
+parser_signature = subparsers.add_parser(
+    'signature',
+    help='signing and verifying the votes of one state in batch, with and without the cache of verified votes',
+)
+parser_signature.add_argument(
+    '-validators',
+    type=int,
+    nargs='+',
+    default=(10, 100, 1000),
+    help='number of votes in one batch',
+)
+parser_signature.set_defaults(func=bench_signature)
+
+parser_dissemination = subparsers.add_parser(
+    'dissemination',
+    help='frames, bytes and virtual latency of one consensus round in the simulated network, `flood` vs `relay`',
+)
+parser_dissemination.add_argument(
+    '-nodes',
+    type=int,
+    nargs='+',
+    default=(10, 50, 200),
+    help='number of validator nodes in the same quorum',
+)
+parser_dissemination.add_argument('-trs', type=int, default=80, help='threshold; 0 < trs <= 100')
+parser_dissemination.add_argument('-fanout', type=int, default=None, help='relay nodes of one node; default log2(nodes)')
+parser_dissemination.add_argument('-codec', choices=sorted(CODECS), default='binary', help='wire format of messages')
+parser_dissemination.add_argument('-rounds', type=int, default=3, help='number of consensus rounds')
+parser_dissemination.add_argument('-size', type=int, default=100, help='size of message data')
+parser_dissemination.add_argument('-latency', type=float, default=0.001, help='latency of links in seconds; default 0.001')
+parser_dissemination.add_argument(
+    '-flush-window',
+    type=float,
+    default=None,
+    help='seconds to collect the outgoing ballot messages before sending; by default, sent after the received data are handled',
+)
+parser_dissemination.set_defaults(func=bench_dissemination)
+
+parser_micro = subparsers.add_parser(
+    'micro',
+    help='hot paths of codec, framing, tally and quorum, each timed in isolation; median and iqr of the repeats',
+)
+parser_micro.add_argument(
+    '-only',
+    choices=tuple(MICRO_BENCHMARKS),
+    nargs='+',
+    default=None,
+    help='run only these benchmarks; by default, all',
+)
+parser_micro.add_argument(
+    '-sizes',
+    type=int,
+    nargs='+',
+    default=(10, 1000, 100000),
+    help='size of message data',
+)
+parser_micro.add_argument(
+    '-validators',
+    type=int,
+    nargs='+',
+    default=(4, 100, 1000),
+    help='number of validators in the quorum',
+)
+parser_micro.add_argument('-trs', type=int, default=80, help='threshold of tally; 0 < trs <= 100')
+parser_micro.add_argument('-frames', type=int, default=10, help='number of frames of one `LocalTransport.receive` round')
+parser_micro.add_argument('-chunk', type=int, default=1460, help='bytes of one received chunk of frames')
+parser_micro.add_argument('-repeat', type=int, default=7, help='number of measured rounds')
+parser_micro.add_argument('-warmup', type=int, default=1, help='number of rounds dropped before measuring')
+parser_micro.add_argument('-min-time', type=float, default=0.05, help='seconds of one round')
+parser_micro.add_argument('-output', default=None, help='file to write the results in json')
+parser_micro.set_defaults(func=bench_micro)
+
+parser_consensus = subparsers.add_parser(
+    'consensus',
+    help='throughput and latency of consensus over `LocalTransport` by nodes, threshold and offered load',
+)
+parser_consensus.add_argument(
+    '-nodes',
+    type=int,
+    nargs='+',
+    default=(4, 10, 20),
+    help='number of validator nodes in the same quorum',
+)
+parser_consensus.add_argument('-trs', type=int, nargs='+', default=(80,), help='threshold; 0 < trs <= 100')
+parser_consensus.add_argument(
+    '-loads',
+    type=float,
+    nargs='+',
+    default=(10, 100),
+    help='injected messages per second',
+)
+parser_consensus.add_argument('-count', type=int, default=100, help='number of injected messages of one point')
+parser_consensus.add_argument('-size', type=int, default=100, help='size of message data')
+parser_consensus.add_argument('-pipeline', type=int, default=4, help='number of ballots in progress at the same time')
+parser_consensus.add_argument('-codec', choices=sorted(CODECS), default='binary', help='wire format of messages')
+parser_consensus.add_argument(
+    '-dissemination',
+    choices=(Quorum.dissemination_flood, Quorum.dissemination_relay),
+    default=Quorum.dissemination_flood,
+    help='how the votes are spread in the quorum',
+)
+parser_consensus.add_argument('-timeout', type=float, default=60, help='seconds to wait for the confirmations of one point')
+parser_consensus.add_argument('-output', default=None, help='file to write the results in json')
+parser_consensus.add_argument(
+    '-baseline',
+    default=None,
+    help='json results to compare with; exits with 1 if regressed',
+)
+parser_consensus.add_argument(
+    '-tolerance',
+    type=float,
+    default=0.1,
+    help='allowed ratio of regression from the baseline; default 0.1',
+)
+parser_consensus.set_defaults(func=bench_consensus)
+
+
+if __name__ == '__main__':
+    log.set_level(logging.ERROR)
+
+    options = parser.parse_args()
+    if options.bench is None:
+        parser.print_help()
+        sys.exit(1)
+
+    options.func(options)
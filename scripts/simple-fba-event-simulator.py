@@ -0,0 +1,286 @@
+import argparse
+import logging
+import statistics
+import sys
+import time
+
+from simple_fba.codec import (
+    CODECS,
+    get_codec,
+)
+from simple_fba.fba_consensus import Consensus
+from simple_fba.network import (
+    HASH_ALGORITHMS,
+    BaseServer,
+    Message,
+    Node,
+    Quorum,
+    get_hash,
+    set_hash_algorithm,
+)
+from simple_fba.signature import (
+    Keyring,
+    SignatureVerifier,
+)
+from simple_fba.simulation import (
+    LATENCIES,
+    SimulatedNetwork,
+    SimulatedTransport,
+    Simulation,
+    get_latency,
+)
+from simple_fba.util import (
+    log,
+)
+
+
+class Tracker:
+    '''
+    collects the confirmations of the injected messages in the virtual time
+    '''
+
+    simulation = None
+    nodes = None
+    injected = None
+    confirmed = None
+    latencies = None
+
+    def __init__(self, simulation, nodes):
+        self.simulation = simulation
+        self.nodes = nodes
+        self.injected = dict()
+        self.confirmed = dict()
+        self.latencies = list()
+
+    def inject(self, message):
+        self.injected[message.message_id] = self.simulation.now
+        self.confirmed[message.message_id] = 0
+
+        return
+
+    def confirm(self, ballot_message):
+        for message in ballot_message.message.get_messages():
+            count = self.confirmed.get(message.message_id)
+            if count is None:
+                continue
+
+            self.confirmed[message.message_id] = count + 1
+            if count + 1 == self.nodes:
+                self.latencies.append(self.simulation.now - self.injected[message.message_id])
+
+        return
+
+    def is_done(self, messages):
+        return len(self.latencies) >= messages
+
+
+class EventConsensus(Consensus):
+    tracker = None
+
+    def reached_all_confirm(self, ballot_message):
+        self.tracker.confirm(ballot_message)
+
+        return
+
+
+class Server(BaseServer):
+    node = None
+    consensus = None
+
+    def __init__(self, node, consensus, *a, **kw):
+        assert isinstance(node, Node)
+        assert isinstance(consensus, Consensus)
+
+        super(Server, self).__init__(*a, **kw)
+
+        self.node = node
+        self.consensus = consensus
+
+    def message_receive(self, data_list):
+        super(Server, self).message_receive(data_list)
+
+        self.consensus.receive_list(data_list)
+
+        return
+
+
+def parse_latency(values):
+    '''
+    `<name> [<argument> ..]`, like `uniform 0.001 0.005`
+    '''
+    name, arguments = values[0], values[1:]
+    if name not in LATENCIES:
+        parser.error('unknown latency, `%s`; one of %s' % (name, ', '.join(sorted(LATENCIES))))
+
+    try:
+        return get_latency(name, *map(float, arguments))
+    except (TypeError, ValueError, AssertionError) as e:
+        parser.error('invalid latency, `%s`: %s' % (' '.join(values), e))
+
+
+def inject(simulation, tracker, server, client_node, index):
+    data = '%d:%032x' % (index, simulation.rng.getrandbits(128))
+    message = Message(
+        None,
+        '%032x' % simulation.rng.getrandbits(128),
+        get_hash(data.encode()).hexdigest(),
+        data,
+    )
+    tracker.inject(message)
+
+    log.main.info('inject message %s -> %s: %s', client_node.name, server.node.name, message)
+    server.transport.send(server.node.endpoint, server.transport.codec.encode(message, client_node))
+
+    return
+
+
+def check_threshold(v):
+    v = int(v)
+    if v < 1 or v > 100:
+        raise argparse.ArgumentTypeError(
+            '%d is an invalid thresdhold, it must be 0 < trs <= 100' % v,
+        )
+
+    return v
+
+
+parser = argparse.ArgumentParser(
+    description='run the validators in the discrete-event simulation with the virtual time; the same seed makes the same run',
+)
+parser.add_argument('-v', dest='verbose', action='store_true', help='turn on the debug messages')
+parser.add_argument('-nodes', type=int, default=100, help='number of validator nodes in the same quorum; default 100')
+parser.add_argument('-trs', type=check_threshold, default=80, help='threshold; 0 < trs <= 100')
+parser.add_argument('-seed', type=int, default=0, help='seed of the random numbers; default 0')
+parser.add_argument('-messages', type=int, default=100, help='number of client messages to inject to `n0`; default 100')
+parser.add_argument(
+    '-interval',
+    type=float,
+    default=0.01,
+    help='interval of injected messages in virtual seconds; default 0.01',
+)
+parser.add_argument(
+    '-latency',
+    nargs='+',
+    default=('constant', '0.001'),
+    metavar='LATENCY',
+    help='latency of links, `<%s> [<argument> ..]`; default `constant 0.001`' % '|'.join(sorted(LATENCIES)),
+)
+parser.add_argument(
+    '-link',
+    nargs='+',
+    action='append',
+    default=list(),
+    metavar='LINK',
+    help='latency of one link, `<source> <destination> <latency> [<argument> ..]`, like `n0 n1 uniform 0.1 0.2`',
+)
+parser.add_argument('-until', type=float, default=3600, help='virtual seconds to stop the simulation; default 3600')
+parser.add_argument('-pipeline', type=int, default=1, help='number of ballots in progress at the same time; default 1')
+parser.add_argument(
+    '-flush-window',
+    type=float,
+    default=None,
+    help='virtual seconds to collect the outgoing ballot messages before sending; by default, sent at once',
+)
+parser.add_argument('-codec', choices=sorted(CODECS), default='binary', help='wire format of messages; default binary')
+parser.add_argument('-hash', choices=sorted(HASH_ALGORITHMS), default='sha1', help='hash algorithm of messages; default sha1')
+parser.add_argument(
+    '-dissemination',
+    choices=(Quorum.dissemination_flood, Quorum.dissemination_relay),
+    default=Quorum.dissemination_flood,
+    help='how the votes are spread in the quorum; default flood',
+)
+parser.add_argument(
+    '-sign-secret',
+    default=None,
+    help='sign the ballot messages by the keys of validators derived from this secret; by default, not signed',
+)
+
+
+if __name__ == '__main__':
+    options = parser.parse_args()
+
+    log.set_level(logging.DEBUG if options.verbose else logging.ERROR)
+    log.main.debug('options: %s', options)
+
+    set_hash_algorithm(options.hash)
+
+    simulation = Simulation(seed=options.seed)
+    network = SimulatedNetwork(simulation, latency=parse_latency(options.latency))
+
+    names = list(map(lambda x: 'n%d' % x, range(options.nodes)))
+    endpoints = dict(map(lambda x: (x[1], 'sock://memory:%d' % x[0]), enumerate(names)))
+
+    for values in options.link:
+        if len(values) < 3 or values[0] not in endpoints or values[1] not in endpoints:
+            parser.error('invalid link, `%s`' % ' '.join(values))
+
+        network.set_latency(values[0], values[1], parse_latency(values[2:]))
+
+    keyring = None
+    if options.sign_secret is not None:
+        keyring = Keyring.generate(names, options.sign_secret)
+
+    tracker = Tracker(simulation, options.nodes)
+
+    servers = dict()
+    for name in names:
+        quorum = Quorum(
+            options.trs,
+            list(map(lambda x: Node(x, endpoints[x], None), filter(lambda x: x != name, names))),
+            dissemination=options.dissemination,
+        )
+        node = Node(name, endpoints[name], quorum)
+
+        transport = SimulatedTransport(name, endpoints[name], network, codec=get_codec(options.codec))
+        consensus = EventConsensus(
+            node,
+            quorum,
+            transport,
+            pipeline_depth=options.pipeline,
+            flush_window=options.flush_window,
+            signature_verifier=SignatureVerifier(keyring) if keyring is not None else None,
+            loop=simulation,
+        )
+        consensus.tracker = tracker
+
+        servers[name] = Server(node, consensus, name, transport=transport)
+        servers[name].start()
+
+    client_node = Node('client0', None, None)
+    for index in range(options.messages):
+        simulation.call_at(index * options.interval, inject, simulation, tracker, servers['n0'], client_node, index)
+
+    started = time.perf_counter()
+    simulation.run(until=options.until, stop=lambda: tracker.is_done(options.messages))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(tracker.latencies)
+    print(
+        'seed=%d nodes=%d confirmed=%d/%d virtual=%.6fs events=%d wall=%.3fs events/s=%.0f frames=%d bytes=%d' % (
+            options.seed,
+            options.nodes,
+            len(latencies),
+            options.messages,
+            simulation.now,
+            simulation.events,
+            elapsed,
+            simulation.events / elapsed if elapsed > 0 else 0,
+            network.frames,
+            network.bytes,
+        ),
+    )
+
+    if latencies:
+        print(
+            'messages/s=%.1f p50=%.3fms p99=%.3fms bytes/confirm=%.0f' % (
+                len(latencies) / simulation.now if simulation.now > 0 else 0,
+                statistics.median(latencies) * 1e3,
+                latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3,
+                network.bytes / len(latencies),
+            ),
+        )
+
+    for server in servers.values():
+        server.consensus.storage.close()
+
+    sys.exit(0 if tracker.is_done(options.messages) else 1)
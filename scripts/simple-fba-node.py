@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import sys
+from uuid import uuid1
+
+from simple_fba.codec import (
+    CODECS,
+    get_codec,
+)
+from simple_fba.fba_consensus import Consensus
+from simple_fba.metrics import (
+    MetricsFileWriter,
+    MetricsServer,
+    Registry,
+)
+from simple_fba.network import (
+    HASH_ALGORITHMS,
+    BaseServer,
+    Message,
+    Node,
+    Quorum,
+    TcpTransport,
+    set_hash_algorithm,
+)
+from simple_fba.signature import (
+    Keyring,
+    SignatureVerifier,
+)
+from simple_fba.util import (
+    log,
+)
+from simple_fba.validator import (
+    VALIDATORS,
+    ValidationQueue,
+    get_validator,
+)
+
+
+class NodeConsensus(Consensus):
+    def reached_all_confirm(self, ballot_message):
+        log.main.critical(
+            '> %s: confirmed: slot=%d stored=%d',
+            self.node.name,
+            self.committed_slot,
+            len(self.storage),
+        )
+
+        return
+
+
+class Server(BaseServer):
+    node = None
+    consensus = None
+
+    def __init__(self, node, consensus, *a, **kw):
+        assert isinstance(node, Node)
+        assert isinstance(consensus, Consensus)
+
+        super(Server, self).__init__(*a, **kw)
+
+        self.node = node
+        self.consensus = consensus
+
+    def message_receive(self, data_list):
+        super(Server, self).message_receive(data_list)
+
+        self.consensus.receive_list(data_list)
+
+        return
+
+
+async def inject_messages(server, client_node, count, interval):
+    for _ in range(count):
+        await asyncio.sleep(interval)
+
+        message = Message.new(server.consensus.validation.validator.sign(uuid1().hex))
+        log.main.info('inject message %s -> %s: %s', client_node.name, server.node.name, message)
+        server.consensus.receive(server.transport.codec.encode(message, client_node))
+
+    return
+
+
+def check_threshold(v):
+    v = int(v)
+    if v < 1 or v > 100:
+        raise argparse.ArgumentTypeError(
+            '%d is an invalid thresdhold, it must be 0 < trs <= 100' % v,
+        )
+
+    return v
+
+
+parser = argparse.ArgumentParser(
+    description='run one validator node over tcp; the validators, n0..n<nodes - 1>, listen at <host>:<port + index>',
+)
+parser.add_argument('-s', dest='silent', action='store_true', help='turn off the debug messages')
+parser.add_argument('-name', required=True, help='name of this node, like `n0`')
+parser.add_argument('-nodes', type=int, default=4, help='number of validator nodes in the same quorum; default 4')
+parser.add_argument('-trs', type=check_threshold, default=80, help='threshold; 0 < trs <= 100')
+parser.add_argument('-host', default='127.0.0.1', help='host of validators; default 127.0.0.1')
+parser.add_argument('-port', type=int, default=5000, help='port of the first validator; default 5000')
+parser.add_argument('-codec', choices=sorted(CODECS), default='json', help='wire format of messages; default json')
+parser.add_argument('-hash', choices=sorted(HASH_ALGORITHMS), default='sha1', help='hash algorithm of messages; default sha1')
+parser.add_argument(
+    '-dissemination',
+    choices=(Quorum.dissemination_flood, Quorum.dissemination_relay),
+    default=Quorum.dissemination_flood,
+    help='how the votes are spread in the quorum; default flood',
+)
+parser.add_argument('-pipeline', type=int, default=1, help='number of ballots in progress at the same time; default 1')
+parser.add_argument(
+    '-flush-window',
+    type=float,
+    default=None,
+    help='seconds to collect the outgoing ballot messages before sending; by default, sent after the received data are handled',
+)
+parser.add_argument('-validator', choices=sorted(VALIDATORS), default='none', help='validator of messages; default none')
+parser.add_argument(
+    '-validation-workers',
+    type=int,
+    default=0,
+    help='number of workers to validate messages; by default, validated in the loop',
+)
+parser.add_argument(
+    '-validation-process',
+    action='store_true',
+    help='validate messages in the process pool instead of the thread pool',
+)
+parser.add_argument(
+    '-metrics-file',
+    default=None,
+    help='file to write the metrics in the prometheus text format every `-metrics-interval` seconds',
+)
+parser.add_argument('-metrics-interval', type=float, default=5, help='seconds to write the metrics file; default 5')
+parser.add_argument(
+    '-metrics-port',
+    type=int,
+    default=None,
+    help='port to serve the metrics over http at 127.0.0.1',
+)
+parser.add_argument(
+    '-sign-secret',
+    default=None,
+    help='sign the ballot messages by the keys of validators derived from this secret; by default, not signed',
+)
+parser.add_argument('-inject', type=int, default=0, help='number of client messages to inject to this node')
+parser.add_argument('-interval', type=float, default=1, help='interval of injected messages in seconds; default 1')
+
+
+if __name__ == '__main__':
+    log_level = logging.DEBUG
+    if '-s' in sys.argv[1:]:
+        log_level = logging.INFO
+
+    log.set_level(log_level)
+
+    options = parser.parse_args()
+    log.main.debug('options: %s', options)
+
+    set_hash_algorithm(options.hash)
+
+    validator = get_validator(options.validator)
+
+    metrics = None
+    if options.metrics_file is not None or options.metrics_port is not None:
+        metrics = Registry()
+
+    executor = None
+    if options.validation_workers > 0:
+        executor_class = concurrent.futures.ThreadPoolExecutor
+        if options.validation_process:
+            executor_class = concurrent.futures.ProcessPoolExecutor
+
+        executor = executor_class(options.validation_workers)
+
+    endpoints = dict()
+    for i in range(options.nodes):
+        endpoints['n%d' % i] = 'tcp://%s:%d' % (options.host, options.port + i)
+
+    if options.name not in endpoints:
+        parser.error('unknown node name, `%s`' % options.name)
+
+    keyring = None
+    if options.sign_secret is not None:
+        keyring = Keyring.generate(sorted(endpoints), options.sign_secret)
+
+    quorum = Quorum(
+        options.trs,
+        list(map(
+            lambda x: Node(x[0], x[1], None),
+            filter(lambda x: x[0] != options.name, sorted(endpoints.items())),
+        )),
+        dissemination=options.dissemination,
+    )
+    node = Node(options.name, endpoints[options.name], quorum)
+    client_node = Node('client-%s' % options.name, None, None)
+
+    loop = asyncio.get_event_loop()
+
+    transport = TcpTransport(
+        options.name,
+        endpoints[options.name],
+        loop,
+        codec=get_codec(options.codec),
+        metrics=metrics,
+    )
+    consensus = NodeConsensus(
+        node,
+        quorum,
+        transport,
+        pipeline_depth=options.pipeline,
+        flush_window=options.flush_window,
+        validation=ValidationQueue(validator, executor=executor, loop=loop),
+        signature_verifier=SignatureVerifier(keyring) if keyring is not None else None,
+        metrics=metrics,
+    )
+    server = Server(node, consensus, options.name, transport=transport)
+    server.start()
+
+    exporters = list()
+    if options.metrics_file is not None:
+        exporters.append(MetricsFileWriter(metrics, options.metrics_file, options.metrics_interval, loop))
+
+    if options.metrics_port is not None:
+        exporters.append(MetricsServer(metrics, '127.0.0.1', options.metrics_port, loop))
+
+    for exporter in exporters:
+        exporter.start()
+
+    if options.inject > 0:
+        asyncio.ensure_future(inject_messages(server, client_node, options.inject, options.interval))
+
+    try:
+        loop.run_forever()
+    except (KeyboardInterrupt, SystemExit):
+        log.main.debug('goodbye~')
+        sys.exit(1)
+    finally:
+        for exporter in exporters:
+            exporter.stop()
+
+        transport.stop()
+        consensus.storage.close()
+
+        if executor is not None:
+            executor.shutdown()
+
+        loop.close()
@@ -0,0 +1,338 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import statistics
+import sys
+import tempfile
+import time
+from uuid import uuid1
+
+from simple_fba.codec import (
+    CODECS,
+    get_codec,
+)
+from simple_fba.fba_consensus import Consensus
+from simple_fba.network import (
+    HASH_ALGORITHMS,
+    BaseServer,
+    Message,
+    Node,
+    Quorum,
+    set_hash_algorithm,
+)
+from simple_fba.shard import (
+    ShardRouter,
+    ShardTransport,
+)
+from simple_fba.signature import (
+    Keyring,
+    SignatureVerifier,
+)
+from simple_fba.util import (
+    log,
+)
+
+
+class ShardConsensus(Consensus):
+    '''
+    reports the confirmed messages to the coordinator
+    '''
+
+    conn = None
+
+    def reached_all_confirm(self, ballot_message):
+        message_ids = list(map(lambda x: x.message_id, ballot_message.message.get_messages()))
+        self.conn.send(('confirm', self.node.name, message_ids))
+
+        return
+
+
+class Server(BaseServer):
+    node = None
+    consensus = None
+
+    def __init__(self, node, consensus, *a, **kw):
+        assert isinstance(node, Node)
+        assert isinstance(consensus, Consensus)
+
+        super(Server, self).__init__(*a, **kw)
+
+        self.node = node
+        self.consensus = consensus
+
+    def message_receive(self, data_list):
+        super(Server, self).message_receive(data_list)
+
+        self.consensus.receive_list(data_list)
+
+        return
+
+
+def get_endpoint(index):
+    return 'sock://memory:%d' % index
+
+
+def get_shard(index, options):
+    '''
+    the validators are split into the contiguous blocks
+    '''
+    return index * options.shards // options.nodes
+
+
+def run_shard(index, options, paths, conn):
+    '''
+    runs the validators of one shard in it's own loop; the commands from the
+    coordinator, `inject` and `stop`, arrive through `conn`.
+    '''
+    set_hash_algorithm(options.hash)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    names = list(map(lambda x: 'n%d' % x, range(options.nodes)))
+    shards = dict(map(lambda x: (get_endpoint(x), get_shard(x, options)), range(options.nodes)))
+
+    keyring = None
+    if options.sign_secret is not None:
+        keyring = Keyring.generate(names, options.sign_secret)
+
+    router = ShardRouter(index, paths, shards, loop)
+    router.start()
+
+    servers = dict()
+    for i, name in enumerate(names):
+        if get_shard(i, options) != index:
+            continue
+
+        quorum = Quorum(
+            options.trs,
+            list(map(
+                lambda x: Node(x[1], get_endpoint(x[0]), None),
+                filter(lambda x: x[1] != name, enumerate(names)),
+            )),
+            dissemination=options.dissemination,
+        )
+        node = Node(name, get_endpoint(i), quorum)
+
+        transport = ShardTransport(name, get_endpoint(i), loop, router, codec=get_codec(options.codec))
+        consensus = ShardConsensus(
+            node,
+            quorum,
+            transport,
+            pipeline_depth=options.pipeline,
+            flush_window=options.flush_window,
+            signature_verifier=SignatureVerifier(keyring) if keyring is not None else None,
+        )
+        consensus.conn = conn
+
+        servers[name] = Server(node, consensus, name, transport=transport)
+        servers[name].start()
+
+    loop.run_until_complete(router.connect())
+    log.main.debug('shard %d: started: %s', index, sorted(servers))
+
+    client_node = Node('client0', None, None)
+
+    def command():
+        while conn.poll():
+            o = conn.recv()
+            if o[0] == 'inject':
+                server = servers[o[1]]
+                server.transport.send(server.node.endpoint, server.transport.codec.encode(o[2], client_node))
+            elif o[0] == 'stop':
+                loop.stop()
+
+        return
+
+    loop.add_reader(conn.fileno(), command)
+    conn.send(('ready', index))
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.remove_reader(conn.fileno())
+        router.stop()
+        for server in servers.values():
+            server.consensus.storage.close()
+
+        loop.close()
+        conn.close()
+
+    return
+
+
+def receive(conns, timeout):
+    '''
+    the messages from the shards; empty if nothing arrived in `timeout`
+    '''
+    received = list()
+    for conn in multiprocessing.connection.wait(conns, timeout=timeout):
+        try:
+            received.append(conn.recv())
+        except EOFError:
+            raise SystemExit('shard exited')
+
+    return received
+
+
+def coordinate(options, conns):
+    ready = set()
+    while len(ready) < options.shards:
+        ready.update(map(lambda x: x[1], receive(conns, None)))
+
+    log.main.info('%d shards are ready', options.shards)
+
+    injected = dict()
+    confirmed = dict()
+    latencies = list()
+
+    started = time.monotonic()
+    deadline = started + options.timeout
+    next_inject = started
+    while time.monotonic() < deadline:
+        if len(injected) < options.messages and time.monotonic() >= next_inject:
+            message = Message.new(uuid1().hex)
+            injected[message.message_id] = time.monotonic()
+            confirmed[message.message_id] = set()
+            conns[get_shard(0, options)].send(('inject', 'n0', message))
+            log.main.info('inject message client0 -> n0: %s', message)
+
+            next_inject += options.interval
+
+        for o in receive(conns, max(0, min(next_inject, deadline) - time.monotonic())):
+            _, name, message_ids = o
+            for message_id in message_ids:
+                nodes = confirmed.get(message_id)
+                if nodes is None or name in nodes:
+                    continue
+
+                nodes.add(name)
+                if len(nodes) == options.nodes:
+                    latencies.append(time.monotonic() - injected[message_id])
+                    log.main.critical('> confirmed by all nodes: %s', message_id)
+
+        if len(latencies) == options.messages:
+            break
+
+    elapsed = time.monotonic() - started
+
+    for conn in conns:
+        conn.send(('stop',))
+
+    if len(latencies) < options.messages:
+        log.main.error('timed out: %d of %d messages are confirmed', len(latencies), options.messages)
+
+    if latencies:
+        latencies.sort()
+        log.main.critical(
+            'nodes=%d shards=%d confirmed=%d elapsed=%.3fs messages/s=%.1f p50=%.1fms p99=%.1fms',
+            options.nodes,
+            options.shards,
+            len(latencies),
+            elapsed,
+            len(latencies) / elapsed,
+            statistics.median(latencies) * 1e3,
+            latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3,
+        )
+
+    return len(latencies) == options.messages
+
+
+def check_threshold(v):
+    v = int(v)
+    if v < 1 or v > 100:
+        raise argparse.ArgumentTypeError(
+            '%d is an invalid thresdhold, it must be 0 < trs <= 100' % v,
+        )
+
+    return v
+
+
+parser = argparse.ArgumentParser(
+    description='run the validators split into the shards, one process per shard; the shards are linked by unix sockets',
+)
+parser.add_argument('-s', dest='silent', action='store_true', help='turn off the debug messages')
+parser.add_argument('-nodes', type=int, default=100, help='number of validator nodes in the same quorum; default 100')
+parser.add_argument('-shards', type=int, default=os.cpu_count(), help='number of processes; default number of cpus')
+parser.add_argument('-trs', type=check_threshold, default=80, help='threshold; 0 < trs <= 100')
+parser.add_argument('-pipeline', type=int, default=1, help='number of ballots in progress at the same time; default 1')
+parser.add_argument(
+    '-flush-window',
+    type=float,
+    default=None,
+    help='seconds to collect the outgoing ballot messages before sending; by default, sent after the received data are handled',
+)
+parser.add_argument('-codec', choices=sorted(CODECS), default='binary', help='wire format of messages; default binary')
+parser.add_argument('-hash', choices=sorted(HASH_ALGORITHMS), default='sha1', help='hash algorithm of messages; default sha1')
+parser.add_argument(
+    '-dissemination',
+    choices=(Quorum.dissemination_flood, Quorum.dissemination_relay),
+    default=Quorum.dissemination_flood,
+    help='how the votes are spread in the quorum; default flood',
+)
+parser.add_argument(
+    '-sign-secret',
+    default=None,
+    help='sign the ballot messages by the keys of validators derived from this secret; by default, not signed',
+)
+parser.add_argument('-messages', type=int, default=10, help='number of client messages to inject to `n0`; default 10')
+parser.add_argument('-interval', type=float, default=0.1, help='interval of injected messages in seconds; default 0.1')
+parser.add_argument('-timeout', type=float, default=60, help='seconds to wait for the confirmations; default 60')
+
+
+if __name__ == '__main__':
+    log_level = logging.DEBUG
+    if '-s' in sys.argv[1:]:
+        log_level = logging.INFO
+
+    log.set_level(log_level)
+
+    options = parser.parse_args()
+    log.main.debug('options: %s', options)
+
+    if options.shards < 1 or options.shards > options.nodes:
+        parser.error('the number of shards must be 0 < shards <= nodes')
+
+    directory = tempfile.TemporaryDirectory(prefix='simple-fba-shard-')
+    paths = list(map(lambda x: os.path.join(directory.name, 'shard-%d.sock' % x), range(options.shards)))
+
+    conns = list()
+    processes = list()
+    for index in range(options.shards):
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=run_shard, args=(index, options, paths, child_conn), daemon=True)
+        process.start()
+        child_conn.close()
+
+        conns.append(conn)
+        processes.append(process)
+
+    try:
+        is_done = coordinate(options, conns)
+    except (KeyboardInterrupt, SystemExit):
+        log.main.debug('goodbye~')
+        is_done = False
+    finally:
+        # the confirmations sent after `stop` are drained, so the shards are
+        # not blocked by the full pipes
+        deadline = time.monotonic() + 5
+        while any(map(lambda x: x.is_alive(), processes)) and time.monotonic() < deadline:
+            for conn in multiprocessing.connection.wait(conns, timeout=0.1):
+                try:
+                    conn.recv()
+                except EOFError:
+                    conns.remove(conn)
+
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+
+        directory.cleanup()
+
+    sys.exit(0 if is_done else 1)
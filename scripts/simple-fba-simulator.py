@@ -3,21 +3,47 @@ import time  # noqa
 import argparse
 import asyncio
 import collections
+import concurrent.futures
 import logging
+import os
 import sys
 from uuid import uuid1
 
-from simple_fba.fba_consensus import Consensus
+from simple_fba.codec import (
+    CODECS,
+    get_codec,
+)
+from simple_fba.fba_consensus import (
+    Consensus,
+    Storage,
+)
+from simple_fba.ledger import FileLedger
+from simple_fba.metrics import (
+    MetricsFileWriter,
+    MetricsServer,
+    Registry,
+)
 from simple_fba.network import (
+    HASH_ALGORITHMS,
     BaseServer,
     LocalTransport,
     Message,
     Node,
     Quorum,
+    set_hash_algorithm,
+)
+from simple_fba.signature import (
+    Keyring,
+    SignatureVerifier,
 )
 from simple_fba.util import (
     log,
 )
+from simple_fba.validator import (
+    VALIDATORS,
+    ValidationQueue,
+    get_validator,
+)
 
 
 MESSAGE = None
@@ -58,8 +84,8 @@ async def check_message_in_storage(node):
 
     check_message_in_storage.is_running = False
 
-    MESSAGE = Message.new(uuid1().hex)
-    servers['n0'].transport.send(nodes['n0'].endpoint, MESSAGE.serialize(client0_node))
+    MESSAGE = Message.new(validator.sign(uuid1().hex))
+    servers['n0'].transport.send(nodes['n0'].endpoint, servers['n0'].transport.codec.encode(MESSAGE, client0_node))
     log.main.info('inject message %s -> n0: %s', client0_node.name, MESSAGE)
 
     return
@@ -94,9 +120,8 @@ class Server(BaseServer):
     def message_receive(self, data_list):
         super(Server, self).message_receive(data_list)
 
-        for i in data_list:
-            log.server.debug('%s: hand over message to consensus: %s', self.name, i)
-            self.consensus.receive(i)
+        log.server.debug('%s: hand over messages to consensus: %s', self.name, data_list)
+        self.consensus.receive_list(data_list)
 
         return
 
@@ -125,6 +150,51 @@ parser = argparse.ArgumentParser()
 parser.add_argument('-s', dest='silent', action='store_true', help='turn off the debug messages')
 parser.add_argument('-nodes', type=int, default=4, help='number of validator nodes in the same quorum; default 4')
 parser.add_argument('-trs', type=check_threshold, default=80, help='threshold; 0 < trs <= 100')
+parser.add_argument('-pipeline', type=int, default=1, help='number of ballots in progress at the same time; default 1')
+parser.add_argument(
+    '-flush-window',
+    type=float,
+    default=None,
+    help='seconds to collect the outgoing ballot messages before sending; by default, sent after the received data are handled',
+)
+parser.add_argument('-codec', choices=sorted(CODECS), default='json', help='wire format of messages; default json')
+parser.add_argument('-hash', choices=sorted(HASH_ALGORITHMS), default='sha1', help='hash algorithm of messages; default sha1')
+parser.add_argument(
+    '-dissemination',
+    choices=(Quorum.dissemination_flood, Quorum.dissemination_relay),
+    default=Quorum.dissemination_flood,
+    help='how the votes are spread in the quorum; default flood',
+)
+parser.add_argument('-validator', choices=sorted(VALIDATORS), default='none', help='validator of messages; default none')
+parser.add_argument(
+    '-validation-workers',
+    type=int,
+    default=0,
+    help='number of workers to validate messages; by default, validated in the loop',
+)
+parser.add_argument(
+    '-validation-process',
+    action='store_true',
+    help='validate messages in the process pool instead of the thread pool',
+)
+parser.add_argument(
+    '-metrics-file',
+    default=None,
+    help='file to write the metrics in the prometheus text format every `-metrics-interval` seconds',
+)
+parser.add_argument('-metrics-interval', type=float, default=5, help='seconds to write the metrics file; default 5')
+parser.add_argument(
+    '-metrics-port',
+    type=int,
+    default=None,
+    help='port to serve the metrics over http at 127.0.0.1',
+)
+parser.add_argument(
+    '-sign-secret',
+    default=None,
+    help='sign the ballot messages by the keys of validators derived from this secret; by default, not signed',
+)
+parser.add_argument('-ledger', default=None, help='directory to keep the ledger of nodes on disk')
 
 
 if __name__ == '__main__':
@@ -137,6 +207,22 @@ if __name__ == '__main__':
     options = parser.parse_args()
     log.main.debug('options: %s', options)
 
+    set_hash_algorithm(options.hash)
+
+    validator = get_validator(options.validator)
+
+    metrics = None
+    if options.metrics_file is not None or options.metrics_port is not None:
+        metrics = Registry()
+
+    executor = None
+    if options.validation_workers > 0:
+        executor_class = concurrent.futures.ThreadPoolExecutor
+        if options.validation_process:
+            executor_class = concurrent.futures.ProcessPoolExecutor
+
+        executor = executor_class(options.validation_workers)
+
     client0_config = NodeConfig('client0', None, None)
     client0_node = Node(client0_config.name, client0_config.endpoint, None)
     log.main.debug('client node created: %s', client0_node)
@@ -152,6 +238,10 @@ if __name__ == '__main__':
 
     log.main.debug('node configs created: %s', nodes_config)
 
+    keyring = None
+    if options.sign_secret is not None:
+        keyring = Keyring.generate(sorted(nodes_config), options.sign_secret)
+
     quorums = dict()
     for name, config in nodes_config.items():
         validator_configs = filter(lambda x: x.name != name, nodes_config.values())
@@ -159,6 +249,7 @@ if __name__ == '__main__':
         quorums[name] = Quorum(
             config.threshold,
             list(map(lambda x: Node(x.name, x.endpoint, None), validator_configs)),
+            dissemination=options.dissemination,
         )
     log.main.debug('quorums created: %s', quorums)
 
@@ -173,10 +264,34 @@ if __name__ == '__main__':
         nodes[name] = Node(name, config.endpoint, quorums[name])
         log.main.debug('nodes created: %s', nodes)
 
-        transports[name] = LocalTransport(name, config.endpoint, loop)
+        transports[name] = LocalTransport(
+            name,
+            config.endpoint,
+            loop,
+            codec=get_codec(options.codec),
+            metrics=metrics,
+        )
         log.main.debug('transports created: %s', transports)
 
-        consensuses[name] = TestConsensus(nodes[name], quorums[name], transports[name])
+        storage = None
+        if options.ledger is not None:
+            storage = Storage(
+                nodes[name],
+                ledger=FileLedger(os.path.join(options.ledger, name)),
+                metrics=metrics,
+            )
+
+        consensuses[name] = TestConsensus(
+            nodes[name],
+            quorums[name],
+            transports[name],
+            storage=storage,
+            pipeline_depth=options.pipeline,
+            flush_window=options.flush_window,
+            validation=ValidationQueue(validator, executor=executor, loop=loop),
+            signature_verifier=SignatureVerifier(keyring) if keyring is not None else None,
+            metrics=metrics,
+        )
         log.main.debug('consensuses created: %s', consensuses)
 
         servers[name] = Server(nodes[name], consensuses[name], name, transport=transports[name])
@@ -185,9 +300,19 @@ if __name__ == '__main__':
     for server in servers.values():
         server.start()
 
+    exporters = list()
+    if options.metrics_file is not None:
+        exporters.append(MetricsFileWriter(metrics, options.metrics_file, options.metrics_interval, loop))
+
+    if options.metrics_port is not None:
+        exporters.append(MetricsServer(metrics, '127.0.0.1', options.metrics_port, loop))
+
+    for exporter in exporters:
+        exporter.start()
+
     # send message to `server0`
-    MESSAGE = Message.new(uuid1().hex)
-    servers['n0'].transport.send(nodes['n0'].endpoint, MESSAGE.serialize(client0_node))
+    MESSAGE = Message.new(validator.sign(uuid1().hex))
+    servers['n0'].transport.send(nodes['n0'].endpoint, servers['n0'].transport.codec.encode(MESSAGE, client0_node))
     log.main.info('inject message %s -> n0: %s', client0_node.name, MESSAGE)
 
     try:
@@ -196,4 +321,13 @@ if __name__ == '__main__':
         log.main.debug('goodbye~')
         sys.exit(1)
     finally:
+        for exporter in exporters:
+            exporter.stop()
+
+        for consensus in consensuses.values():
+            consensus.storage.close()
+
+        if executor is not None:
+            executor.shutdown()
+
         loop.close()
@@ -23,6 +23,10 @@ setup(
     packages=find_packages('src', exclude=('test',)),
     scripts=(
         'scripts/simple-fba-simulator.py',
+        'scripts/simple-fba-sharded-simulator.py',
+        'scripts/simple-fba-event-simulator.py',
+        'scripts/simple-fba-node.py',
+        'scripts/simple-fba-benchmark.py',
     ),
     zip_safe=False,
 )
@@ -0,0 +1,460 @@
+import struct
+
+from .fba_consensus import (
+    BallotAggregate,
+    BallotBundle,
+    BallotMessage,
+    BallotVoteResult,
+    SlotRequest,
+    State,
+    load_message,
+)
+from .network import (
+    DelimiterFramer,
+    LengthPrefixFramer,
+    Message,
+    MessageBatch,
+    get_node,
+)
+
+
+class BaseCodec:
+    '''
+    codec encodes the `Message` and `BallotMessage` to the frame of bytes and
+    decodes the frame; every transport has it's codec and the codec has the
+    framer, which splits the received bytes into the frames.
+    '''
+
+    name = None
+    framer_class = None
+
+    def encode(self, obj, node=None):
+        '''
+        `node` is the sender of `Message`
+        '''
+        raise NotImplementedError()
+
+    def decode(self, data):
+        raise NotImplementedError()
+
+    def new_framer(self, max_frame_size=None):
+        return self.framer_class(max_frame_size=max_frame_size)
+
+
+class JSONCodec(BaseCodec):
+    '''
+    the json frames delimited by `\\r\\n\\r\\n`; the frame is parsed once and
+    loaded by the registered message type of it's `type_name`.
+    '''
+
+    name = 'json'
+    framer_class = DelimiterFramer
+
+    def encode(self, obj, node=None):
+        if isinstance(obj, Message):
+            return obj.serialize(node).encode()
+
+        if hasattr(obj, 'serialize'):
+            return obj.serialize().encode()
+
+        raise TypeError('unknown object to encode: %r' % obj)
+
+    def decode(self, data):
+        if isinstance(data, memoryview):
+            data = bytes(data)
+
+        return load_message(data)
+
+
+class BinaryCodec(BaseCodec):
+    '''
+    compact binary frame; every frame is prefixed by it's length,
+
+    frame header: `>IBB`, length of frame, version and type code
+    message(1): id, 20 bytes hash, node name and data
+    ballot message(2): state, result, slot, node name, message or batch and
+        signature
+    ballot aggregate(3): slot, node name, message or batch and votes of node
+        name, state, result and signature
+    ballot bundle(4): number of ballot messages and the ballot messages
+    slot request(5): slot and node name
+
+    the id of uuid hex is packed to 16 raw bytes and the other ids are length
+    prefixed strings.
+    '''
+
+    class InvalidFrameError(Message.InvalidMessageError):
+        pass
+
+    name = 'binary'
+    framer_class = LengthPrefixFramer
+
+    version = 2
+
+    encoders = dict()
+    decoders = dict()
+
+    kind_message = 1
+    kind_batch = 2
+
+    id_raw = 0
+    id_string = 1
+
+    hash_size = 20
+
+    header = struct.Struct('>IBB')
+    ballot_header = struct.Struct('>BBQ')
+    aggregate_header = struct.Struct('>Q')
+    vote = struct.Struct('>BB')
+    u8 = struct.Struct('>B')
+    u16 = struct.Struct('>H')
+    u32 = struct.Struct('>I')
+    u64 = struct.Struct('>Q')
+
+    def _pack_id(self, buf, i):
+        if len(i) == 32:
+            try:
+                raw = bytes.fromhex(i)
+            except ValueError:
+                pass
+            else:
+                if raw.hex() == i:
+                    buf += self.u8.pack(self.id_raw)
+                    buf += raw
+
+                    return
+
+        encoded = i.encode()
+        buf += self.u8.pack(self.id_string)
+        buf += self.u16.pack(len(encoded))
+        buf += encoded
+
+        return
+
+    def _pack_string(self, buf, s):
+        if s is None:
+            buf += self.u16.pack(0xffff)
+
+            return
+
+        encoded = s.encode()
+        buf += self.u16.pack(len(encoded))
+        buf += encoded
+
+        return
+
+    def _pack_signature(self, buf, signature):
+        if signature is None:
+            buf += self.u8.pack(0)
+
+            return
+
+        assert 0 < len(signature) < 256
+
+        buf += self.u8.pack(len(signature))
+        buf += signature
+
+        return
+
+    def _pack_message(self, buf, message, node_name):
+        self._pack_id(buf, message.message_id)
+        buf += bytes.fromhex(message.hash_id)
+        self._pack_string(buf, node_name)
+
+        data = message.data.encode()
+        buf += self.u32.pack(len(data))
+        buf += data
+
+        return
+
+    def encode(self, obj, node=None):
+        encoder = self.encoders.get(type(obj))
+        if encoder is None:
+            raise TypeError('unknown object to encode: %r' % obj)
+
+        type_code, fn = encoder
+
+        buf = bytearray(self.header.size)
+        fn(self, buf, obj, node)
+        self.header.pack_into(buf, 0, len(buf) - self.u32.size, self.version, type_code)
+
+        return bytes(buf)
+
+    def _encode_message(self, buf, message, node):
+        self._pack_message(buf, message, node.name if node is not None else message.node)
+
+        return
+
+    def _encode_ballot_message(self, buf, ballot_message, node):
+        buf += self.ballot_header.pack(
+            ballot_message.state.code,
+            ballot_message.result.code,
+            ballot_message.slot,
+        )
+        self._pack_string(buf, ballot_message.node.name)
+        self._pack_ballot_message(buf, ballot_message.message)
+        self._pack_signature(buf, ballot_message.signature)
+
+        return
+
+    def _pack_ballot_message(self, buf, message):
+        if isinstance(message, MessageBatch):
+            buf += self.u8.pack(self.kind_batch)
+            self._pack_id(buf, message.message_id)
+            buf += bytes.fromhex(message.hash_id)
+            buf += self.u32.pack(len(message.messages))
+            for i in message.messages:
+                self._pack_message(buf, i, i.node)
+        else:
+            buf += self.u8.pack(self.kind_message)
+            self._pack_message(buf, message, message.node)
+
+        return
+
+    def _encode_ballot_aggregate(self, buf, aggregate, node):
+        buf += self.aggregate_header.pack(aggregate.slot)
+        self._pack_string(buf, aggregate.node.name)
+        self._pack_ballot_message(buf, aggregate.message)
+
+        buf += self.u16.pack(len(aggregate.votes))
+        for vote_node, state, result, signature in aggregate.votes:
+            self._pack_string(buf, vote_node.name)
+            buf += self.vote.pack(state.code, result.code)
+            self._pack_signature(buf, signature)
+
+        return
+
+    def _unpack(self, st, view, offset):
+        if offset + st.size > len(view):
+            raise BinaryCodec.InvalidFrameError('frame is too short')
+
+        return st.unpack_from(view, offset) + (offset + st.size,)
+
+    def _unpack_bytes(self, view, offset, size):
+        if offset + size > len(view):
+            raise BinaryCodec.InvalidFrameError('frame is too short')
+
+        return bytes(view[offset:offset + size]), offset + size
+
+    def _unpack_id(self, view, offset):
+        kind, offset = self._unpack(self.u8, view, offset)
+        if kind == self.id_raw:
+            raw, offset = self._unpack_bytes(view, offset, 16)
+
+            return raw.hex(), offset
+
+        size, offset = self._unpack(self.u16, view, offset)
+        raw, offset = self._unpack_bytes(view, offset, size)
+
+        return raw.decode(), offset
+
+    def _unpack_string(self, view, offset):
+        size, offset = self._unpack(self.u16, view, offset)
+        if size == 0xffff:
+            return None, offset
+
+        raw, offset = self._unpack_bytes(view, offset, size)
+
+        return raw.decode(), offset
+
+    def _unpack_signature(self, view, offset):
+        size, offset = self._unpack(self.u8, view, offset)
+        if size == 0:
+            return None, offset
+
+        return self._unpack_bytes(view, offset, size)
+
+    def _unpack_message(self, view, offset):
+        message_id, offset = self._unpack_id(view, offset)
+        hash_id, offset = self._unpack_bytes(view, offset, self.hash_size)
+        node_name, offset = self._unpack_string(view, offset)
+        if not node_name:
+            raise BinaryCodec.InvalidFrameError('message without node')
+
+        size, offset = self._unpack(self.u32, view, offset)
+        data, offset = self._unpack_bytes(view, offset, size)
+
+        return Message(node_name, message_id, hash_id.hex(), data.decode()), offset
+
+    def decode(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+
+        view = memoryview(data)
+
+        length, version, type_code, offset = self._unpack(self.header, view, 0)
+        if version != self.version:
+            raise BinaryCodec.InvalidFrameError('unknown version: %d' % version)
+
+        if length != len(view) - self.u32.size:
+            raise BinaryCodec.InvalidFrameError('invalid length of frame')
+
+        decoder = self.decoders.get(type_code)
+        if decoder is None:
+            raise BinaryCodec.InvalidFrameError('unknown type: %d' % type_code)
+
+        # the strings of the received frame can be invalid utf-8 and the
+        # decoded fields can be rejected by the asserts of the message types
+        try:
+            return decoder(self, view, offset)
+        except (UnicodeDecodeError, AssertionError) as e:
+            raise BinaryCodec.InvalidFrameError('invalid frame: %r' % e)
+
+    def _decode_message(self, view, offset):
+        message, offset = self._unpack_message(view, offset)
+
+        return message
+
+    def _decode_ballot_message(self, view, offset):
+        ballot_message, offset = self._unpack_ballot(view, offset)
+
+        return ballot_message
+
+    def _unpack_ballot(self, view, offset):
+        state_code, result_code, slot, offset = self._unpack(self.ballot_header, view, offset)
+        state = State.from_code(state_code)
+        result = BallotVoteResult.from_code(result_code)
+        if state is None or result is None:
+            raise BinaryCodec.InvalidFrameError('unknown state or result')
+
+        node_name, offset = self._unpack_string(view, offset)
+        message, offset = self._unpack_ballot_message(view, offset)
+        signature, offset = self._unpack_signature(view, offset)
+
+        ballot_message = BallotMessage(
+            get_node(node_name),
+            state,
+            message,
+            result,
+            slot=slot,
+            signature=signature,
+        )
+
+        return ballot_message, offset
+
+    def _unpack_ballot_message(self, view, offset):
+        kind, offset = self._unpack(self.u8, view, offset)
+        if kind == self.kind_batch:
+            message_id, offset = self._unpack_id(view, offset)
+            hash_id, offset = self._unpack_bytes(view, offset, self.hash_size)
+            count, offset = self._unpack(self.u32, view, offset)
+            if count < 1:
+                raise BinaryCodec.InvalidFrameError('empty batch')
+
+            messages = list()
+            for _ in range(count):
+                m, offset = self._unpack_message(view, offset)
+                messages.append(m)
+
+            message = MessageBatch(message_id, hash_id.hex(), messages)
+        elif kind == self.kind_message:
+            message, offset = self._unpack_message(view, offset)
+        else:
+            raise BinaryCodec.InvalidFrameError('unknown kind of message: %d' % kind)
+
+        return message, offset
+
+    def _encode_ballot_bundle(self, buf, bundle, node):
+        buf += self.u16.pack(len(bundle.ballot_messages))
+        for ballot_message in bundle.ballot_messages:
+            self._encode_ballot_message(buf, ballot_message, node)
+
+        return
+
+    def _decode_ballot_bundle(self, view, offset):
+        count, offset = self._unpack(self.u16, view, offset)
+        if count < 1:
+            raise BinaryCodec.InvalidFrameError('empty ballot messages')
+
+        ballot_messages = list()
+        for _ in range(count):
+            ballot_message, offset = self._unpack_ballot(view, offset)
+            ballot_messages.append(ballot_message)
+
+        return BallotBundle(ballot_messages)
+
+    def _decode_ballot_aggregate(self, view, offset):
+        slot, offset = self._unpack(self.aggregate_header, view, offset)
+        node_name, offset = self._unpack_string(view, offset)
+        message, offset = self._unpack_ballot_message(view, offset)
+
+        count, offset = self._unpack(self.u16, view, offset)
+        if count < 1:
+            raise BinaryCodec.InvalidFrameError('empty votes')
+
+        votes = list()
+        for _ in range(count):
+            vote_node_name, offset = self._unpack_string(view, offset)
+            state_code, result_code, offset = self._unpack(self.vote, view, offset)
+            state = State.from_code(state_code)
+            result = BallotVoteResult.from_code(result_code)
+            if state is None or result is None:
+                raise BinaryCodec.InvalidFrameError('unknown state or result')
+
+            signature, offset = self._unpack_signature(view, offset)
+            votes.append((get_node(vote_node_name), state, result, signature))
+
+        return BallotAggregate(get_node(node_name), slot, message, votes)
+
+    def _encode_slot_request(self, buf, request, node):
+        buf += self.u64.pack(request.slot)
+        self._pack_string(buf, request.node.name)
+
+        return
+
+    def _decode_slot_request(self, view, offset):
+        slot, offset = self._unpack(self.u64, view, offset)
+        node_name, offset = self._unpack_string(view, offset)
+        if node_name is None or slot < 1:
+            raise BinaryCodec.InvalidFrameError('invalid slot request')
+
+        return SlotRequest(get_node(node_name), slot)
+
+    @classmethod
+    def register_type(cls, type_code, message_class, encoder, decoder):
+        '''
+        the new message type can be registered with it's type code;
+        `encoder(codec, buf, obj, node)` appends the body to the frame buffer
+        and `decoder(codec, view, offset)` returns the decoded object.
+        '''
+        assert 0 < type_code < 256
+        assert type_code not in cls.decoders
+
+        cls.encoders[message_class] = (type_code, encoder)
+        cls.decoders[type_code] = decoder
+
+        return
+
+
+BinaryCodec.register_type(1, Message, BinaryCodec._encode_message, BinaryCodec._decode_message)
+BinaryCodec.register_type(
+    2,
+    BallotMessage,
+    BinaryCodec._encode_ballot_message,
+    BinaryCodec._decode_ballot_message,
+)
+BinaryCodec.register_type(
+    3,
+    BallotAggregate,
+    BinaryCodec._encode_ballot_aggregate,
+    BinaryCodec._decode_ballot_aggregate,
+)
+BinaryCodec.register_type(
+    4,
+    BallotBundle,
+    BinaryCodec._encode_ballot_bundle,
+    BinaryCodec._decode_ballot_bundle,
+)
+BinaryCodec.register_type(
+    5,
+    SlotRequest,
+    BinaryCodec._encode_slot_request,
+    BinaryCodec._decode_slot_request,
+)
+
+
+CODECS = dict(map(lambda x: (x.name, x), (JSONCodec, BinaryCodec)))
+
+
+def get_codec(name):
+    return CODECS[name]()
@@ -1,68 +1,316 @@
+import asyncio
+import collections
 import enum
+import functools
 import json
+import logging
 
+from .ledger import (
+    BaseLedger,
+    MemoryLedger,
+)
 from .network import (
     BaseTransport,
+    HashVerifier,
     Message,
+    MessageBatch,
     Node,
     Quorum,
+    get_hash,
+    get_node,
+    load_ballot_message_object,
+    load_message_object,
+    register_message_type,
 )
+from .signature import SignatureVerifier
+from .validator import ValidationQueue
 from .util import (
     log,
+    iter_bits,
     BaseEnum,
 )
 
 
+BallotRecord = collections.namedtuple(
+    'BallotRecord',
+    (
+        'state',
+        'state_history',
+        'node_result',
+        'votes',  # tuple of (state name, agree bitmap, disagree bitmap)
+        'hash_id',
+        'message_ids',  # `message_id`s of the messages in the ledger
+    ),
+)
+
+
+class BallotHistory:
+    '''
+    the compact vote records of the confirmed ballots.
+
+    the votes of every state are kept as the agree and disagree bitmaps of
+    the ballot over the node indexes of quorum, and the dict view of ballot is
+    built only when it is asked by `get()`. only the latest `size` records are kept;
+    the older records are evicted, if `spill_path` is given, they are appended
+    to the file as json lines before being evicted.
+    '''
+
+    records = None
+    ballot_ids = None
+
+    def __init__(self, node, ledger, size=10000, spill_path=None):
+        assert size is None or size > 0
+
+        self.node = node
+        self.ledger = ledger
+        self.size = size
+        self.spill_path = spill_path
+
+        self.records = collections.OrderedDict()
+        self.ballot_ids = dict()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, message_id):
+        return message_id in self.records or message_id in self.ballot_ids
+
+    def add(self, ballot):
+        votes = list()
+        for state_name, (agree, disagree) in ballot.vote_history.items():
+            votes.append((state_name, agree, disagree))
+
+        message_ids = tuple(map(lambda x: x.message_id, ballot.message.get_messages()))
+        self.records[ballot.message.message_id] = BallotRecord(
+            ballot.state,
+            tuple(ballot.state_history),
+            ballot.node_result,
+            tuple(votes),
+            ballot.message.hash_id,
+            message_ids,
+        )
+
+        # the messages in the batch are found by the `message_id` of batch
+        if isinstance(ballot.message, MessageBatch):
+            for message_id in message_ids:
+                self.ballot_ids[message_id] = ballot.message.message_id
+
+        if self.size is not None:
+            while len(self.records) > self.size:
+                self.evict()
+
+        return
+
+    def evict(self):
+        message_id, record = self.records.popitem(last=False)
+        if len(record.message_ids) > 1 or record.message_ids[0] != message_id:
+            for i in record.message_ids:
+                self.ballot_ids.pop(i, None)
+
+        if self.spill_path is not None:
+            with open(self.spill_path, 'a') as f:
+                f.write(json.dumps(self._to_dict(message_id, record)) + '\n')
+
+        return
+
+    def _get_names(self, bitmap):
+        return list(map(self.node.quorum.get_name, iter_bits(bitmap)))
+
+    def _to_dict(self, message_id, record):
+        vh = dict()
+        for state_name, agree, disagree in record.votes:
+            copied = dict()
+            for node_name in self._get_names(agree):
+                copied[node_name] = BallotVoteResult.agree.name
+
+            for node_name in self._get_names(disagree):
+                copied[node_name] = BallotVoteResult.disagree.name
+
+            vh[state_name] = copied
+
+        if record.message_ids == (message_id,):
+            message = self.ledger.get(message_id)
+            message = message.to_dict() if message is not None else None
+        else:
+            message = dict(message=dict(
+                hash_id=record.hash_id,
+                message_id=message_id,
+                messages=list(map(
+                    lambda x: dict(node=x.node, message=x.to_message_dict()),
+                    filter(None, map(self.ledger.get, record.message_ids)),
+                )),
+            ))
+
+        return dict(
+            node=self.node.to_dict(simple=True),
+            state=record.state.name,
+            state_history=list(map(lambda x: x.name, record.state_history)),
+            node_result=record.node_result.name if record.node_result is not None else None,
+            message=message,
+            vote_history=vh,
+        )
+
+    def get(self, message_id, default=None):
+        message_id = self.ballot_ids.get(message_id, message_id)
+        record = self.records.get(message_id)
+        if record is None:
+            return default
+
+        return self._to_dict(message_id, record)
+
+
 class Storage:
-    messages = None
-    message_ids = None
+    '''
+    the confirmed messages are kept in the ledger, `MemoryLedger` by default;
+    the ledger is indexed by `message_id` and `hash_id` with the ledger
+    sequence, so every lookup is done in constant time regardless of the
+    ledger length.
+    '''
+
+    ledger = None
 
     ballot_history = None
 
     pending = None
-    pending_ids = None
 
-    def __init__(self, node):
+    metrics = None
+    metric_stored = None
+    metric_pending = None
+
+    def __init__(self, node, ledger=None, history_size=10000, history_spill_path=None, metrics=None):
         assert isinstance(node, Node)
+        assert isinstance(ledger, BaseLedger) if ledger is not None else True
 
         self.node = node
 
-        self.messages = list()
-        self.message_ids = list()
+        self.metrics = metrics
+        if metrics is not None:
+            self.metric_stored = metrics.counter(
+                'simple_fba_storage_messages_stored_total', 'messages stored in the ledger', ('node',),
+            ).labels(node.name)
+            self.metric_pending = metrics.gauge(
+                'simple_fba_storage_pending', 'messages waiting in the pending storage', ('node',),
+            ).labels(node.name)
 
-        self.pending = list()
-        self.pending_ids = list()
+        self.ledger = MemoryLedger() if ledger is None else ledger
 
-        self.ballot_history = dict()
+        self.pending = collections.OrderedDict()
+
+        self.ballot_history = BallotHistory(
+            self.node,
+            self.ledger,
+            size=history_size,
+            spill_path=history_spill_path,
+        )
+
+    def __len__(self):
+        return len(self.ledger)
 
     def add(self, ballot):
         assert isinstance(ballot, Ballot)
         assert not ballot.is_empty()
         assert ballot.state == State.all_confirm
 
-        self.messages.append(ballot.message)
-        self.message_ids.append(ballot.message.message_id)
-        self.ballot_history[ballot.message.message_id] = ballot.to_dict()
+        for message in ballot.message.get_messages():
+            # the same message can be confirmed again in the other batch
+            if self.ledger.has(message.message_id):
+                continue
+
+            self.ledger.append(message)
+
+            # the confirmed message does not need to be pended any more
+            self.pending.pop(message.message_id, None)
+
+            if self.metrics is not None:
+                self.metric_stored.inc()
+
+        # the committed slot is durable before it is reported as confirmed
+        self.ledger.sync(ballot.slot)
+
+        self.ballot_history.add(ballot)
+
+        if self.metrics is not None:
+            self.metric_pending.set(len(self.pending))
 
         log.storage.info('%s: ballot was added: %s', self.node.name, ballot)
 
         return
 
     def is_exists(self, message):
-        return message.message_id in self.message_ids
+        '''
+        the batch exists when all of it's messages are stored
+        '''
+        for i in message.get_messages():
+            if not self.ledger.has(i.message_id):
+                return False
+
+        return True
+
+    def get(self, message_id):
+        return self.ledger.get(message_id)
+
+    def get_committed_slot(self):
+        return self.ledger.get_slot()
+
+    def get_by_sequence(self, sequence):
+        return self.ledger.get_by_sequence(sequence)
+
+    def get_sequence(self, message):
+        return self.ledger.get_sequence(message.message_id)
+
+    def get_by_hash(self, hash_id):
+        return self.ledger.get_by_hash(hash_id)
+
+    def close(self):
+        self.ledger.close()
+
+        return
 
     def add_pending(self, message):
         assert isinstance(message, Message)
 
-        self.pending.append(message)
-        self.pending_ids.append(message.message_id)
+        self.pending[message.message_id] = message
+
+        if self.metrics is not None:
+            self.metric_pending.set(len(self.pending))
 
         log.storage.info('%s: message was added to pending: %s', self.node.name, message)
 
         return
 
     def is_exists_pending(self, message):
-        return message.message_id in self.pending_ids
+        return message.message_id in self.pending
+
+    def pop_pending(self, size, max_bytes):
+        '''
+        pops the pending messages in the received order upto `size` messages or
+        `max_bytes` bytes of data; the already stored messages are dropped.
+        the first message is always popped even if it is bigger than
+        `max_bytes`.
+        '''
+        messages = list()
+        total = 0
+        while self.pending and len(messages) < size:
+            message_id, message = next(iter(self.pending.items()))
+            if self.ledger.has(message_id):
+                del self.pending[message_id]
+                continue
+
+            if len(messages) > 0 and total + message.size > max_bytes:
+                break
+
+            del self.pending[message_id]
+            messages.append(message)
+            total += message.size
+
+        if self.metrics is not None:
+            self.metric_pending.set(len(self.pending))
+
+        return messages
+
+    @property
+    def pending_ids(self):
+        return self.pending.keys()
 
 
 class BallotVoteResult(BaseEnum):
@@ -77,13 +325,6 @@ class State(BaseEnum):
     accept = enum.auto()
     all_confirm = enum.auto()
 
-    def get_next(self):
-        for i in list(self.__class__):
-            if i.value > self.value:
-                return i
-
-        return None
-
     def is_next(self, state):
         return state.value > self.value
 
@@ -104,6 +345,13 @@ class State(BaseEnum):
 
 
 class Ballot:
+    '''
+    the votes are kept as the agree and disagree bitmaps of each state; every
+    node has it's own index in the quorum, `Quorum.get_index()`. the numbers
+    of agreed and disagreed votes of each state, `tallies`, are updated by
+    `vote()`, so the threshold is checked without counting the votes.
+    '''
+
     # class AlreadyVotedError(Exception):
     #     pass
 
@@ -113,35 +361,82 @@ class Ballot:
     class NotExpectedBallotError(Exception):
         pass
 
-    state = None
-    name = None
-    message = None
-    voted = None
-    is_broadcasted = None
-    node_result = None
-
-    def __init__(self, node, state, node_result):
+    __slots__ = (
+        'node',
+        'slot',
+        'state',
+        'state_history',
+        'message',
+        'agreed',
+        'disagreed',
+        'tallies',
+        'vote_history',
+        'is_broadcasted',
+        'node_result',
+        'metrics',
+        'started',
+        'state_started',
+    )
+
+    def __init__(self, node, state, node_result, slot=0, metrics=None):
         assert isinstance(node, Node)
         assert isinstance(node.quorum, Quorum)
         assert isinstance(state, State)
 
         self.node = node
+        self.slot = slot
         self.state = state
         self.state_history = [State.none]
         self.message = None
-        self.voted = dict()
+        self.agreed = dict()
+        self.disagreed = dict()
+        self.tallies = dict()
         self.vote_history = dict()
         self.is_broadcasted = False
         self.node_result = node_result
+        self.metrics = metrics
+        self.started = None
+        self.state_started = None
 
     def __repr__(self):
-        return '<Ballot: node=%(node)s state=%(state)s voted=%(voted)s node_result=%(node_result)s is_broadcasted=%(is_broadcasted)s>' % self.__dict__
+        return '<Ballot: node=%s slot=%s state=%s voted=%s node_result=%s is_broadcasted=%s>' % (
+            self.node,
+            self.slot,
+            self.state,
+            self.voted,
+            self.node_result,
+            self.is_broadcasted,
+        )
+
+    def _get_voted(self, agreed, disagreed):
+        voted = dict()
+        for index in iter_bits(agreed):
+            voted[self.node.quorum.get_name(index)] = BallotVoteResult.agree
+
+        for index in iter_bits(disagreed):
+            voted[self.node.quorum.get_name(index)] = BallotVoteResult.disagree
+
+        return voted
+
+    @property
+    def voted(self):
+        '''
+        the dict view of the current votes, `{<state value>: {<node name>: <result>}}`
+        '''
+        voted = dict()
+        for state_value in set(self.agreed) | set(self.disagreed):
+            voted[state_value] = self._get_voted(
+                self.agreed.get(state_value, 0),
+                self.disagreed.get(state_value, 0),
+            )
+
+        return voted
 
     def to_dict(self):
         vh = dict()
-        for state, voted in self.vote_history.items():
+        for state, (agreed, disagreed) in self.vote_history.items():
             copied = dict()
-            for node_name, result in voted.items():
+            for node_name, result in self._get_voted(agreed, disagreed).items():
                 copied[node_name] = result.name
 
             vh[state] = copied
@@ -167,12 +462,21 @@ class Ballot:
 
         return True
 
+    def _reset_votes(self):
+        self.agreed = dict()
+        self.disagreed = dict()
+        self.tallies = dict()
+
+        return
+
     def initialize_state(self):
         self.state = State.init
         self.message = None
-        self.voted = dict()
+        self._reset_votes()
         self.is_broadcasted = False
         self.node_result = None
+        self.started = None
+        self.state_started = None
 
         log.ballot.warning('%s: ballot is initialized', self.node.name)
 
@@ -186,89 +490,174 @@ class Ballot:
             self.node.name, self.state.name, state.name,
         )
         self.state_history.append(state)
-        if self.state.value in self.voted:
-            self.vote_history[self.state.name] = self.voted[self.state.value]
+        if self.metrics is not None:
+            self._observe_state(state)
+
+        if self.state.value in self.agreed or self.state.value in self.disagreed:
+            self.vote_history[self.state.name] = (
+                self.agreed.get(self.state.value, 0),
+                self.disagreed.get(self.state.value, 0),
+            )
 
         self.state = state
-        self.voted = dict()
         self.is_broadcasted = False
 
+        # the votes for the next states can arrive before the state is
+        # changed, only the votes of the previous states are dropped
+        for state_value in list(self.agreed):
+            if state_value < state.value:
+                del self.agreed[state_value]
+
+        for state_value in list(self.disagreed):
+            if state_value < state.value:
+                del self.disagreed[state_value]
+
+        for state_value in list(self.tallies):
+            if state_value < state.value:
+                del self.tallies[state_value]
+
         return
 
-    def serialize_ballot_message(self):
+    def _observe_state(self, state):
+        '''
+        the time spent in the current state and, when the ballot reaches
+        `all_confirm`, the total time from the message was set
+        '''
+        now = self.metrics.clock()
+        if self.state_started is not None:
+            self.metrics.histogram(
+                'simple_fba_ballot_state_seconds', 'seconds spent in the state of ballot', ('node', 'state'),
+            ).labels(self.node.name, self.state.name).observe(now - self.state_started)
+
+        if state == State.all_confirm and self.started is not None:
+            self.metrics.histogram(
+                'simple_fba_ballot_confirm_seconds', 'seconds from the message was set to `all_confirm`', ('node',),
+            ).labels(self.node.name).observe(now - self.started)
+
+        self.state_started = now if self.started is not None else None
+
+        return
+
+    def to_ballot_message(self):
         return BallotMessage(
             self.node,
             self.state,
             self.message,
             self.node_result,
-        ).serialize()
+            slot=self.slot,
+        )
+
+    def serialize_ballot_message(self):
+        return self.to_ballot_message().serialize()
 
     def set_message(self, message):
-        assert isinstance(message, Message)
+        assert isinstance(message, (Message, MessageBatch))
 
         self.message = message
-        self.voted = dict()
+        self._reset_votes()
+
+        if self.metrics is not None:
+            self.started = self.state_started = self.metrics.clock()
 
         return
 
     def is_empty(self):
         return self.message is None
 
-    def is_voted(self, node):
-        return node.name in self.voted
+    def is_voted(self, node, state=None):
+        bit = 1 << self.node.quorum.get_index(node.name)
+        state_value = (self.state if state is None else state).value
+
+        return ((self.agreed.get(state_value, 0) | self.disagreed.get(state_value, 0)) & bit) != 0
 
     def vote(self, node, result, state):
         assert isinstance(node, Node)
 
         if self.state > state:
             log.ballot.debug(
-                '%s: same message and previous state: %s: %s',
+                '%s: same message and previous state: %s',
                 self.node.name,
                 state,
             )
 
             return
 
-        self.voted.setdefault(state.value, dict())
+        state_value = state.value
+        bit = 1 << self.node.quorum.get_index(node.name)
+        agreed = self.agreed.get(state_value, 0)
+        disagreed = self.disagreed.get(state_value, 0)
 
         # if node.name in self.voted:
         #     raise Ballot.AlreadyVotedError('node, %s already voted' % node_name)
         #     return
-        if node.name in self.voted[state.value]:
+        tally = self.tallies.get(state_value)
+        if tally is None:
+            tally = self.tallies[state_value] = [0, 0]
+
+        if (agreed | disagreed) & bit:
             # existing vote will be overrided
-            log.ballot.debug('%s: already voted?: %s', self.node.name)
+            log.ballot.debug('%s: already voted?: %s', self.node.name, node)
+
+            tally[0 if agreed & bit else 1] -= 1
+
+        if result == BallotVoteResult.agree:
+            self.agreed[state_value] = agreed | bit
+            self.disagreed[state_value] = disagreed & ~bit
+            tally[0] += 1
+        else:
+            self.agreed[state_value] = agreed & ~bit
+            self.disagreed[state_value] = disagreed | bit
+            tally[1] += 1
 
-        self.voted[state.value][node.name] = result
         log.ballot.info('%s: %s voted for %s', self.node.name, node, self.message)
 
         return
 
-    def check_threshold(self):
-        voted = self.voted.copy()
+    def get_tally(self, state=None):
+        '''
+        the numbers of agreed and disagreed votes of the state
+        '''
+        tally = self.tallies.get((self.state if state is None else state).value)
+        if tally is None:
+            return (0, 0)
 
-        states = sorted(voted.keys(), reverse=True)
-        if len(states) < 1:
+        return tuple(tally)
+
+    def check_threshold(self):
+        '''
+        the agreed votes are counted by `vote()`, so every state is checked
+        in constant time.
+        '''
+        if len(self.tallies) < 1:
             return (self.state, False)
 
-        for state_value in states:
-            if state_value < self.state.value:
-                del self.voted[state_value]
+        minimum_quorum = self.node.quorum.minimum_quorum
+        current_value = self.state.value
+        is_passed = False
+        for state_value in sorted(self.tallies.keys(), reverse=True):
+            if state_value < current_value:
+                del self.tallies[state_value]
+                self.agreed.pop(state_value, None)
+                self.disagreed.pop(state_value, None)
                 continue
 
-            target = voted[state_value]
-
-            agreed_votes = list(filter(lambda x: x == BallotVoteResult.agree, target.values()))
-
-            is_passed = len(agreed_votes) >= self.node.quorum.minimum_quorum
-            log.ballot.info(
-                '%s: threshold checked: threshold=%s voted=%s minimum_quorum=%s agreed=%d is_passed=%s',
-                self.node.name,
-                self.node.quorum.threshold,
-                sorted(map(lambda x: (x[0], x[1].value), target.items())),
-                self.node.quorum.minimum_quorum,
-                len(agreed_votes),
-                is_passed,
-            )
+            agreed, disagreed = self.tallies[state_value]
+
+            is_passed = agreed >= minimum_quorum
+            if log.ballot.isEnabledFor(logging.INFO):
+                log.ballot.info(
+                    '%s: threshold checked: threshold=%s voted=%s minimum_quorum=%s agreed=%d disagreed=%d is_passed=%s',
+                    self.node.name,
+                    self.node.quorum.threshold,
+                    sorted(map(
+                        lambda x: (x[0], x[1].value),
+                        self._get_voted(self.agreed[state_value], self.disagreed.get(state_value, 0)).items(),
+                    )),
+                    minimum_quorum,
+                    agreed,
+                    disagreed,
+                    is_passed,
+                )
 
             if is_passed:
                 return (State.from_value(state_value), is_passed)
@@ -277,35 +666,70 @@ class Ballot:
 
 
 class BallotMessage:
-    class InvalidBallotMessageError(Exception):
+    '''
+    `signature` is the signature of `get_digest()` by the key of `node`, see
+    `signature.Keyring`
+    '''
+
+    class InvalidBallotMessageError(Message.InvalidMessageError):
         pass
 
-    state = None
-    message = None
-    result = None
+    __slots__ = ('node', 'state', 'message', 'result', 'slot', 'signature')
+
+    type_name = 'ballot-message'
 
-    def __init__(self, node, state, message, result):
+    def __init__(self, node, state, message, result, slot=0, signature=None):
         assert isinstance(node, Node)
         assert isinstance(state, State)
-        assert isinstance(message, Message)
+        assert isinstance(message, (Message, MessageBatch))
         assert isinstance(result, BallotVoteResult)
+        assert type(slot) is int
+        assert type(signature) is bytes if signature is not None else True
 
         self.node = node
         self.state = state
         self.message = message
         self.result = result
+        self.slot = slot
+        self.signature = signature
 
     def __repr__(self):
-        return '<BallotMessage: node=%(node)s state=%(state)s result=%(result)s message=%(message)s>' % self.__dict__
+        return '<BallotMessage: node=%s slot=%s state=%s result=%s message=%s>' % (
+            self.node,
+            self.slot,
+            self.state,
+            self.result,
+            self.message,
+        )
 
-    def serialize(self):
-        return json.dumps(dict(
-            type_name='ballot-message',
+    def to_dict(self):
+        return dict(
+            type_name=self.type_name,
             node=self.node.name,
+            slot=self.slot,
             state=self.state.name,
             message=self.message.to_message_dict(),
             result=self.result.name,
-        )) + '\r\n\r\n'
+            signature=self.signature.hex() if self.signature is not None else None,
+        )
+
+    def serialize(self):
+        return json.dumps(self.to_dict()) + '\r\n\r\n'
+
+    def get_digest(self):
+        '''
+        the digest of the vote, which is signed
+        '''
+        return get_hash((
+            '%s\n%d\n%d\n%d\n%s\n%s' % (
+                self.node.name,
+                self.slot,
+                self.state.code,
+                self.result.code,
+                self.message.message_id,
+                self.message.hash_id,
+            )
+        ).encode()).digest()
 
     @classmethod
     def from_json(cls, data):
@@ -314,45 +738,445 @@ class BallotMessage:
         except json.decoder.JSONDecodeError as e:
             raise cls.InvalidBallotMessageError(e)
 
-        if 'type_name' not in o or o['type_name'] != 'ballot-message':
+        if 'type_name' not in o or o['type_name'] != cls.type_name:
             raise cls.InvalidBallotMessageError('`type_name` is not "ballot-message"')
 
-        message = None
+        return cls.from_dict(o)
+
+    @classmethod
+    def from_dict(cls, o):
+        '''
+        `o` is the received data, so the fields are checked here instead of
+        by the asserts of `__init__()`
+        '''
+        if not isinstance(o, dict):
+            raise cls.InvalidBallotMessageError('ballot message must be the object: %s' % o)
+
         try:
-            message = Message.from_dict(o)
+            message = load_ballot_message_object(o)
         except Message.InvalidMessageError as e:
             raise cls.InvalidBallotMessageError(e)
 
-        return cls(
-            Node(o['node'], None, None),
-            State.from_name(o['state']),
-            message,
-            BallotVoteResult.from_name(o['result']),
+        node_name = o.get('node')
+        if not isinstance(node_name, str):
+            raise cls.InvalidBallotMessageError('invalid `node`: %s' % node_name)
+
+        slot = o.get('slot', 0)
+        # the slot is packed in 8 bytes by the binary codec
+        if type(slot) is not int or not 0 <= slot < 1 << 64:
+            raise cls.InvalidBallotMessageError('invalid `slot`: %s' % slot)
+
+        signature = o.get('signature')
+        if signature is not None and not isinstance(signature, str):
+            raise cls.InvalidBallotMessageError('invalid `signature`: %s' % signature)
+
+        try:
+            return cls(
+                get_node(node_name),
+                State.from_name(o['state']),
+                message,
+                BallotVoteResult.from_name(o['result']),
+                slot=slot,
+                signature=bytes.fromhex(signature) if signature is not None else None,
+            )
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise cls.InvalidBallotMessageError(e)
+
+    def get_message(self):
+        return self.message
+
+
+register_message_type(BallotMessage)
+
+
+class BallotAggregate:
+    '''
+    the votes of the same slot and message, relayed by `node` in the `relay`
+    dissemination of quorum; `votes` is the list of `(<node>, <state>,
+    <result>, <signature>)`.
+    '''
+
+    class InvalidBallotAggregateError(Message.InvalidMessageError):
+        pass
+
+    type_name = 'ballot-aggregate'
+
+    node = None
+    slot = None
+    message = None
+    votes = None
+
+    def __init__(self, node, slot, message, votes):
+        assert isinstance(node, Node)
+        assert type(slot) is int
+        assert isinstance(message, (Message, MessageBatch))
+        assert len(votes) > 0
+
+        self.node = node
+        self.slot = slot
+        self.message = message
+        self.votes = list(votes)
+
+    def __repr__(self):
+        return '<BallotAggregate: node=%s slot=%s votes=%d message=%s>' % (
+            self.node,
+            self.slot,
+            len(self.votes),
+            self.message,
         )
 
+    def serialize(self):
+        return json.dumps(dict(
+            type_name=self.type_name,
+            node=self.node.name,
+            slot=self.slot,
+            message=self.message.to_message_dict(),
+            votes=list(map(
+                lambda x: (x[0].name, x[1].name, x[2].name, x[3].hex() if x[3] is not None else None),
+                self.votes,
+            )),
+        )) + '\r\n\r\n'
+
+    @classmethod
+    def from_dict(cls, o):
+        '''
+        the fields are checked like `BallotMessage.from_dict()`
+        '''
+        if not isinstance(o, dict):
+            raise cls.InvalidBallotAggregateError('ballot aggregate must be the object: %s' % o)
+
+        try:
+            message = load_ballot_message_object(o)
+        except Message.InvalidMessageError as e:
+            raise cls.InvalidBallotAggregateError(e)
+
+        node_name = o.get('node')
+        if not isinstance(node_name, str):
+            raise cls.InvalidBallotAggregateError('invalid `node`: %s' % node_name)
+
+        slot = o.get('slot')
+        if type(slot) is not int or not 0 <= slot < 1 << 64:
+            raise cls.InvalidBallotAggregateError('invalid `slot`: %s' % slot)
+
+        try:
+            votes = list(map(
+                lambda x: (
+                    get_node(x[0]),
+                    State.from_name(x[1]),
+                    BallotVoteResult.from_name(x[2]),
+                    bytes.fromhex(x[3]) if len(x) > 3 and x[3] is not None else None,
+                ),
+                o['votes'],
+            ))
+
+            return cls(get_node(node_name), slot, message, votes)
+        except (KeyError, IndexError, TypeError, ValueError, AttributeError, AssertionError) as e:
+            raise cls.InvalidBallotAggregateError(e)
+
     def get_message(self):
         return self.message
 
+    def get_ballot_messages(self):
+        return list(map(
+            lambda x: BallotMessage(x[0], x[1], self.message, x[2], slot=self.slot, signature=x[3]),
+            self.votes,
+        ))
+
+
+register_message_type(BallotAggregate)
+
+
+class BallotBundle:
+    '''
+    the ballot messages sent to the same peer in one flush window of
+    `Consensus`, across the states and slots.
+    '''
+
+    class InvalidBallotBundleError(Message.InvalidMessageError):
+        pass
+
+    type_name = 'ballot-bundle'
+
+    ballot_messages = None
+
+    def __init__(self, ballot_messages):
+        assert len(ballot_messages) > 0
+        assert len(list(filter(lambda x: not isinstance(x, BallotMessage), ballot_messages))) < 1
+
+        self.ballot_messages = list(ballot_messages)
+
+    def __repr__(self):
+        return '<BallotBundle: ballot_messages=%s>' % self.ballot_messages
+
+    def serialize(self):
+        return json.dumps(dict(
+            type_name=self.type_name,
+            ballot_messages=list(map(lambda x: x.to_dict(), self.ballot_messages)),
+        )) + '\r\n\r\n'
+
+    @classmethod
+    def from_dict(cls, o):
+        '''
+        the whole bundle is rejected if any of it's ballot messages is invalid
+        '''
+        try:
+            ballot_messages = o['ballot_messages']
+        except (KeyError, TypeError) as e:
+            raise cls.InvalidBallotBundleError(e)
+
+        if type(ballot_messages) is not list or len(ballot_messages) < 1:
+            raise cls.InvalidBallotBundleError('`ballot_messages` must be the non-empty list of ballot messages')
+
+        try:
+            return cls(list(map(BallotMessage.from_dict, ballot_messages)))
+        except Message.InvalidMessageError as e:
+            raise cls.InvalidBallotBundleError(e)
+
+    def get_ballot_messages(self):
+        return self.ballot_messages
+
+
+register_message_type(BallotBundle)
+
+
+class SlotRequest:
+    '''
+    the node, which is behind the quorum, asks the validators for the
+    confirmations of the committed slots from `slot`
+    '''
+
+    class InvalidSlotRequestError(Message.InvalidMessageError):
+        pass
+
+    type_name = 'slot-request'
+
+    node = None
+    slot = None
+
+    def __init__(self, node, slot):
+        assert isinstance(node, Node)
+        assert type(slot) is int and slot > 0
+
+        self.node = node
+        self.slot = slot
+
+    def __repr__(self):
+        return '<SlotRequest: node=%s slot=%s>' % (self.node, self.slot)
+
+    def serialize(self):
+        return json.dumps(dict(
+            type_name=self.type_name,
+            node=self.node.name,
+            slot=self.slot,
+        )) + '\r\n\r\n'
+
+    @classmethod
+    def from_dict(cls, o):
+        node_name = o.get('node')
+        if not isinstance(node_name, str):
+            raise cls.InvalidSlotRequestError('invalid `node`: %s' % node_name)
+
+        slot = o.get('slot')
+        if type(slot) is not int or not 0 < slot < 1 << 64:
+            raise cls.InvalidSlotRequestError('invalid `slot`: %s' % slot)
+
+        return cls(get_node(node_name), slot)
+
+
+register_message_type(SlotRequest)
+
 
 class Consensus:
+    '''
+    every ballot has it's slot, the sequence number of ballot. upto
+    `pipeline_depth` slots after the last committed slot are in progress at
+    the same time and the confirmed ballots are committed to the storage in
+    the order of slot.
+
+    the messages received while the slots are full are kept in the pending
+    storage; when a slot is available, upto `batch_size` pending messages or
+    `batch_bytes` bytes of data are nominated as the ballot of the slot in one
+    `MessageBatch`.
+
+    the ballot messages for the slots after the pipeline can arrive before
+    the previous slots are committed, they are kept upto
+    `max_future_ballot_messages` and handled when the slot comes inside the
+    pipeline.
+
+    the committed slot is kept in the ledger of `storage`, so the restarted
+    node continues from it. the node, which is still behind the quorum
+    `catchup_delay` seconds after the future ballot message arrived, sends
+    `SlotRequest` to the validators; they answer with their `all_confirm`
+    votes of the last `max_committed_slots` committed slots, upto
+    `max_catchup_slots` slots at once, and the slot confirmed by the
+    threshold of the other validators is committed without voting.
+
+    if the quorum is in the `relay` dissemination, the votes are not sent to
+    all the validators; the new votes, including the own votes, are collected
+    in the flush window and the votes of the same slot and message are merged
+    into one `BallotAggregate` for the relay nodes by `flush()`. the relay
+    node does not get back the votes it sent or it's own votes. the relayed
+    votes of the last `max_relayed_slots` slots are remembered, so every vote
+    is relayed once.
+
+    the outgoing ballot messages are not sent at once, but collected in the
+    flush window and sent to every peer in one `BallotBundle` by `flush()`;
+    by default, `flush_window=None`, the ballot messages are flushed after the
+    data received at once are handled, but the relayed votes are collected
+    until the end of the current loop tick, so the votes of the frames
+    received one by one in the same tick are relayed together. with
+    `flush_window=0`, they are flushed at the end of the current loop tick
+    and with `flush_window > 0`, after `flush_window` seconds. the flush is
+    scheduled in `loop`, by default, the
+    current asyncio event loop; any object with `call_soon()` and
+    `call_later()`, like `simulation.Simulation`, can be the loop.
+
+    the messages are validated by `validation`, `ValidationQueue`; the
+    ballot handling of the message waits until the message is validated, so
+    the expensive validation in the executor does not block the other slots
+    and peers. the queue without it's own loop runs in `loop`.
+
+    with `signature_verifier`, the own ballot messages are signed by the key
+    of this node and the received votes must be signed by their senders; the
+    votes in the received data are verified together and the data is dropped
+    if any of them is not valid.
+
+    with `metrics`, `metrics.Registry`, the decode errors, the rejected data
+    and the dropped duplicates are counted, and the `Storage` made here and
+    the ballots observe the pending messages and the time of the states.
+    '''
+
     name = None
     quorum = None
-    ballot = None
+    ballots = None
+    committed_slot = None
 
     storage = None
 
-    def __init__(self, node, quorum, transport):
+    pipeline_depth = None
+    batch_size = None
+    batch_bytes = None
+    future_ballot_messages = None
+
+    committed_messages = None
+    max_committed_slots = None
+    max_catchup_slots = None
+    confirmations = None
+    catchup_delay = None
+    catchup_handle = None
+
+    hash_verifier = None
+    signature_verifier = None
+
+    validation = None
+    validating = None
+    is_receiving = None
+
+    flush_window = None
+    flush_handle = None
+    loop = None
+    ballot_outbox = None
+
+    relay_nodes = None
+    relay_outbox = None
+    relayed = None
+    max_relayed_slots = None
+
+    metrics = None
+    metric_decode_errors = None
+    metric_rejected = None
+    metric_duplicates = None
+
+    def __init__(
+        self,
+        node,
+        quorum,
+        transport,
+        storage=None,
+        pipeline_depth=1,
+        batch_size=100,
+        batch_bytes=1024 * 1024,
+        max_future_ballot_messages=10000,
+        max_relayed_slots=64,
+        max_committed_slots=1024,
+        max_catchup_slots=64,
+        catchup_delay=1,
+        flush_window=None,
+        hash_verifier=None,
+        validation=None,
+        signature_verifier=None,
+        loop=None,
+        metrics=None,
+    ):
         assert isinstance(node, Node)
         assert isinstance(quorum, Quorum)
         assert isinstance(transport, BaseTransport)
+        assert isinstance(storage, Storage) if storage is not None else True
+        assert pipeline_depth > 0
+        assert batch_size > 0
+        assert batch_bytes > 0
+        assert max_relayed_slots > 0
+        assert max_committed_slots > 0
+        assert max_catchup_slots > 0
+        assert catchup_delay >= 0
+        assert flush_window is None or flush_window >= 0
+        assert isinstance(hash_verifier, HashVerifier) if hash_verifier is not None else True
+        assert isinstance(validation, ValidationQueue) if validation is not None else True
+        assert isinstance(signature_verifier, SignatureVerifier) if signature_verifier is not None else True
 
         self.node = node
         self.quorum = quorum
         self.transport = transport
-        self.storage = Storage(self.node)
-
-        self.ballot = Ballot(self.node, State.none, None)
-        self.ballot.change_state(State.init)
+        self.storage = Storage(self.node, metrics=metrics) if storage is None else storage
+
+        self.metrics = metrics
+        if metrics is not None:
+            self.metric_decode_errors = metrics.counter(
+                'simple_fba_consensus_decode_errors_total', 'received data failed to be decoded', ('node',),
+            ).labels(node.name)
+            self.metric_rejected = metrics.counter(
+                'simple_fba_consensus_rejected_total', 'received data rejected by verification', ('node', 'reason'),
+            )
+            self.metric_duplicates = metrics.counter(
+                'simple_fba_consensus_duplicates_dropped_total',
+                'received messages and votes dropped as already stored or pended',
+                ('node',),
+            ).labels(node.name)
+
+        self.pipeline_depth = pipeline_depth
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.future_ballot_messages = collections.deque(maxlen=max_future_ballot_messages)
+
+        self.ballots = dict()
+        self.confirmed_ballot_messages = dict()
+        self.committed_slot = self.storage.get_committed_slot()
+
+        self.committed_messages = collections.OrderedDict()
+        self.max_committed_slots = max_committed_slots
+        self.max_catchup_slots = max_catchup_slots
+        self.confirmations = dict()
+        self.catchup_delay = catchup_delay
+
+        if self.quorum.dissemination == Quorum.dissemination_relay:
+            self.relay_nodes = self.quorum.get_relay_nodes(self.node)
+
+        self.hash_verifier = HashVerifier() if hash_verifier is None else hash_verifier
+        self.signature_verifier = signature_verifier
+
+        self.validation = ValidationQueue(loop=loop) if validation is None else validation
+        if self.validation.loop is None:
+            self.validation.loop = loop
+        self.validating = dict()
+        self.is_receiving = False
+
+        self.flush_window = flush_window
+        self.ballot_outbox = list()
+        self.loop = loop
+
+        self.relay_outbox = list()
+        self.relayed = collections.OrderedDict()
+        self.max_relayed_slots = max_relayed_slots
 
         log.consensus.debug(
             '%s: initially set state to %s',
@@ -362,30 +1186,168 @@ class Consensus:
     def __repr__(self):
         return '<Consensus: node=%(node)s quorum=%(quorum)s transport=%(transport)s>' % self.__dict__
 
+    @property
+    def ballot(self):
+        '''
+        the ballot of the first slot, which is not committed yet
+        '''
+        return self.get_ballot(self.committed_slot + 1)
+
+    def get_ballot(self, slot):
+        ballot = self.ballots.get(slot)
+        if ballot is None:
+            ballot = self.ballots[slot] = Ballot(self.node, State.none, None, slot=slot, metrics=self.metrics)
+            ballot.change_state(State.init)
+
+        return ballot
+
+    def is_inside_pipeline(self, slot):
+        return self.committed_slot < slot <= self.committed_slot + self.pipeline_depth
+
     def validate_message(self, message):
-        assert isinstance(message, Message)
+        assert isinstance(message, (Message, MessageBatch))
+
+        return self.validation.validate(message)
+
+    def wait_validation(self, message, fn):
+        '''
+        `fn()` is called to resume the ballot handling after the message is
+        validated
+        '''
+        waiting = self.validating.get(message.message_id)
+        if waiting is not None:
+            waiting.append(fn)
+
+            return
+
+        self.validating[message.message_id] = [fn]
+        self.validation.request(message, self._validated)
+
+        return
+
+    def _validated(self, message, result):
+        log.consensus.debug('%s: message validated: %s: %s', self.node.name, result, message)
+
+        is_receiving, self.is_receiving = self.is_receiving, True
+        try:
+            for fn in self.validating.pop(message.message_id, ()):
+                fn()
+        finally:
+            self.is_receiving = is_receiving
+
+        # the results from the executor arrive outside of `receive()`
+        if not is_receiving:
+            self.schedule_flush()
+
+        return
 
-        # TODO implement
-        is_validated = True
+    def verify_hash(self, loaded):
+        '''
+        the messages in the received data are verified once at ingress
+        '''
+        if isinstance(loaded, BallotBundle):
+            messages = map(lambda x: x.message, loaded.get_ballot_messages())
+        else:
+            messages = (loaded.get_message(),)
+
+        for message in messages:
+            if not self.hash_verifier.verify(message):
+                return False
+
+        return True
+
+    def verify_signature(self, loaded):
+        '''
+        the votes in the received data are verified in one batch
+        '''
+        if self.signature_verifier is None or isinstance(loaded, Message):
+            return True
+
+        if isinstance(loaded, BallotMessage):
+            ballot_messages = (loaded,)
+        else:
+            ballot_messages = loaded.get_ballot_messages()
 
-        return is_validated
+        return all(self.signature_verifier.verify(ballot_messages))
+
+    def sign_ballot_message(self, ballot_message):
+        if self.signature_verifier is not None:
+            ballot_message.signature = self.signature_verifier.keyring.sign(
+                self.node.name,
+                ballot_message.get_digest(),
+            )
+
+        return ballot_message
 
     def receive(self, data):
+        self.is_receiving = True
+        try:
+            return self._receive(data)
+        finally:
+            self.is_receiving = False
+            self.schedule_flush()
+
+    def receive_list(self, data_list):
+        '''
+        the data received at once are handled and the outgoing ballot messages
+        of them are flushed together
+        '''
+        self.is_receiving = True
+        try:
+            for data in data_list:
+                self._receive(data)
+        finally:
+            self.is_receiving = False
+            self.schedule_flush()
+
+        return
+
+    def _receive(self, data):
         log.consensus.debug('%s: received data: %s', self.node.name, data)
 
         try:
-            loaded = load_message(data)
+            loaded = self.transport.codec.decode(data)
         except Message.InvalidMessageError as e:
             log.consensus.error('unknown data was received: %s', e)
+            if self.metrics is not None:
+                self.metric_decode_errors.inc()
+
             return
         else:
             log.consensus.debug('%s: received data is %s', self.node.name, loaded)
-            if not isinstance(loaded, (Message, BallotMessage)):
+            if not isinstance(loaded, (Message, BallotMessage, BallotAggregate, BallotBundle, SlotRequest)):
                 log.consensus.debug('%s: unknown instance found, `%s`', self.node.name, loaded)
                 return
 
+        # the request has no message and vote to be verified
+        if isinstance(loaded, SlotRequest):
+            return self._handle_slot_request(loaded)
+
+        if not self.verify_hash(loaded):
+            log.consensus.error('%s: invalid `hash_id` was received: %s', self.node.name, loaded)
+            if self.metrics is not None:
+                self.metric_rejected.labels(self.node.name, 'hash').inc()
+
+            return
+
+        if not self.verify_signature(loaded):
+            log.consensus.error('%s: invalid signature was received: %s', self.node.name, loaded)
+            if self.metrics is not None:
+                self.metric_rejected.labels(self.node.name, 'signature').inc()
+
+            return
+
+        # the relay nodes wait for the votes even after they are stored here
+        if isinstance(loaded, BallotAggregate):
+            return self._handle_ballot_aggregate(loaded)
+
+        if isinstance(loaded, BallotBundle):
+            return self._handle_ballot_bundle(loaded)
+
         if self.storage.is_exists(loaded.get_message()):
             log.consensus.debug('%s: already stored: %s', self.node.name, loaded)
+            if self.metrics is not None:
+                self.metric_duplicates.inc()
 
             return
 
@@ -396,18 +1358,224 @@ class Consensus:
             return self._handle_ballot_message(loaded)
 
     def broadcast(self, ballot_message, skip_nodes=None):
+        '''
+        `ballot_message` is the encoded data, it is sent to the validators at
+        once by `BaseTransport.multicast()`
+        '''
         assert type(skip_nodes) in (list, tuple) if skip_nodes is not None else True
 
+        endpoints = list()
         for node in self.quorum.validators:
             if skip_nodes is not None and node in skip_nodes:
                 continue
 
-            self.transport.send(
-                node.endpoint,
-                ballot_message,
-            )
+            endpoints.append(node.endpoint)
+
+        self.transport.multicast(endpoints, ballot_message)
+
+        return
+
+    def broadcast_ballot(self, ballot, skip_nodes=None):
+        '''
+        the ballot message is queued and sent by `flush()`
+        '''
+        ballot_message = self.sign_ballot_message(ballot.to_ballot_message())
+        if self.relay_nodes is None:
+            self.ballot_outbox.append((ballot_message, skip_nodes))
+        else:
+            self.relay(ballot_message)
+
+        ballot.is_broadcasted = True
+
+        log.consensus.debug('%s: new ballot broadcasted: %s', self.node.name, ballot)
+
+        return
+
+    def relay(self, ballot_message, source=None):
+        '''
+        the vote is queued to be sent to the relay nodes by `flush()`, except
+        `source`, the node which relayed it to this node; returns `False` if
+        the vote was already relayed.
+        '''
+        relayed = self.relayed.get(ballot_message.slot)
+        if relayed is None:
+            relayed = self.relayed[ballot_message.slot] = set()
+            while len(self.relayed) > self.max_relayed_slots:
+                self.relayed.popitem(last=False)
+
+        key = (ballot_message.node.name, ballot_message.state.value, ballot_message.message.message_id)
+        if key in relayed:
+            return False
+
+        relayed.add(key)
+        self.relay_outbox.append((ballot_message, source))
 
-        self.ballot.is_broadcasted = True
+        return True
+
+    def schedule_flush(self):
+        flush_window = self.flush_window
+        if flush_window is None and self.relay_nodes is not None:
+            # the relayed votes are merged until the end of the loop tick
+            flush_window = 0
+
+        if flush_window is None:
+            self.flush()
+
+            return
+
+        if self.flush_handle is not None:
+            return
+
+        if len(self.ballot_outbox) < 1 and len(self.relay_outbox) < 1:
+            return
+
+        loop = asyncio.get_event_loop() if self.loop is None else self.loop
+        if flush_window == 0:
+            self.flush_handle = loop.call_soon(self.flush)
+        else:
+            self.flush_handle = loop.call_later(flush_window, self.flush)
+
+        return
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        self._flush_ballots()
+        self._flush_relay()
+
+        return
+
+    def _flush_ballots(self):
+        '''
+        the queued ballot messages are sent to every validator in one frame;
+        the validators, which receive the same ballot messages, share the
+        encoded frame.
+        '''
+        if len(self.ballot_outbox) < 1:
+            return
+
+        outbox, self.ballot_outbox = self.ballot_outbox, list()
+
+        grouped = collections.OrderedDict()
+        for node in self.quorum.validators:
+            indexes = tuple(filter(
+                lambda x: outbox[x][1] is None or node not in outbox[x][1],
+                range(len(outbox)),
+            ))
+            if len(indexes) < 1:
+                continue
+
+            grouped.setdefault(indexes, list()).append(node.endpoint)
+
+        for indexes, endpoints in grouped.items():
+            if len(indexes) == 1:
+                obj = outbox[indexes[0]][0]
+            else:
+                obj = BallotBundle(list(map(lambda x: outbox[x][0], indexes)))
+
+            self.transport.multicast(endpoints, self.transport.codec.encode(obj))
+
+        return
+
+    def _flush_relay(self):
+        '''
+        the queued votes are merged by slot and message; every relay node gets
+        the votes except the ones it sent and it's own, and the relay nodes,
+        which get the same votes, share the encoded frame.
+        '''
+        if len(self.relay_outbox) < 1:
+            return
+
+        outbox, self.relay_outbox = self.relay_outbox, list()
+
+        grouped = collections.OrderedDict()
+        for ballot_message, source in outbox:
+            key = (ballot_message.slot, ballot_message.message.message_id)
+            if key not in grouped:
+                grouped[key] = (ballot_message.message, list())
+
+            grouped[key][1].append((ballot_message, source))
+
+        for (slot, _), (message, queued) in grouped.items():
+            targets = collections.OrderedDict()
+            for node in self.relay_nodes:
+                indexes = tuple(filter(
+                    lambda x: queued[x][1] != node.name and queued[x][0].node.name != node.name,
+                    range(len(queued)),
+                ))
+                if len(indexes) < 1:
+                    continue
+
+                targets.setdefault(indexes, list()).append(node.endpoint)
+
+            for indexes, endpoints in targets.items():
+                aggregate = BallotAggregate(
+                    self.node,
+                    slot,
+                    message,
+                    list(map(
+                        lambda x: (
+                            queued[x][0].node,
+                            queued[x][0].state,
+                            queued[x][0].result,
+                            queued[x][0].signature,
+                        ),
+                        indexes,
+                    )),
+                )
+                self.transport.multicast(endpoints, self.transport.codec.encode(aggregate))
+
+                log.consensus.debug('%s: votes relayed: %s', self.node.name, aggregate)
+
+        return
+
+    def _handle_ballot_bundle(self, bundle):
+        log.consensus.debug('%s: received ballot_bundle: %s', self.node.name, bundle)
+
+        for ballot_message in bundle.get_ballot_messages():
+            # the messages of the slot can be stored before the slot is
+            # committed, if the node stopped while the slot was committed
+            if ballot_message.state != State.all_confirm and self.storage.is_exists(ballot_message.get_message()):
+                log.consensus.debug('%s: already stored: %s', self.node.name, ballot_message)
+                if self.metrics is not None:
+                    self.metric_duplicates.inc()
+
+                continue
+
+            self._handle_ballot_message(ballot_message)
+
+        return
+
+    def _handle_ballot_aggregate(self, aggregate):
+        log.consensus.debug('%s: received ballot_aggregate: %s', self.node.name, aggregate)
+
+        is_stored = None
+        for ballot_message in aggregate.get_ballot_messages():
+            if ballot_message.node.name == self.node.name:
+                continue
+
+            if not self.quorum.is_inside(ballot_message.node):
+                log.consensus.debug('%s: vote from outside quorum: %s', self.node.name, ballot_message)
+                continue
+
+            if self.relay_nodes is not None and not self.relay(ballot_message, source=aggregate.node.name):
+                if self.metrics is not None:
+                    self.metric_duplicates.inc()
+
+                continue
+
+            if is_stored is None:
+                is_stored = self.storage.is_exists(aggregate.get_message())
+
+            if is_stored:
+                if self.metrics is not None:
+                    self.metric_duplicates.inc()
+
+                continue
+
+            self._handle_ballot_message(ballot_message)
 
         return
 
@@ -416,43 +1584,74 @@ class Consensus:
 
         log.consensus.debug('%s: received message: %s', self.node.name, message)
 
-        if self.ballot.state != State.init:
-            log.consensus.debug(
-                '%s: ballot state is not `init`, this message will be in stacked in pending storage',
-                self.node.name,
-                message,
-            )
-            self.storage.add_pending(message.copy())
+        if self.storage.is_exists_pending(message):
+            log.consensus.debug('%s: already in pending storage: %s', self.node.name, message)
+            if self.metrics is not None:
+                self.metric_duplicates.inc()
 
             return
 
-        if self.ballot.state == State.init:
-            if self.ballot.is_empty():
-                self.ballot.set_message(message.copy())
+        self.storage.add_pending(message)
+
+        self._nominate()
+
+        return False
+
+    def _nominate(self):
+        '''
+        the pending messages are nominated as the new ballots of the empty
+        slots in the pipeline
+        '''
+        for slot in range(self.committed_slot + 1, self.committed_slot + self.pipeline_depth + 1):
+            if not self.storage.pending:
+                break
+
+            ballot = self.get_ballot(slot)
+            if ballot.state != State.init or not ballot.is_empty():
+                continue
+
+            messages = self.storage.pop_pending(self.batch_size, self.batch_bytes)
+            if len(messages) < 1:
+                break
+
+            if len(messages) == 1:
+                message = messages[0]
             else:
-                self.storage.add_pending(message.copy())
+                message = MessageBatch.new(messages)
 
-                return
+            log.consensus.debug('%s: nominate new ballot: slot=%d %s', self.node.name, slot, message)
+
+            ballot.set_message(message)
+
+            self.wait_validation(
+                message,
+                functools.partial(self._vote_nominated, ballot, message, tuple(map(lambda x: x.node, messages))),
+            )
+
+        return
+
+    def _vote_nominated(self, ballot, message, skip_nodes):
+        if self.ballots.get(ballot.slot) is not ballot or ballot.message is not message:
+            return
+
+        if ballot.state != State.init or ballot.node_result is not None:
+            return
 
         result = BallotVoteResult.disagree
         if self.validate_message(message):
             result = BallotVoteResult.agree
 
-        self.ballot.node_result = result
-        self.ballot.vote(self.node, self.ballot.node_result, State.init)
+        ballot.node_result = result
+        ballot.vote(self.node, ballot.node_result, State.init)
 
-        ballot_message = self.ballot.serialize_ballot_message()
-        log.consensus.debug('%s: broadcast ballot_message initially: %s', self.node.name, ballot_message.strip())
+        self.broadcast_ballot(ballot, skip_nodes=skip_nodes)
 
-        self.broadcast(ballot_message, skip_nodes=(message.node,))
-
-        return False
+        return
 
     def _handle_ballot_message(self, ballot_message):
         log.consensus.debug(
-            '%s: %s: received ballot_message: %s',
+            '%s: received ballot_message: %s',
             self.node.name,
-            self.ballot.state,
             ballot_message,
         )
 
@@ -465,35 +1664,68 @@ class Consensus:
             )
             return
 
+        if ballot_message.slot <= self.committed_slot:
+            log.consensus.debug('%s: slot is already committed: %s', self.node.name, ballot_message)
+
+            return
+
+        # the validators do not vote for `all_confirm`, it is the answer of
+        # `SlotRequest`
+        if ballot_message.state == State.all_confirm:
+            self._handle_confirmation(ballot_message)
+
+            return
+
+        # the ballot_message for the slot after the pipeline will be handled
+        # after the previous slots are committed
+        if not self.is_inside_pipeline(ballot_message.slot):
+            log.consensus.debug(
+                '%s: ballot_message for the slot after the pipeline will be handled later: %s',
+                self.node.name,
+                ballot_message,
+            )
+            self.future_ballot_messages.append(ballot_message)
+            self.schedule_catchup()
+
+            return
+
+        ballot = self.get_ballot(ballot_message.slot)
+
         # if ballot_message.state is older than state of node, just ignore it
-        if ballot_message.state < self.ballot.state:
+        if ballot_message.state < ballot.state:
             return
 
-        is_ballot_empty = self.ballot.is_empty()
+        is_ballot_empty = ballot.is_empty()
         log.consensus.debug('%s: ballot is empty?: %s', self.node.name, is_ballot_empty)
         if is_ballot_empty:  # ballot is empty, just embrace ballot
-            self.ballot.set_message(ballot_message.message)
+            ballot.set_message(ballot_message.message)
 
-        is_valid_ballot_message = self.ballot.is_valid_ballot_message(ballot_message)
+        is_valid_ballot_message = ballot.is_valid_ballot_message(ballot_message)
 
         log.consensus.debug('%s: ballot_message is valid?: %s', self.node.name, is_valid_ballot_message)
         if not is_valid_ballot_message:
             log.consensus.error(
                 '%s: unexpected ballot_message was received: expected != given\n%s\n%s',
                 self.node.name,
-                self.ballot.__dict__,
-                ballot_message.__dict__,
+                ballot,
+                ballot_message,
             )
             return
 
-        self.ballot.vote(ballot_message.node, ballot_message.result, ballot_message.state)
+        # the ballot message is handled again after the message is validated
+        if self.validation.get_result(ballot.message) is None:
+            self.wait_validation(ballot.message, functools.partial(self._handle_ballot_message, ballot_message))
+
+            return
+
+        ballot.vote(ballot_message.node, ballot_message.result, ballot_message.state)
 
-        state, is_passed_threshold = self.ballot.check_threshold()
+        state, is_passed_threshold = ballot.check_threshold()
 
         # if new state was already agreed from other validators, the new ballot
         # will be accepted
-        if is_passed_threshold and state != self.ballot.state:
-            self.ballot.change_state(state)
+        if is_passed_threshold and state != ballot.state:
+            ballot.change_state(state)
 
         log.consensus.debug(
             '%s: is passed threshold?: %s: %s',
@@ -502,57 +1734,53 @@ class Consensus:
             ballot_message,
         )
 
-        fn = getattr(self, '_handle_%s' % self.ballot.state.name)
-        result = fn(ballot_message, is_passed_threshold)
+        fn = getattr(self, '_handle_%s' % ballot.state.name)
+        result = fn(ballot, ballot_message, is_passed_threshold)
 
         if result is not True:
             return
 
-        next_state = self.ballot.state.get_next()
+        next_state = ballot.state.get_next()
         if next_state is None:
             return
 
-        self.ballot.change_state(next_state)
+        ballot.change_state(next_state)
 
         if next_state == State.all_confirm:
-            self._handle_all_confirm(ballot_message, None)
+            self._handle_all_confirm(ballot, ballot_message, None)
             return
 
         result = BallotVoteResult.disagree
         if self.validate_message(ballot_message.message):
             result = BallotVoteResult.agree
 
-        self.ballot.node_result = result
-        self.ballot.vote(self.node, self.ballot.node_result, self.ballot.state)
-
-        self.broadcast(self.ballot.serialize_ballot_message())
+        ballot.node_result = result
+        ballot.vote(self.node, ballot.node_result, ballot.state)
 
-        log.consensus.debug('%s: new ballot broadcasted: %s', self.node.name, self.ballot)
+        self.broadcast_ballot(ballot)
 
         return
 
-    def _handle_init(self, ballot_message, is_passed_threshold):
+    def _handle_init(self, ballot, ballot_message, is_passed_threshold):
         assert isinstance(ballot_message, BallotMessage)
 
-        if self.ballot.node_result is None:
+        if ballot.node_result is None:
             result = BallotVoteResult.disagree
             if self.validate_message(ballot_message.message):
                 result = BallotVoteResult.agree
 
-            self.ballot.node_result = result
-            self.ballot.vote(self.node, result, self.ballot.state)
+            ballot.node_result = result
+            ballot.vote(self.node, result, ballot.state)
 
-        if not self.ballot.is_broadcasted:
-            self.broadcast(self.ballot.serialize_ballot_message())
-
-            log.consensus.debug('%s: new ballot broadcasted: %s', self.node.name, self.ballot)
+        if not ballot.is_broadcasted:
+            self.broadcast_ballot(ballot)
 
         if is_passed_threshold:
             return True
 
         return False
 
-    def _handle_sign(self, ballot_message, is_passed_threshold):
+    def _handle_sign(self, ballot, ballot_message, is_passed_threshold):
         if is_passed_threshold:
             return True
 
@@ -560,15 +1788,148 @@ class Consensus:
 
     _handle_accept = _handle_sign
 
-    def _handle_all_confirm(self, ballot_message, is_passed_threshold):
-        log.consensus.info('%s: %s: %s', self.node.name, self.ballot.state, ballot_message)
+    def _handle_all_confirm(self, ballot, ballot_message, is_passed_threshold):
+        log.consensus.info('%s: %s: %s', self.node.name, ballot.state, ballot_message)
+
+        self.confirmed_ballot_messages[ballot.slot] = ballot_message
+
+        self._commit()
+
+        return
+
+    def _commit(self):
+        '''
+        the confirmed ballots are committed to the storage in the order of slot
+        '''
+        committed_slot = self.committed_slot
+        while True:
+            ballot = self.ballots.get(self.committed_slot + 1)
+            if ballot is None or ballot.state != State.all_confirm:
+                break
+
+            self.storage.add(ballot)
+
+            del self.ballots[ballot.slot]
+            self.committed_slot = ballot.slot
+
+            self.committed_messages[ballot.slot] = ballot.message
+            while len(self.committed_messages) > self.max_committed_slots:
+                self.committed_messages.popitem(last=False)
+
+            # FIXME this is for simulation purpose
+            self.reached_all_confirm(self.confirmed_ballot_messages.pop(ballot.slot))
+
+        if committed_slot == self.committed_slot:
+            return
+
+        for slot in list(self.confirmations):
+            if slot <= self.committed_slot:
+                del self.confirmations[slot]
+
+        future_ballot_messages = self.future_ballot_messages
+        self.future_ballot_messages = collections.deque(maxlen=future_ballot_messages.maxlen)
+        for i in future_ballot_messages:
+            if self.storage.is_exists(i.get_message()):
+                continue
+
+            self._handle_ballot_message(i)
+
+        self._nominate()
+
+        return
+
+    def schedule_catchup(self):
+        '''
+        the node is behind the quorum if it is not committed by itself until
+        `catchup_delay` seconds later
+        '''
+        if self.catchup_handle is not None:
+            return
+
+        loop = asyncio.get_event_loop() if self.loop is None else self.loop
+        self.catchup_handle = loop.call_later(self.catchup_delay, self._request_catchup, self.committed_slot)
 
-        self.storage.add(self.ballot)
+        return
+
+    def _request_catchup(self, committed_slot):
+        self.catchup_handle = None
+
+        if self.committed_slot != committed_slot or len(self.future_ballot_messages) < 1:
+            return
 
-        self.ballot.initialize_state()
+        request = SlotRequest(self.node, self.committed_slot + 1)
+        log.consensus.info('%s: request the committed slots: %s', self.node.name, request)
 
-        # FIXME this is for simulation purpose
-        self.reached_all_confirm(ballot_message)
+        self.broadcast(self.transport.codec.encode(request))
+
+        return
+
+    def _handle_slot_request(self, request):
+        if not self.quorum.is_inside(request.node):
+            log.consensus.debug('%s: request from outside quorum: %s', self.node.name, request)
+
+            return
+
+        ballot_messages = list()
+        for slot in range(request.slot, min(self.committed_slot, request.slot + self.max_catchup_slots - 1) + 1):
+            message = self.committed_messages.get(slot)
+            if message is None:
+                continue
+
+            ballot_messages.append(self.sign_ballot_message(
+                BallotMessage(self.node, State.all_confirm, message, BallotVoteResult.agree, slot=slot),
+            ))
+
+        if len(ballot_messages) < 1:
+            log.consensus.debug('%s: no committed slot to answer: %s', self.node.name, request)
+
+            return
+
+        self.transport.send(request.node.endpoint, self.transport.codec.encode(BallotBundle(ballot_messages)))
+
+        return
+
+    def _handle_confirmation(self, ballot_message):
+        '''
+        the slot, which the threshold of the other validators confirmed, is
+        committed with their message
+        '''
+        message = ballot_message.message
+        confirmations = self.confirmations.setdefault(ballot_message.slot, dict())
+        if message.message_id not in confirmations:
+            confirmations[message.message_id] = set()
+
+        confirmed = confirmations[message.message_id]
+        confirmed.add(ballot_message.node.name)
+
+        # this node does not vote, so the threshold is of the other validators
+        if len(confirmed) < min(self.quorum.minimum_quorum, len(self.quorum.validators)):
+            return
+
+        log.consensus.info('%s: slot was confirmed by the quorum: %s', self.node.name, ballot_message)
+
+        del self.confirmations[ballot_message.slot]
+
+        replaced = self.ballots.get(ballot_message.slot)
+
+        ballot = self.ballots[ballot_message.slot] = Ballot(
+            self.node,
+            State.all_confirm,
+            BallotVoteResult.agree,
+            slot=ballot_message.slot,
+        )
+        ballot.set_message(message)
+        self.confirmed_ballot_messages[ballot.slot] = ballot_message
+
+        self._commit()
+
+        # the own messages of the replaced ballot are nominated again
+        if replaced is not None and not replaced.is_empty():
+            for i in replaced.message.get_messages():
+                if not self.storage.is_exists(i) and not self.storage.is_exists_pending(i):
+                    self.storage.add_pending(i)
+
+            self._nominate()
 
         return
 
@@ -577,16 +1938,13 @@ class Consensus:
 
 
 def load_message(data):
+    '''
+    the json data is parsed only once and loaded by the registered message
+    type of it's `type_name`
+    '''
     try:
         o = json.loads(data)
-    except json.decoder.JSONDecodeError as e:
+    except (json.decoder.JSONDecodeError, UnicodeDecodeError) as e:
         raise Message.InvalidMessageError(e)
 
-    if 'type_name' not in o:
-        raise Message.InvalidMessageError('field, `type_name` is missing: %s', o)
-
-    if o['type_name'] == 'message':
-        return Message.from_json(data)
-
-    if o['type_name'] == 'ballot-message':
-        return BallotMessage.from_json(data)
+    return load_message_object(o)
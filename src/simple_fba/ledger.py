@@ -0,0 +1,578 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zlib
+
+from .network import Message
+from .util import log
+
+
+class BaseLedger:
+    '''
+    the confirmed messages in ledger order; the ledger can be looked up by
+    sequence, `message_id` and `hash_id`. the ledger keeps the last committed
+    slot of consensus with the messages, so the node restarts from it.
+    '''
+
+    slot = None
+
+    def __len__(self):
+        raise NotImplementedError()
+
+    def append(self, message):
+        raise NotImplementedError()
+
+    def has(self, message_id):
+        raise NotImplementedError()
+
+    def get(self, message_id):
+        raise NotImplementedError()
+
+    def get_sequence(self, message_id):
+        raise NotImplementedError()
+
+    def get_by_sequence(self, sequence):
+        raise NotImplementedError()
+
+    def get_by_hash(self, hash_id):
+        raise NotImplementedError()
+
+    def get_slot(self):
+        '''
+        the last committed slot, `0` if no slot was committed
+        '''
+        return 0 if self.slot is None else self.slot
+
+    def sync(self, slot=None):
+        '''
+        makes the appended messages durable with the last committed `slot`;
+        `Storage` calls it after the messages of the committed slot are
+        appended
+        '''
+        if slot is not None:
+            self.slot = slot
+
+        return
+
+    def close(self):
+        return
+
+
+class MemoryLedger(BaseLedger):
+    messages = None
+    message_ids = None
+    hash_ids = None
+
+    def __init__(self):
+        self.messages = list()
+        self.message_ids = dict()
+        self.hash_ids = dict()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, message):
+        assert isinstance(message, Message)
+
+        self.message_ids[message.message_id] = len(self.messages)
+        self.hash_ids.setdefault(message.hash_id, list()).append(message.message_id)
+        self.messages.append(message)
+
+        return len(self.messages) - 1
+
+    def has(self, message_id):
+        return message_id in self.message_ids
+
+    def get(self, message_id):
+        sequence = self.message_ids.get(message_id)
+        if sequence is None:
+            return None
+
+        return self.messages[sequence]
+
+    def get_sequence(self, message_id):
+        return self.message_ids.get(message_id)
+
+    def get_by_sequence(self, sequence):
+        if sequence < 0:
+            return None
+
+        try:
+            return self.messages[sequence]
+        except IndexError:
+            return None
+
+    def get_by_hash(self, hash_id):
+        return list(map(self.get, self.hash_ids.get(hash_id, ())))
+
+
+def digest_key(key):
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+
+class SequenceTable:
+    '''
+    the hash table of ledger sequences in the memory-mapped file, so the
+    ledger is looked up by the key without loading the keys in memory.
+
+    the table is the open addressing of `capacity` slots with the linear
+    probing, every slot has `sequence + 1` and `0` is empty. the keys are not
+    kept in the table, the key of sequence is read by `get_key(sequence)`
+    from the index of ledger, so one key can have multiple sequences, like
+    `hash_id`. the slots of the sequences, which are not in the ledger any
+    more after the recovery, are skipped by the lookups.
+    '''
+
+    class CorruptedTableError(Exception):
+        pass
+
+    magic = b'FBASEQ01'
+    header = struct.Struct('>8sQQQ')  # magic, capacity, used and indexed
+    slot = struct.Struct('>Q')
+
+    initial_capacity = 8192
+
+    path = None
+    get_key = None
+    capacity = None
+    used = None
+    indexed = None
+
+    def __init__(self, path, get_key):
+        self.path = path
+        self.get_key = get_key
+        self.table = None
+        self.fd = None
+
+        if not os.path.exists(path):
+            self._create(path, self.initial_capacity)
+
+        try:
+            self._open()
+        except SequenceTable.CorruptedTableError as e:
+            # the new empty table is filled by the ledger, it's `indexed` is 0
+            log.storage.warning('%s: invalid table was dropped: %s', path, e)
+            self._create(path, self.initial_capacity)
+            self._open()
+
+    def _create(self, path, capacity):
+        with open(path, 'wb') as f:
+            f.write(self.header.pack(self.magic, capacity, 0, 0))
+            f.truncate(self.header.size + capacity * self.slot.size)
+
+        return
+
+    def _open(self):
+        self.close()
+
+        self.fd = os.open(self.path, os.O_RDWR)
+        if os.fstat(self.fd).st_size < self.header.size:
+            raise SequenceTable.CorruptedTableError('table file is too short')
+
+        self.table = mmap.mmap(self.fd, 0)
+        magic, self.capacity, self.used, self.indexed = self.header.unpack_from(self.table, 0)
+        if magic != self.magic or self.capacity < 1 or self.capacity & (self.capacity - 1) != 0:
+            raise SequenceTable.CorruptedTableError('invalid table file')
+
+        if len(self.table) != self.header.size + self.capacity * self.slot.size:
+            raise SequenceTable.CorruptedTableError('invalid size of table file')
+
+        return
+
+    def _get_slot(self, position):
+        return self.slot.unpack_from(self.table, self.header.size + position * self.slot.size)[0]
+
+    def _set_slot(self, position, value):
+        self.slot.pack_into(self.table, self.header.size + position * self.slot.size, value)
+
+        return
+
+    def find(self, key, count, first=False):
+        '''
+        returns the sequences of `key` under `count`; with `first`, only the
+        first found one
+        '''
+        sequences = list()
+
+        # the hot path of `Storage.is_exists()`, the lookups are kept local
+        get_key = self.get_key
+        unpack_from = self.slot.unpack_from
+        offset, size = self.header.size, self.slot.size
+        mask = self.capacity - 1
+        position = int.from_bytes(key[:8], 'big') & mask
+        while True:
+            value = unpack_from(self.table, offset + position * size)[0]
+            if value == 0:
+                break
+
+            if value <= count and get_key(value - 1) == key:
+                sequences.append(value - 1)
+                if first:
+                    break
+
+            position = (position + 1) & mask
+
+        return sequences
+
+    def add(self, key, sequence):
+        if (self.used + 1) * 2 > self.capacity:
+            self._grow(sequence)
+
+        mask = self.capacity - 1
+        position = int.from_bytes(key[:8], 'big') & mask
+        while True:
+            value = self._get_slot(position)
+            if value == sequence + 1:
+                return
+
+            if value == 0:
+                self._set_slot(position, sequence + 1)
+                self.used += 1
+
+                return
+
+            position = (position + 1) & mask
+
+    def _fill(self, sequences):
+        for sequence in sequences:
+            self.add(self.get_key(sequence), sequence)
+
+        return
+
+    def _grow(self, count):
+        '''
+        the sequences under `count` are moved to the new table of the double
+        capacity, which replaces the current file at once
+        '''
+        sequences = set()
+        for position in range(self.capacity):
+            value = self._get_slot(position)
+            if 0 < value <= count:
+                sequences.add(value - 1)
+
+        self.rebuild(sorted(sequences), self.capacity * 2)
+
+        return
+
+    def rebuild(self, sequences, capacity=None):
+        sequences = list(sequences)
+        if capacity is None:
+            capacity = self.initial_capacity
+            while len(sequences) * 2 >= capacity:
+                capacity *= 2
+
+        self.close()
+        self._create(self.path + '.tmp', capacity)
+        os.replace(self.path + '.tmp', self.path)
+        self._open()
+
+        self._fill(sequences)
+
+        return
+
+    def flush(self, indexed):
+        '''
+        the sequences under `indexed` are in the table
+        '''
+        self.indexed = indexed
+        self.header.pack_into(self.table, 0, self.magic, self.capacity, self.used, self.indexed)
+        self.table.flush()
+
+        return
+
+    def close(self):
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+        return
+
+
+class FileLedger(BaseLedger):
+    '''
+    append-only ledger on disk.
+
+    the messages are appended to the segment file, `ledger.log`, as records of
+    `length`, `crc32` and the json payload. the fixed-width offset index,
+    `ledger.idx`, is memory-mapped and has the offset, length and digests of
+    `message_id` and `hash_id` of every record, so any record is read with one
+    `pread` by sequence. the sequences are looked up by the digests of
+    `message_id` and `hash_id` in the memory-mapped `SequenceTable`s,
+    `ledger.mid` and `ledger.hid`, so no key is kept in memory and the ledger
+    is opened without reading the committed records.
+
+    durability: the records are fsync'ed by `sync()`, which `Storage` calls
+    once the messages of the committed slot are appended, so the slot is on
+    disk before it is reported as confirmed; while the big batch is appended,
+    the records are also fsync'ed every `sync_every` records. the segment is
+    synced before the tables and the committed count and slot of index are
+    updated, so the slot is not committed without it's messages. at
+    start, only the records after the committed index are verified; the valid
+    records are indexed and the torn tail is truncated. the tables, which
+    miss any committed record, are rebuilt from the index.
+    '''
+
+    class CorruptedLedgerError(Exception):
+        pass
+
+    segment_name = 'ledger.log'
+    index_name = 'ledger.idx'
+    message_table_name = 'ledger.mid'
+    hash_table_name = 'ledger.hid'
+
+    index_magic = b'FBAIDX02'
+    index_header = struct.Struct('>8sQQ')  # magic, committed count and slot
+    index_entry = struct.Struct('>QI16s16s')
+    index_chunk = 4096  # number of index entries allocated at once
+
+    record_header = struct.Struct('>II')
+
+    path = None
+    sync_every = None
+
+    def __init__(self, path, sync_every=64):
+        assert sync_every > 0
+
+        self.path = path
+        self.sync_every = sync_every
+
+        os.makedirs(path, exist_ok=True)
+
+        self.segment = open(os.path.join(path, self.segment_name), 'a+b')
+        self.index_fd = os.open(os.path.join(path, self.index_name), os.O_RDWR | os.O_CREAT, 0o644)
+        self.index = None
+
+        self.count = 0
+        self.committed = 0
+        self.size = 0
+        self.flushed_size = 0
+
+        self._open_index()
+
+        self.message_table = SequenceTable(
+            os.path.join(path, self.message_table_name),
+            self._get_message_key,
+        )
+        self.hash_table = SequenceTable(
+            os.path.join(path, self.hash_table_name),
+            self._get_hash_key,
+        )
+
+        self._recover()
+
+    def __len__(self):
+        return self.count
+
+    def _map_index(self, capacity):
+        if self.index is not None:
+            self.index.close()
+
+        os.ftruncate(self.index_fd, self.index_header.size + capacity * self.index_entry.size)
+        self.index = mmap.mmap(self.index_fd, 0)
+        self.capacity = capacity
+
+        return
+
+    def _open_index(self):
+        index_size = os.fstat(self.index_fd).st_size
+        if index_size < self.index_header.size:
+            self._map_index(self.index_chunk)
+            self.index_header.pack_into(self.index, 0, self.index_magic, 0, 0)
+
+            return
+
+        capacity = (index_size - self.index_header.size) // self.index_entry.size
+        self._map_index(max(capacity, self.index_chunk))
+
+        magic, committed, self.slot = self.index_header.unpack_from(self.index, 0)
+        if magic != self.index_magic:
+            raise FileLedger.CorruptedLedgerError('invalid index file: %s' % self.path)
+
+        self.committed = min(committed, self.capacity)
+
+        return
+
+    def _entry(self, sequence):
+        return self.index_entry.unpack_from(self.index, self.index_header.size + sequence * self.index_entry.size)
+
+    def _get_message_key(self, sequence):
+        # the digests follow the offset and length, `>QI`, in the entry
+        offset = self.index_header.size + sequence * self.index_entry.size + 12
+
+        return self.index[offset:offset + 16]
+
+    def _get_hash_key(self, sequence):
+        offset = self.index_header.size + sequence * self.index_entry.size + 28
+
+        return self.index[offset:offset + 16]
+
+    def _read_record(self, offset):
+        header = os.pread(self.segment.fileno(), self.record_header.size, offset)
+        if len(header) < self.record_header.size:
+            return None
+
+        length, crc = self.record_header.unpack(header)
+        payload = os.pread(self.segment.fileno(), length, offset + self.record_header.size)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return None
+
+        return payload
+
+    def _recover(self):
+        segment_size = os.fstat(self.segment.fileno()).st_size
+
+        # the committed entries were synced after the segment, but the segment
+        # can be truncated by hand, so the last committed entries are verified
+        while self.committed > 0:
+            offset, length, _, _ = self._entry(self.committed - 1)
+            if offset + length <= segment_size and self._read_record(offset) is not None:
+                break
+
+            log.storage.warning('%s: invalid index entry was dropped: %d', self.path, self.committed - 1)
+            self.committed -= 1
+
+        for table in (self.message_table, self.hash_table):
+            if table.indexed < self.committed:
+                log.storage.warning('%s: table is rebuilt from the index: %s', self.path, table.path)
+                table.rebuild(range(self.committed))
+
+        self.count = self.committed
+        offset = 0
+        if self.count > 0:
+            offset, length, _, _ = self._entry(self.count - 1)
+            offset += length
+
+        # index the valid records which were written after the last commit
+        while offset < segment_size:
+            payload = self._read_record(offset)
+            if payload is None:
+                break
+
+            o = json.loads(payload.decode())
+            length = self.record_header.size + len(payload)
+            self._put_entry(offset, length, o['message']['message_id'], o['message']['hash_id'])
+            offset += length
+
+        if offset < segment_size:
+            log.storage.warning(
+                '%s: torn tail records were truncated: %d bytes',
+                self.path,
+                segment_size - offset,
+            )
+            self.segment.truncate(offset)
+
+        self.size = self.flushed_size = offset
+        if self.count != self.committed:
+            self.sync()
+
+        return
+
+    def _put_entry(self, offset, length, message_id, hash_id):
+        if self.count >= self.capacity:
+            self._map_index(self.capacity + self.index_chunk)
+
+        message_key = digest_key(message_id)
+        hash_key = digest_key(hash_id)
+        self.index_entry.pack_into(
+            self.index,
+            self.index_header.size + self.count * self.index_entry.size,
+            offset,
+            length,
+            message_key,
+            hash_key,
+        )
+        self.count += 1
+
+        self.message_table.add(message_key, self.count - 1)
+        self.hash_table.add(hash_key, self.count - 1)
+
+        return
+
+    def append(self, message):
+        assert isinstance(message, Message)
+
+        payload = json.dumps(dict(node=message.node, message=message.to_message_dict())).encode()
+
+        self.segment.write(self.record_header.pack(len(payload), zlib.crc32(payload)))
+        self.segment.write(payload)
+
+        length = self.record_header.size + len(payload)
+        self._put_entry(self.size, length, message.message_id, message.hash_id)
+        self.size += length
+
+        if self.count - self.committed >= self.sync_every:
+            self.sync()
+
+        return self.count - 1
+
+    def sync(self, slot=None):
+        if slot is None:
+            slot = self.get_slot()
+
+        if self.count == self.committed and slot == self.get_slot():
+            return
+
+        self.segment.flush()
+        os.fsync(self.segment.fileno())
+        self.flushed_size = self.size
+
+        self.message_table.flush(self.count)
+        self.hash_table.flush(self.count)
+
+        self.index_header.pack_into(self.index, 0, self.index_magic, self.count, slot)
+        self.index.flush()
+        self.committed = self.count
+        self.slot = slot
+
+        return
+
+    def close(self):
+        if self.index is None:
+            return
+
+        self.sync()
+
+        self.message_table.close()
+        self.hash_table.close()
+
+        self.index.close()
+        self.index = None
+        os.close(self.index_fd)
+        self.segment.close()
+
+        return
+
+    def has(self, message_id):
+        return self.get_sequence(message_id) is not None
+
+    def get(self, message_id):
+        return self.get_by_sequence(self.get_sequence(message_id))
+
+    def get_sequence(self, message_id):
+        sequences = self.message_table.find(digest_key(message_id), self.count, first=True)
+
+        return sequences[0] if sequences else None
+
+    def get_by_sequence(self, sequence):
+        if sequence is None or sequence < 0 or sequence >= self.count:
+            return None
+
+        offset, length, _, _ = self._entry(sequence)
+        if offset + length > self.flushed_size:
+            self.segment.flush()
+            self.flushed_size = self.size
+
+        payload = self._read_record(offset)
+        if payload is None:
+            raise FileLedger.CorruptedLedgerError('invalid record found: sequence=%d' % sequence)
+
+        return Message.from_dict(json.loads(payload.decode()))
+
+    def get_by_hash(self, hash_id):
+        return list(map(self.get_by_sequence, sorted(self.hash_table.find(digest_key(hash_id), self.count))))
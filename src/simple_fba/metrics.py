@@ -0,0 +1,353 @@
+import asyncio
+import bisect
+import os
+import time
+
+from .util import log
+
+
+class BaseMetric:
+    '''
+    the metric has the children by the values of labels; the child of the
+    same labels is kept, so the caller gets it once by `labels()` and updates
+    it without the lookup.
+    '''
+
+    type_name = None
+
+    name = None
+    help = None
+    labelnames = None
+    children = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = dict()
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__, self.name)
+
+    def new_child(self):
+        raise NotImplementedError()
+
+    def labels(self, *values):
+        assert len(values) == len(self.labelnames)
+
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.new_child()
+
+        return child
+
+    def _format_labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+
+        return '{%s}' % ','.join(map(
+            lambda x: '%s="%s"' % (x[0], str(x[1]).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')),
+            pairs,
+        ))
+
+    def _format_samples(self, values, child):
+        raise NotImplementedError()
+
+    def to_prometheus(self):
+        lines = [
+            '# HELP %s %s' % (self.name, self.help),
+            '# TYPE %s %s' % (self.name, self.type_name),
+        ]
+        for values, child in sorted(self.children.items()):
+            lines.extend(self._format_samples(values, child))
+
+        return lines
+
+
+class CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+        return
+
+
+class Counter(BaseMetric):
+    type_name = 'counter'
+
+    def new_child(self):
+        return CounterChild()
+
+    def _format_samples(self, values, child):
+        return ('%s%s %s' % (self.name, self._format_labels(values), child.value),)
+
+
+class GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+        return
+
+    def inc(self, amount=1):
+        self.value += amount
+
+        return
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+        return
+
+
+class Gauge(BaseMetric):
+    type_name = 'gauge'
+
+    def new_child(self):
+        return GaugeChild()
+
+    def _format_samples(self, values, child):
+        return ('%s%s %s' % (self.name, self._format_labels(values), child.value),)
+
+
+class HistogramChild:
+    '''
+    the counts are kept by bucket and accumulated when exported
+    '''
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+        return
+
+
+class Histogram(BaseMetric):
+    type_name = 'histogram'
+
+    # seconds, from 1ms to 10s
+    default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    buckets = None
+
+    def __init__(self, name, help, labelnames=(), buckets=None):
+        super(Histogram, self).__init__(name, help, labelnames)
+
+        self.buckets = tuple(sorted(self.default_buckets if buckets is None else buckets))
+
+    def new_child(self):
+        return HistogramChild(self.buckets)
+
+    def _format_samples(self, values, child):
+        lines = list()
+
+        accumulated = 0
+        for bucket, count in zip(self.buckets + ('+Inf',), child.counts):
+            accumulated += count
+            lines.append('%s_bucket%s %d' % (self.name, self._format_labels(values, (('le', bucket),)), accumulated))
+
+        lines.append('%s_sum%s %s' % (self.name, self._format_labels(values), child.sum))
+        lines.append('%s_count%s %d' % (self.name, self._format_labels(values), child.count))
+
+        return lines
+
+
+class Registry:
+    '''
+    the metrics by name; `counter()`, `gauge()` and `histogram()` return the
+    registered metric of the same name or register the new one. the
+    durations are measured by `clock`, by default, `time.monotonic()`.
+    '''
+
+    metrics = None
+    clock = None
+
+    def __init__(self, clock=time.monotonic):
+        self.metrics = dict()
+        self.clock = clock
+
+    def __contains__(self, name):
+        return name in self.metrics
+
+    def get(self, name):
+        return self.metrics.get(name)
+
+    def _register(self, metric_class, name, help, labelnames, **kw):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = metric_class(name, help, labelnames, **kw)
+
+        assert type(metric) is metric_class
+        assert metric.labelnames == tuple(labelnames)
+
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=None):
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def to_prometheus(self):
+        '''
+        the prometheus text format
+        '''
+        lines = list()
+        for name in sorted(self.metrics):
+            lines.extend(self.metrics[name].to_prometheus())
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        '''
+        the file is replaced at once, so the reader does not see the partial
+        metrics
+        '''
+        temporary = '%s.tmp' % path
+        with open(temporary, 'w') as f:
+            f.write(self.to_prometheus())
+
+        os.replace(temporary, path)
+
+        return
+
+
+class MetricsFileWriter:
+    '''
+    writes the metrics to `path` every `interval` seconds in the loop
+    '''
+
+    registry = None
+    path = None
+    interval = None
+    loop = None
+    handle = None
+
+    def __init__(self, registry, path, interval, loop):
+        assert isinstance(registry, Registry)
+        assert interval > 0
+
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.loop = loop
+
+    def start(self):
+        self.handle = self.loop.call_later(self.interval, self.write)
+
+        return
+
+    def write(self):
+        try:
+            self.registry.write(self.path)
+        except OSError as e:
+            log.main.error('failed to write metrics to %s: %s', self.path, e)
+
+        self.handle = self.loop.call_later(self.interval, self.write)
+
+        return
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+        self.registry.write(self.path)
+
+        return
+
+
+class MetricsServer:
+    '''
+    serves the metrics over http in the loop; every `GET` request gets the
+    metrics in the prometheus text format.
+    '''
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    registry = None
+    host = None
+    port = None
+    loop = None
+    server = None
+
+    def __init__(self, registry, host, port, loop):
+        assert isinstance(registry, Registry)
+
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.loop = loop
+
+    def start(self):
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self.handle_connection, self.host, self.port),
+        )
+
+        log.main.debug('metrics are served at http://%s:%d/metrics', self.host, self.port)
+
+        return
+
+    def stop(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+        return
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request = await reader.readline()
+
+            # the headers are not used
+            while True:
+                line = await reader.readline()
+                if not line or line in (b'\r\n', b'\n'):
+                    break
+
+            method = request.split(b' ', 1)[0]
+            if method in (b'GET', b'HEAD'):
+                status = '200 OK'
+                body = self.registry.to_prometheus().encode()
+            else:
+                status = '405 Method Not Allowed'
+                body = b''
+
+            writer.write((
+                'HTTP/1.0 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % (
+                    status,
+                    self.content_type,
+                    len(body),
+                )
+            ).encode())
+            if method != b'HEAD':
+                writer.write(body)
+
+            await writer.drain()
+        except (ConnectionError, OSError) as e:
+            log.main.debug('metrics connection was lost: %s', e)
+        finally:
+            writer.close()
+
+        return
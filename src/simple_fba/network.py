@@ -1,9 +1,11 @@
 import asyncio
+import collections
 import time
 import math
 import hashlib
 import json
 from socket import socketpair
+import struct
 import urllib.parse
 import uuid
 
@@ -13,28 +15,104 @@ from .util import log
 CLOCK_SEQ = int(time.time() * 1000000)
 
 
+# every algorithm makes the digest of 20 bytes, so the `hash_id` can be packed
+# in the same size
+HASH_ALGORITHMS = dict(
+    sha1=hashlib.sha1,
+    blake2b=lambda x: hashlib.blake2b(x, digest_size=20),
+)
+HASH_ALGORITHM = 'sha1'
+
+
+def set_hash_algorithm(name):
+    '''
+    all the nodes of network must use the same hash algorithm
+    '''
+    global HASH_ALGORITHM
+
+    assert name in HASH_ALGORITHMS
+
+    HASH_ALGORITHM = name
+
+    return
+
+
+def get_hash(data):
+    return HASH_ALGORITHMS[HASH_ALGORITHM](data)
+
+
+MESSAGE_TYPES = dict()
+
+
+def register_message_type(cls):
+    '''
+    the decoded object is loaded by the class of it's `type_name`; the new
+    message type just need to be registered with `type_name` and
+    `from_dict()`.
+    '''
+    assert cls.type_name is not None
+
+    MESSAGE_TYPES[cls.type_name] = cls
+
+    return cls
+
+
+def load_message_object(o):
+    if not isinstance(o, dict) or 'type_name' not in o:
+        raise Message.InvalidMessageError('field, `type_name` is missing: %s' % o)
+
+    # the unhashable `type_name`, like list, can not be looked up
+    if not isinstance(o['type_name'], str):
+        raise Message.InvalidMessageError('invalid `type_name`: %s' % o['type_name'])
+
+    cls = MESSAGE_TYPES.get(o['type_name'])
+    if cls is None:
+        raise Message.InvalidMessageError('unknown `type_name`: %s' % o['type_name'])
+
+    return cls.from_dict(o)
+
+
 class Message:
+    '''
+    message is immutable, so the same instance can be shared by the pending
+    storage, ballots and ledger without copying.
+    '''
+
     class InvalidMessageError(Exception):
         pass
 
-    message_id = None
-    hash_id = None
-    data = None
+    __slots__ = ('node', 'message_id', 'hash_id', 'data', 'encoded_size')
+
+    type_name = 'message'
 
     def __init__(self, node, message_id, hash_id, data):
+        '''
+        `hash_id` is not verified here, the received messages are verified
+        once by `HashVerifier`
+        '''
         assert isinstance(data, str)
         assert message_id is not None
-        assert hash_id == hashlib.sha1(data.encode()).hexdigest()
 
-        self.node = node
-        self.message_id = message_id
-        self.hash_id = hash_id
-        self.data = data
+        object.__setattr__(self, 'node', node)
+        object.__setattr__(self, 'message_id', message_id)
+        object.__setattr__(self, 'hash_id', hash_id)
+        object.__setattr__(self, 'data', data)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('message is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('message is immutable')
+
+    def __reduce__(self):
+        return (self.__class__, (self.node, self.message_id, self.hash_id, self.data))
 
     def __repr__(self):
-        d = self.__dict__.copy()
-        d['data'] = d['data'] if len(d['data']) < 10 else (d['data'][:10] + '...')
-        return '<Message: node=%(node)s message_id=%(message_id)s data=%(data)s>' % d
+        return '<Message: node=%s message_id=%s data=%s>' % (
+            self.node,
+            self.message_id,
+            self.data if len(self.data) < 10 else (self.data[:10] + '...'),
+        )
 
     def __eq__(self, message):
         if not isinstance(message, Message):
@@ -52,12 +130,7 @@ class Message:
         return True
 
     def copy(self):
-        return self.__class__(
-            self.node,
-            self.message_id,
-            self.hash_id,
-            self.data,
-        )
+        return self
 
     def to_dict(self):
         return dict(
@@ -71,20 +144,20 @@ class Message:
             data=self.data,
         )
 
-    def serialize(self, node):
+    def serialize(self, node=None):
         d = self.to_dict()
-        d['node'] = node.name
-        d['type_name'] = 'message'
+        d['node'] = node.name if node is not None else self.node
+        d['type_name'] = self.type_name
         return json.dumps(d) + '\r\n\r\n'
 
     @classmethod
-    def new(cls, data):
+    def new(cls, data, node=None):
         assert isinstance(data, str)
 
         return cls(
-            None,
+            node,
             uuid.uuid1(clock_seq=CLOCK_SEQ).hex,
-            hashlib.sha1(data.encode()).hexdigest(),
+            get_hash(data.encode()).hexdigest(),
             data,
         )
 
@@ -95,28 +168,246 @@ class Message:
         except json.decoder.JSONDecodeError as e:
             raise cls.InvalidMessageError(e)
 
-        if 'type_name' not in o or o['type_name'] != 'message':
+        if 'type_name' not in o or o['type_name'] != cls.type_name:
             raise cls.InvalidMessageError('`type_name` is not "message"')
 
+        return cls.from_dict(o)
+
+    @classmethod
+    def from_dict(cls, o):
+        '''
+        `o` is the received data, so the fields are checked here instead of
+        by the asserts of `__init__()`
+        '''
         try:
             m = o['message']
-            return cls(o['node'], m['message_id'], m['hash_id'], m['data'])
-        except KeyError as e:
+            node, message_id, hash_id, data = o['node'], m['message_id'], m['hash_id'], m['data']
+        except (KeyError, TypeError) as e:
             raise cls.InvalidMessageError(e)
 
+        if not isinstance(message_id, str) or not isinstance(hash_id, str) or not isinstance(data, str):
+            raise cls.InvalidMessageError('invalid fields of message: %s' % m)
+
+        # the node is the client, which sent the message
+        if not isinstance(node, str) or len(node) < 1:
+            raise cls.InvalidMessageError('invalid `node` of message: %s' % node)
+
+        return cls(node, message_id, hash_id, data)
+
+    def get_message(self):
+        return self
+
+    def get_messages(self):
+        return (self,)
+
+    def verify(self):
+        return self.hash_id == get_hash(self.data.encode()).hexdigest()
+
+    @property
+    def size(self):
+        '''
+        bytes of the utf-8 encoded `data`, counted once; the ascii data is not
+        encoded for this
+        '''
+        try:
+            return self.encoded_size
+        except AttributeError:
+            pass
+
+        data = self.data
+        object.__setattr__(self, 'encoded_size', len(data) if data.isascii() else len(data.encode()))
+
+        return self.encoded_size
+
+
+register_message_type(Message)
+
+
+def load_ballot_message_object(o):
+    '''
+    the message of ballot can be `Message` or `MessageBatch`
+    '''
+    if isinstance(o.get('message'), dict) and 'messages' in o['message']:
+        return MessageBatch.from_dict(o)
+
+    return Message.from_dict(o)
+
+
+def get_merkle_root(hash_ids):
+    assert len(hash_ids) > 0
+
+    level = list(map(bytes.fromhex, hash_ids))
+    while len(level) > 1:
+        if len(level) % 2 == 1:
+            level.append(level[-1])
+
+        level = list(map(
+            lambda x: get_hash(level[x] + level[x + 1]).digest(),
+            range(0, len(level), 2),
+        ))
+
+    return level[0].hex()
+
+
+class MessageBatch:
+    '''
+    multiple messages in one ballot; `hash_id` is the merkle root of the
+    `hash_id`s of messages.
+    '''
+
+    message_id = None
+    hash_id = None
+    messages = None
+    node = None
+
+    def __init__(self, message_id, hash_id, messages):
+        assert message_id is not None
+        assert len(messages) > 0
+        assert len(list(filter(lambda x: not isinstance(x, Message), messages))) < 1
+
+        self.message_id = message_id
+        self.hash_id = hash_id
+        self.messages = tuple(messages)
+
+    def __repr__(self):
+        return '<MessageBatch: message_id=%s messages=%d>' % (self.message_id, len(self.messages))
+
+    def __eq__(self, message):
+        if not isinstance(message, MessageBatch):
+            return False
+
+        if message.message_id != self.message_id:
+            return False
+
+        if message.hash_id != self.hash_id:
+            return False
+
+        return True
+
+    def copy(self):
+        return self.__class__(self.message_id, self.hash_id, self.messages)
+
+    def to_dict(self):
+        return dict(
+            message=self.to_message_dict(),
+        )
+
+    def to_message_dict(self):
+        return dict(
+            hash_id=self.hash_id,
+            message_id=self.message_id,
+            messages=list(map(lambda x: dict(node=x.node, message=x.to_message_dict()), self.messages)),
+        )
+
+    @classmethod
+    def new(cls, messages):
+        return cls(
+            uuid.uuid1(clock_seq=CLOCK_SEQ).hex,
+            get_merkle_root(list(map(lambda x: x.hash_id, messages))),
+            messages,
+        )
+
     @classmethod
     def from_dict(cls, o):
-        m = o['message']
-        return cls(o['node'], m['message_id'], m['hash_id'], m['data'])
+        try:
+            m = o['message']
+            message_id, hash_id, messages = m['message_id'], m['hash_id'], m['messages']
+        except (KeyError, TypeError, ValueError) as e:
+            raise Message.InvalidMessageError(e)
+
+        if not isinstance(message_id, str) or not isinstance(hash_id, str):
+            raise Message.InvalidMessageError('invalid fields of batch: %s' % m)
+
+        if not isinstance(messages, list) or len(messages) < 1:
+            raise Message.InvalidMessageError('`messages` of batch must be the non-empty list')
+
+        return cls(message_id, hash_id, list(map(Message.from_dict, messages)))
 
     def get_message(self):
         return self
 
+    def get_messages(self):
+        return self.messages
+
+    def verify(self):
+        '''
+        only the merkle root is verified, the messages are verified by themselves
+        '''
+        try:
+            return self.hash_id == get_merkle_root(list(map(lambda x: x.hash_id, self.messages)))
+        except ValueError:
+            # the `hash_id` of the received message is not hex
+            return False
+
+    @property
+    def size(self):
+        return sum(map(lambda x: x.size, self.messages))
+
+
+class HashVerifier:
+    '''
+    verifies the `hash_id` of the received messages and batches. the verified
+    ones are kept upto `size` by `message_id` and the same message, which is
+    received again in the other ballot messages, is not hashed again; it is
+    trusted only if it's `hash_id` and data are same with the verified one.
+    '''
+
+    verified = None
+    size = None
+
+    def __init__(self, size=10000):
+        assert size > 0
+
+        self.size = size
+        self.verified = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.verified)
+
+    def _get_content(self, message):
+        if isinstance(message, MessageBatch):
+            return tuple(map(lambda x: x.hash_id, message.messages))
+
+        return message.data
+
+    def _verify(self, message):
+        content = self._get_content(message)
+
+        verified = self.verified.get(message.message_id)
+        if verified is not None and verified[0] == message.hash_id and verified[1] == content:
+            self.verified.move_to_end(message.message_id)
+            self.hits += 1
+
+            return True
+
+        self.misses += 1
+        if not message.verify():
+            return False
+
+        self.verified[message.message_id] = (message.hash_id, content)
+        while len(self.verified) > self.size:
+            self.verified.popitem(last=False)
+
+        return True
+
+    def verify(self, message):
+        '''
+        `message` is `Message` or `MessageBatch`
+        '''
+        for i in message.get_messages():
+            if not self._verify(i):
+                return False
+
+        if isinstance(message, MessageBatch):
+            return self._verify(message)
+
+        return True
+
 
 class Endpoint:
-    scheme = None
-    host = None
-    port = None
+    __slots__ = ('scheme', 'host', 'port')
 
     def __init__(self, scheme, host, port):
         self.scheme = scheme
@@ -124,7 +415,7 @@ class Endpoint:
         self.port = port
 
     def __str__(self):
-        return '<Endpoint: %(scheme)s://%(host)s:%(port)d>' % self.__dict__
+        return '<Endpoint: %s://%s:%d>' % (self.scheme, self.host, self.port)
 
     @classmethod
     def from_uri(cls, uri):
@@ -132,13 +423,20 @@ class Endpoint:
 
         return cls(parsed.scheme, parsed.hostname, parsed.port)
 
+    @classmethod
+    def get(cls, uri):
+        '''
+        the interned endpoint of `uri`, see `NodeRegistry`
+        '''
+        return NODE_REGISTRY.get_endpoint(uri)
+
     @property
     def uri(self):
-        return '%(scheme)s://%(host)s:%(port)d' % self.__dict__
+        return '%s://%s:%d' % (self.scheme, self.host, self.port)
 
     def to_dict(self, simple=True):
         if simple:
-            return '%(scheme)s://%(host)s:%(port)s' % self.__dict__
+            return '%s://%s:%s' % (self.scheme, self.host, self.port)
 
         return dict(
             scheme=self.scheme,
@@ -148,33 +446,110 @@ class Endpoint:
 
 
 class Quorum:
+    '''
+    every validator has the stable integer index in the quorum, the node,
+    which is not validator like the owner node of quorum, gets the next index
+    when it is asked by `get_index()`; the index is not changed even after the
+    validator is removed.
+
+    `dissemination` decides how the ballot votes are spread in the quorum,
+
+    * `flood`: every node sends it's votes to all the validators
+    * `relay`: every node sends the new votes to `fanout` relay nodes, see
+      `get_relay_nodes()`, and the relay nodes forward the new votes to their
+      relay nodes.
+    '''
+
+    dissemination_flood = 'flood'
+    dissemination_relay = 'relay'
+
     validators = None
     threshold = None
+    names = None
+    indexes = None
+    validator_names = None
+    dissemination = None
+    fanout = None
 
-    def __init__(self, threshold, validators):
+    def __init__(self, threshold, validators, dissemination=dissemination_flood, fanout=None):
         assert type(threshold) in (float, int)
         assert threshold <= 100 and threshold > 0  # threshold must be percentile
         assert len(
             list(filter(lambda x: not isinstance(x, Node), validators))
         ) < 1
+        assert dissemination in (Quorum.dissemination_flood, Quorum.dissemination_relay)
+        assert fanout is None or fanout > 0
 
         self.threshold = threshold
-        self.validators = validators
+        self.validators = list(validators)
+        self.dissemination = dissemination
+        self.fanout = fanout
+
+        self.names = list()
+        self.indexes = dict()
+        for node in self.validators:
+            self.get_index(node.name)
+
+        self.validator_names = set(map(lambda x: x.name, self.validators))
+
+        for node in self.validators:
+            NODE_REGISTRY.register(node)
 
     def __repr__(self):
-        return '<Quorum: threshold=%(threshold)s validators=%(validators)s>' % self.__dict__
+        return '<Quorum: threshold=%s dissemination=%s validators=%s>' % (
+            self.threshold,
+            self.dissemination,
+            self.validators,
+        )
+
+    def get_index(self, name):
+        index = self.indexes.get(name)
+        if index is None:
+            index = self.indexes[name] = len(self.names)
+            self.names.append(name)
+
+        return index
+
+    def get_name(self, index):
+        return self.names[index]
 
     def is_inside(self, node):
-        return len(list(filter(lambda x: x.name == node.name, self.validators))) > 0
+        return node.name in self.validator_names
 
     def remove(self, node):
         if not self.is_inside(node):
             return
 
-        self.validators = filter(lambda x: x != node, self.validators)
+        self.validators = list(filter(lambda x: x != node, self.validators))
+        self.validator_names.discard(node.name)
 
         return
 
+    def get_relay_nodes(self, node):
+        '''
+        the relay nodes of `node` in the deterministic overlay; the nodes of
+        quorum are ordered by name and the node at `i` relays to the nodes at
+        `i + 1`, `i + 2`, `i + 4`, ..., upto `fanout` nodes, by default
+        `ceil(log2(<number of nodes>))`. the overlay is connected by `i + 1`
+        and every vote reaches all nodes in about `log2(<number of nodes>)`
+        hops. all the nodes of quorum should have the same validators.
+        '''
+        members = sorted(self.validator_names | set((node.name,)))
+        fanout = self.fanout
+        if fanout is None:
+            fanout = max(1, math.ceil(math.log2(len(members))))
+
+        validators = dict(map(lambda x: (x.name, x), self.validators))
+        position = members.index(node.name)
+
+        relay_nodes = list()
+        offset = 1
+        while offset < len(members) and len(relay_nodes) < fanout:
+            relay_nodes.append(validators[members[(position + offset) % len(members)]])
+            offset *= 2
+
+        return relay_nodes
+
     @property
     def minimum_quorum(self):
         '''
@@ -186,17 +561,16 @@ class Quorum:
         return dict(
             validators=list(map(lambda x: x.to_dict(simple), self.validators)),
             threshold=self.threshold,
+            dissemination=self.dissemination,
         )
 
 
 class Node:
-    name = None
-    endpoint = None
-    quorum = None
+    __slots__ = ('name', 'endpoint', 'quorum')
 
     def __init__(self, name, endpoint_string, quorum):
         self.name = name
-        self.endpoint = Endpoint.from_uri(endpoint_string)
+        self.endpoint = Endpoint.get(endpoint_string)
 
         if quorum is not None and quorum.is_inside(self):
             quorum.remove(self)
@@ -217,14 +591,276 @@ class Node:
         )
 
 
+class NodeRegistry:
+    '''
+    the per-process registry of `Node` and `Endpoint`; the decoders resolve
+    the sender name to the registered `Node` without parsing the endpoint
+    uri. the validators of `Quorum` are registered and the unknown names are
+    interned as the nodes without endpoint upto `max_unknown` names.
+    '''
+
+    nodes = None
+    endpoints = None
+    max_unknown = None
+
+    def __init__(self, max_unknown=10000):
+        self.max_unknown = max_unknown
+
+        self.nodes = dict()
+        self.endpoints = dict()
+        self.unknown = 0
+
+    def register(self, node):
+        assert isinstance(node, Node)
+
+        registered = self.nodes.get(node.name)
+        if registered is None or not registered.endpoint.scheme:
+            self.nodes[node.name] = node
+
+        return
+
+    def get(self, name):
+        node = self.nodes.get(name)
+        if node is not None:
+            return node
+
+        node = Node(name, None, None)
+        if self.unknown < self.max_unknown:
+            self.unknown += 1
+            self.nodes[name] = node
+
+        return node
+
+    def get_endpoint(self, uri):
+        endpoint = self.endpoints.get(uri)
+        if endpoint is None:
+            endpoint = Endpoint.from_uri(uri)
+            if len(self.endpoints) < self.max_unknown:
+                self.endpoints[uri] = endpoint
+
+        return endpoint
+
+
+NODE_REGISTRY = NodeRegistry()
+
+
+def get_node(name):
+    return NODE_REGISTRY.get(name)
+
+
+class BaseFramer:
+    '''
+    framer splits the received bytes into the frames. the complete frames in
+    the received data are returned as `memoryview`s of the data without
+    copying them; only the incomplete tail is kept in the buffer until the
+    next data arrives.
+
+    the frame bigger than `max_frame_size` is not buffered, `feed()` raises
+    `FrameTooLargeError` and the connection should be dropped.
+    '''
+
+    class FrameTooLargeError(Exception):
+        pass
+
+    buf = None
+    max_frame_size = 64 * 1024 * 1024
+
+    def __init__(self, max_frame_size=None):
+        self.buf = bytearray()
+
+        if max_frame_size is not None:
+            assert max_frame_size > 0
+
+            self.max_frame_size = max_frame_size
+
+    def reset(self):
+        '''
+        drops the buffered data
+        '''
+        self.buf = bytearray()
+
+        return
+
+    def _check_size(self, size):
+        if size > self.max_frame_size:
+            self.reset()
+
+            raise BaseFramer.FrameTooLargeError(
+                'frame is too large: %d > %d bytes' % (size, self.max_frame_size),
+            )
+
+        return
+
+    def feed(self, data):
+        raise NotImplementedError()
+
+    def _take(self, data):
+        '''
+        the buffered tail and the new data are joined; the joined buffer is
+        not resized after this, so the frames can refer it safely.
+        '''
+        if isinstance(data, str):
+            data = data.encode()
+
+        if len(self.buf) < 1:
+            return data
+
+        self.buf += data
+        data = self.buf
+        self.buf = bytearray()
+
+        return data
+
+
+class DelimiterFramer(BaseFramer):
+    '''
+    splits the received data by `data_delimeter`
+    '''
+
+    data_delimeter = b'\r\n\r\n'
+    scanned = None
+
+    def __init__(self, max_frame_size=None):
+        super(DelimiterFramer, self).__init__(max_frame_size=max_frame_size)
+
+        self.scanned = 0
+
+    def reset(self):
+        super(DelimiterFramer, self).reset()
+
+        self.scanned = 0
+
+        return
+
+    def feed(self, data):
+        # the buffered tail was already scanned, except the partial delimiter
+        start = max(0, self.scanned - len(self.data_delimeter) + 1)
+
+        data = self._take(data)
+        index = data.find(self.data_delimeter, start)
+        if index < 0:
+            self._check_size(len(data))
+
+            self.buf = data if isinstance(data, bytearray) else bytearray(data)
+            self.scanned = len(self.buf)
+
+            return list()
+
+        view = memoryview(data)
+        frames = list()
+        start = 0
+        while index >= 0:
+            self._check_size(index - start)
+
+            frames.append(view[start:index])
+            start = index + len(self.data_delimeter)
+            index = data.find(self.data_delimeter, start)
+
+        self._check_size(len(data) - start)
+
+        self.buf = bytearray(view[start:])
+        self.scanned = len(self.buf)
+
+        return frames
+
+
+class LengthPrefixFramer(BaseFramer):
+    '''
+    splits the received data into the frames prefixed by 4 bytes length; the
+    frame includes it's length prefix.
+    '''
+
+    length = struct.Struct('>I')
+
+    def feed(self, data):
+        if len(self.buf) >= self.length.size:
+            # not enough data for the buffered frame yet
+            size = self.length.size + self.length.unpack_from(self.buf)[0]
+            self._check_size(size)
+            if len(self.buf) + len(data) < size:
+                self.buf += data.encode() if isinstance(data, str) else data
+
+                return list()
+
+        data = self._take(data)
+
+        view = memoryview(data)
+        frames = list()
+        start = 0
+        while len(data) - start >= self.length.size:
+            size = self.length.size + self.length.unpack_from(data, start)[0]
+            self._check_size(size)
+
+            end = start + size
+            if len(data) < end:
+                break
+
+            frames.append(view[start:end])
+            start = end
+
+        self.buf = bytearray(view[start:])
+
+        return frames
+
+
 class BaseTransport:
+    '''
+    with `metrics`, `metrics.Registry`, the frames and bytes sent and
+    received are counted by `count_sent()` and `count_received()`.
+    '''
+
     name = None
     endpoint = None
+    codec = None
     message_received_callback = None
 
-    def __init__(self, name, endpoint):
+    metrics = None
+    metric_frames_sent = None
+    metric_bytes_sent = None
+    metric_frames_received = None
+    metric_bytes_received = None
+
+    def __init__(self, name, endpoint, codec=None, metrics=None):
         self.name = name
-        self.endpoint = Endpoint.from_uri(endpoint)
+        self.endpoint = Endpoint.get(endpoint)
+
+        if codec is None:
+            from .codec import JSONCodec  # noqa
+            codec = JSONCodec()
+
+        self.codec = codec
+
+        self.metrics = metrics
+        if metrics is not None:
+            self.metric_frames_sent = metrics.counter(
+                'simple_fba_transport_frames_sent_total', 'frames sent', ('node',),
+            ).labels(name)
+            self.metric_bytes_sent = metrics.counter(
+                'simple_fba_transport_bytes_sent_total', 'bytes sent', ('node',),
+            ).labels(name)
+            self.metric_frames_received = metrics.counter(
+                'simple_fba_transport_frames_received_total', 'frames received', ('node',),
+            ).labels(name)
+            self.metric_bytes_received = metrics.counter(
+                'simple_fba_transport_bytes_received_total', 'bytes received', ('node',),
+            ).labels(name)
+
+    def count_sent(self, frames, size):
+        '''
+        `frames` frames of `size` bytes in total were sent
+        '''
+        if self.metrics is not None:
+            self.metric_frames_sent.inc(frames)
+            self.metric_bytes_sent.inc(size)
+
+        return
+
+    def count_received(self, frames, size):
+        if self.metrics is not None:
+            self.metric_frames_received.inc(frames)
+            self.metric_bytes_received.inc(size)
+
+        return
 
     def receive(self, data):
         raise NotImplementedError()
@@ -235,6 +871,19 @@ class BaseTransport:
     def send(self, data):
         raise NotImplementedError()
 
+    def multicast(self, endpoints, data):
+        '''
+        sends the same data to the endpoints; the data is encoded only once
+        and the same buffer is shared by the endpoints.
+        '''
+        if isinstance(data, str):
+            data = data.encode()
+
+        for endpoint in endpoints:
+            self.send(endpoint, data)
+
+        return
+
     def start(self, message_received_callback):
         self.message_received_callback = message_received_callback
 
@@ -259,19 +908,26 @@ class LocalTransportProtocol(asyncio.Protocol):
 
 
 class LocalTransport(BaseTransport):
+    '''
+    the frames are written to the socketpair of the receiving transport
+    through it's `writer`, the asyncio transport of `wsock`, so the data,
+    which the socket can not take at once, are buffered and written later
+    by the loop.
+    '''
+
     loop = None
     rsock = None
     wsock = None
     protocol = None
+    writer = None
 
-    buf = None
-    data_delimeter = list('\r\n\r\n')
+    framer = None
 
-    def __init__(self, name, endpoint, loop):
-        super(LocalTransport, self).__init__(name, endpoint)
+    def __init__(self, name, endpoint, loop, codec=None, metrics=None):
+        super(LocalTransport, self).__init__(name, endpoint, codec=codec, metrics=metrics)
 
         self.loop = loop
-        self.buf = list()
+        self.framer = self.codec.new_framer()
         LOCAL_TRANSPORT_LIST[self.endpoint.uri] = self
 
     def start(self, *a, **kw):
@@ -283,60 +939,264 @@ class LocalTransport(BaseTransport):
         _, self.protocol = self.loop.run_until_complete(conn)
         self.protocol.data_received = self.data_receive
 
+        conn = self.loop.create_connection(asyncio.Protocol, sock=self.wsock)
+        self.writer, _ = self.loop.run_until_complete(conn)
+
         return
 
     def data_receive(self, data):
-        self.receive(data.decode())
+        self.receive(data)
 
         return
 
     def receive(self, data):
-        log.transport.debug('%s: received: %s', self.name, data.encode())
+        log.transport.debug('%s: received: %s', self.name, data)
 
-        if '\r\n\r\n' not in data:
-            self.buf.append(data)
+        try:
+            messages = self.framer.feed(data)
+        except BaseFramer.FrameTooLargeError as e:
+            # every peer writes to the same socket, so the socket is kept and
+            # only the buffered data are dropped
+            log.transport.error('%s: received data were dropped: %s', self.name, e)
+
+            self.framer.reset()
+
+            return
 
+        self.count_received(len(messages), len(data))
+        if len(messages) < 1:
             return
 
-        messages = list()
-        cr = list()
-        sl = self.buf
-        self.buf = list()
-        for s in data:
-            if s == self.data_delimeter[len(cr)]:
-                cr.append(s)
+        self.message_received_callback(messages)
+
+        return
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+
+        log.transport.debug('%s: wrote: %s', self.name, data)
+
+        self.writer.write(data)
+
+        return
+
+    def send(self, endpoint, data):
+        assert isinstance(endpoint, Endpoint)
+
+        log.transport.debug('%s: send: %s', self.name, data)
+
+        self.count_sent(1, len(data))
+        LOCAL_TRANSPORT_LIST[endpoint.uri].write(data)
+
+        return
+
+    def multicast(self, endpoints, data):
+        if isinstance(data, str):
+            data = data.encode()
 
-                if self.data_delimeter == cr:
-                    messages.append(''.join(sl))
-                    cr = list()
-                    sl = list()
+        log.transport.debug('%s: multicast: %d endpoints: %s', self.name, len(endpoints), data)
+
+        self.count_sent(len(endpoints), len(data) * len(endpoints))
+        for endpoint in endpoints:
+            LOCAL_TRANSPORT_LIST[endpoint.uri].writer.write(data)
+
+        return
+
+
+class TcpPeer:
+    '''
+    the persistent connection to the peer; the connection is reconnected with
+    exponential backoff. the data written in the same loop tick are queued
+    and written by one `writelines()`, the next queued data are written after
+    `drain()`, so the slow peer holds the data in the queue.
+    '''
+
+    endpoint = None
+    queue = None
+    writer = None
+    task = None
+
+    def __init__(self, transport, endpoint):
+        self.transport = transport
+        self.endpoint = endpoint
+        self.queue = list()
+        self.event = asyncio.Event()
+        self.task = asyncio.ensure_future(self.run(), loop=transport.loop)
+
+    def __repr__(self):
+        return '<TcpPeer: %s>' % self.endpoint.uri
+
+    def write(self, data):
+        self.queue.append(data)
+        self.event.set()
+
+        return
+
+    async def connect(self):
+        delay = self.transport.reconnect_delay
+        while True:
+            try:
+                _, writer = await asyncio.open_connection(self.endpoint.host, self.endpoint.port)
+            except OSError as e:
+                log.transport.debug('%s: failed to connect to %s: %s', self.transport.name, self.endpoint.uri, e)
+
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.transport.max_reconnect_delay)
 
                 continue
 
-            if len(cr) > 0 and s != self.data_delimeter[len(cr)]:
-                s = ''.join(cr) + s
-                cr = list()
+            log.transport.debug('%s: connected to %s', self.transport.name, self.endpoint.uri)
+
+            return writer
+
+    async def run(self):
+        while True:
+            self.writer = await self.connect()
+
+            buffers = list()
+            try:
+                while True:
+                    await self.event.wait()
+                    self.event.clear()
+
+                    buffers, self.queue = self.queue, list()
+                    self.writer.writelines(buffers)
+                    await self.writer.drain()
+                    buffers = list()
+            except (ConnectionError, OSError) as e:
+                log.transport.debug('%s: connection to %s was lost: %s', self.transport.name, self.endpoint.uri, e)
 
-            sl.append(s)
+                # the unconfirmed data will be written again after reconnected
+                self.queue[:0] = buffers
+                if self.queue:
+                    self.event.set()
 
-        if len(sl) > 0:
-            self.buf.extend(sl)
+                self.writer.close()
+                self.writer = None
+
+    def close(self):
+        self.task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+        return
+
+
+class TcpTransport(BaseTransport):
+    '''
+    asyncio stream transport for `tcp://` endpoints; every peer has one
+    persistent connection, `TcpPeer`.
+    '''
+
+    loop = None
+    server = None
+    peers = None
+
+    reconnect_delay = None
+    max_reconnect_delay = None
+    read_size = 64 * 1024
+
+    def __init__(self, name, endpoint, loop, codec=None, reconnect_delay=0.1, max_reconnect_delay=5, metrics=None):
+        super(TcpTransport, self).__init__(name, endpoint, codec=codec, metrics=metrics)
+
+        assert self.endpoint.scheme == 'tcp'
+
+        self.loop = loop
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.peers = dict()
+
+    def start(self, *a, **kw):
+        super(TcpTransport, self).start(*a, **kw)
+
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self.handle_connection, self.endpoint.host, self.endpoint.port),
+        )
+
+        log.transport.debug('%s: listening at %s', self.name, self.endpoint.uri)
+
+        return
+
+    def stop(self):
+        for peer in self.peers.values():
+            peer.close()
+
+        self.peers = dict()
+
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+        return
+
+    async def handle_connection(self, reader, writer):
+        framer = self.codec.new_framer()
+        try:
+            while True:
+                data = await reader.read(self.read_size)
+                if not data:
+                    break
+
+                self.receive(data, framer)
+        except BaseFramer.FrameTooLargeError as e:
+            log.transport.error('%s: connection was dropped: %s', self.name, e)
+        except (ConnectionError, OSError) as e:
+            log.transport.debug('%s: connection was lost: %s', self.name, e)
+        finally:
+            writer.close()
+
+        return
+
+    def receive(self, data, framer):
+        '''
+        every connection has it's own `framer`, the data of the different
+        connections are framed separately.
+        '''
+        log.transport.debug('%s: received: %s', self.name, data)
+
+        messages = framer.feed(data)
+        self.count_received(len(messages), len(data))
+        if len(messages) < 1:
+            return
 
         self.message_received_callback(messages)
 
         return
 
-    def write(self, data):
-        log.transport.debug('%s: wrote: %s', self.name, data.encode())
+    def get_peer(self, endpoint):
+        peer = self.peers.get(endpoint.uri)
+        if peer is None:
+            peer = self.peers[endpoint.uri] = TcpPeer(self, endpoint)
 
-        return self.wsock.send(data.encode())
+        return peer
 
     def send(self, endpoint, data):
         assert isinstance(endpoint, Endpoint)
 
-        log.transport.debug('%s: send: %s', self.name, data.strip().encode())
+        if isinstance(data, str):
+            data = data.encode()
 
-        LOCAL_TRANSPORT_LIST[endpoint.uri].write(data)
+        log.transport.debug('%s: send: %s: %s', self.name, endpoint.uri, data)
+
+        self.count_sent(1, len(data))
+        self.get_peer(endpoint).write(data)
+
+        return
+
+    def multicast(self, endpoints, data):
+        '''
+        the same bytes object is queued to every peer and each peer writes
+        it's queue with one `writelines()` in the next loop tick.
+        '''
+        if isinstance(data, str):
+            data = data.encode()
+
+        log.transport.debug('%s: multicast: %d endpoints: %s', self.name, len(endpoints), data)
+
+        self.count_sent(len(endpoints), len(data) * len(endpoints))
+        for endpoint in endpoints:
+            self.get_peer(endpoint).write(data)
 
         return
 
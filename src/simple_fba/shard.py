@@ -0,0 +1,270 @@
+import asyncio
+import collections
+import struct
+
+from .network import (
+    LOCAL_TRANSPORT_LIST,
+    Endpoint,
+    LocalTransport,
+)
+from .util import log
+
+
+class ShardRouter:
+    '''
+    the validators of simulator are split into the shards, the processes; the
+    router of shard delivers the frames to the other shards through the unix
+    sockets, `paths` by the index of shard, and hands the received frames to
+    the `LocalTransport`s of this shard.
+
+    the frames to the same shard are queued and written together by the
+    writer task of the shard in the next loop tick; the next queued frames are
+    written after `drain()`, so the slow shard holds the frames in the queue
+    instead of the write buffer of socket, and the frames queued before the
+    shard is connected are written after it is connected. the frame
+    multicasted to the validators of the same shard is written once in the
+    envelope,
+
+    envelope: `>HI`, number of endpoints and length of frame, the endpoints,
+        the length prefixed uri, and the frame
+    '''
+
+    envelope = struct.Struct('>HI')
+    u16 = struct.Struct('>H')
+
+    index = None
+    paths = None
+    shards = None
+    loop = None
+
+    server = None
+    writers = None
+    outbox = None
+    events = None
+    tasks = None
+
+    reconnect_delay = None
+    read_size = 256 * 1024
+
+    def __init__(self, index, paths, shards, loop, reconnect_delay=0.05):
+        '''
+        `shards` is the index of shard by the uri of endpoint
+        '''
+        assert 0 <= index < len(paths)
+
+        self.index = index
+        self.paths = paths
+        self.shards = shards
+        self.loop = loop
+        self.reconnect_delay = reconnect_delay
+
+        self.writers = dict()
+        self.outbox = collections.defaultdict(list)
+        self.events = collections.defaultdict(asyncio.Event)
+        self.tasks = dict()
+
+    def __repr__(self):
+        return '<ShardRouter: index=%d shards=%d>' % (self.index, len(self.paths))
+
+    def start(self):
+        self.server = self.loop.run_until_complete(
+            asyncio.start_unix_server(self.handle_connection, self.paths[self.index]),
+        )
+
+        log.transport.debug('%s: listening at %s', self, self.paths[self.index])
+
+        return
+
+    async def connect(self):
+        '''
+        connects to the other shards; waits until every shard is listening
+        '''
+        for index, path in enumerate(self.paths):
+            if index == self.index:
+                continue
+
+            while True:
+                try:
+                    _, self.writers[index] = await asyncio.open_unix_connection(path)
+                except OSError as e:
+                    log.transport.debug('%s: failed to connect to shard %d: %s', self, index, e)
+
+                    await asyncio.sleep(self.reconnect_delay)
+
+                    continue
+
+                break
+
+            self.tasks[index] = self.loop.create_task(self.write(index))
+            if self.outbox.get(index):
+                self.events[index].set()
+
+        log.transport.debug('%s: connected to shards', self)
+
+        return
+
+    def stop(self):
+        tasks, self.tasks = list(self.tasks.values()), dict()
+        for task in tasks:
+            task.cancel()
+
+        if tasks and not self.loop.is_running():
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+        for writer in self.writers.values():
+            writer.close()
+
+        self.writers = dict()
+
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+        return
+
+    def forward(self, endpoints, data):
+        grouped = collections.defaultdict(list)
+        for endpoint in endpoints:
+            grouped[self.shards[endpoint.uri]].append(endpoint)
+
+        for index, shard_endpoints in grouped.items():
+            buf = bytearray(self.envelope.pack(len(shard_endpoints), len(data)))
+            for endpoint in shard_endpoints:
+                encoded = endpoint.uri.encode()
+                buf += self.u16.pack(len(encoded))
+                buf += encoded
+
+            outbox = self.outbox[index]
+            outbox.append(bytes(buf))
+            outbox.append(data)
+
+            self.events[index].set()
+
+        return
+
+    async def write(self, index):
+        '''
+        writes the queued frames to the shard; `drain()` waits while the write
+        buffer is above the high-water mark
+        '''
+        writer = self.writers[index]
+        event = self.events[index]
+        try:
+            while True:
+                await event.wait()
+                event.clear()
+
+                buffers = self.outbox.pop(index, None)
+                if not buffers:
+                    continue
+
+                writer.writelines(buffers)
+                await writer.drain()
+        except (ConnectionError, OSError) as e:
+            log.transport.error('%s: connection to shard %d was lost: %s', self, index, e)
+
+        return
+
+    async def handle_connection(self, reader, writer):
+        buf = bytearray()
+        try:
+            while True:
+                data = await reader.read(self.read_size)
+                if not data:
+                    break
+
+                buf += data
+                offset = self.deliver(buf)
+                del buf[:offset]
+        except (ConnectionError, OSError) as e:
+            log.transport.debug('%s: connection was lost: %s', self, e)
+        finally:
+            writer.close()
+
+        return
+
+    def deliver(self, buf):
+        '''
+        delivers the complete envelopes in `buf`; returns the length of them
+        '''
+        offset = 0
+        while len(buf) - offset >= self.envelope.size:
+            count, size = self.envelope.unpack_from(buf, offset)
+
+            uris = list()
+            position = offset + self.envelope.size
+            for _ in range(count):
+                if len(buf) - position < self.u16.size:
+                    return offset
+
+                length, = self.u16.unpack_from(buf, position)
+                position += self.u16.size
+                if len(buf) - position < length:
+                    return offset
+
+                uris.append(bytes(buf[position:position + length]).decode())
+                position += length
+
+            if len(buf) - position < size:
+                return offset
+
+            data = bytes(buf[position:position + size])
+            offset = position + size
+
+            for uri in uris:
+                transport = LOCAL_TRANSPORT_LIST.get(uri)
+                if transport is None:
+                    log.transport.error('%s: unknown endpoint: %s', self, uri)
+
+                    continue
+
+                transport.write(data)
+
+        return offset
+
+
+class ShardTransport(LocalTransport):
+    '''
+    `LocalTransport` of the sharded simulator; the frames to the validators
+    of the same shard are written to their socketpairs and the others are
+    handed to `ShardRouter`.
+    '''
+
+    router = None
+
+    def __init__(self, name, endpoint, loop, router, codec=None, metrics=None):
+        assert isinstance(router, ShardRouter)
+
+        super(ShardTransport, self).__init__(name, endpoint, loop, codec=codec, metrics=metrics)
+
+        self.router = router
+
+    def send(self, endpoint, data):
+        assert isinstance(endpoint, Endpoint)
+
+        self.multicast((endpoint,), data)
+
+        return
+
+    def multicast(self, endpoints, data):
+        if isinstance(data, str):
+            data = data.encode()
+
+        log.transport.debug('%s: multicast: %d endpoints: %s', self.name, len(endpoints), data)
+
+        self.count_sent(len(endpoints), len(data) * len(endpoints))
+
+        remote = list()
+        for endpoint in endpoints:
+            transport = LOCAL_TRANSPORT_LIST.get(endpoint.uri)
+            if transport is None:
+                remote.append(endpoint)
+
+                continue
+
+            transport.writer.write(data)
+
+        if remote:
+            self.router.forward(remote, data)
+
+        return
@@ -0,0 +1,104 @@
+import collections
+import hmac
+
+
+class Keyring:
+    '''
+    the keys of validators by node name; the ballot message is signed by the
+    key of it's sender.
+
+    this is the local stand-in of the public key signature, the hmac of the
+    digest by the key of validator, so every holder of the keyring can also
+    sign; the signature scheme can be replaced by overriding `sign()` and
+    `verify()`.
+    '''
+
+    keys = None
+    digestmod = None
+
+    def __init__(self, keys, digestmod='sha256'):
+        self.keys = dict(keys)
+        self.digestmod = digestmod
+
+    def __contains__(self, name):
+        return name in self.keys
+
+    @classmethod
+    def generate(cls, names, secret, **kw):
+        '''
+        the keys are derived from `secret`, so the nodes in the separate
+        processes can make the same keyring
+        '''
+        if isinstance(secret, str):
+            secret = secret.encode()
+
+        return cls(
+            dict(map(lambda x: (x, hmac.new(secret, x.encode(), 'sha256').digest()), names)),
+            **kw
+        )
+
+    def sign(self, name, digest):
+        return hmac.new(self.keys[name], digest, self.digestmod).digest()
+
+    def verify(self, name, digest, signature):
+        key = self.keys.get(name)
+        if key is None or signature is None:
+            return False
+
+        return hmac.compare_digest(hmac.new(key, digest, self.digestmod).digest(), signature)
+
+
+class SignatureVerifier:
+    '''
+    verifies the signatures of ballot messages in batch; the verified
+    signatures are kept upto `size` by `(<sender>, <digest>)`, so the same
+    vote, which is received again through the relay nodes or in the
+    duplicated frames, is not verified again. the cached vote is trusted only
+    if it has the same signature.
+    '''
+
+    keyring = None
+    verified = None
+    size = None
+
+    def __init__(self, keyring, size=10000):
+        assert isinstance(keyring, Keyring)
+        assert size is None or size > 0
+
+        self.keyring = keyring
+        self.size = size
+        self.verified = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.verified)
+
+    def _verify(self, ballot_message):
+        digest = ballot_message.get_digest()
+        key = (ballot_message.node.name, digest)
+
+        if self.size is not None:
+            signature = self.verified.get(key)
+            if signature is not None and signature == ballot_message.signature:
+                self.verified.move_to_end(key)
+                self.hits += 1
+
+                return True
+
+        self.misses += 1
+        if not self.keyring.verify(ballot_message.node.name, digest, ballot_message.signature):
+            return False
+
+        if self.size is not None:
+            self.verified[key] = ballot_message.signature
+            while len(self.verified) > self.size:
+                self.verified.popitem(last=False)
+
+        return True
+
+    def verify(self, ballot_messages):
+        '''
+        returns the results of the ballot messages in the same order
+        '''
+        return list(map(self._verify, ballot_messages))
@@ -0,0 +1,339 @@
+import heapq
+import itertools
+import random
+
+from .network import (
+    BaseTransport,
+    Endpoint,
+)
+from .util import log
+
+
+class Handle:
+    '''
+    the scheduled event; the cancelled event is skipped when it's time comes
+    '''
+
+    __slots__ = ('when', 'sequence', 'fn', 'args', 'cancelled')
+
+    def __init__(self, when, sequence, fn, args):
+        self.when = when
+        self.sequence = sequence
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, handle):
+        return (self.when, self.sequence) < (handle.when, handle.sequence)
+
+    def __repr__(self):
+        return '<Handle: when=%f fn=%s cancelled=%s>' % (self.when, self.fn, self.cancelled)
+
+    def cancel(self):
+        self.cancelled = True
+
+        return
+
+
+class Simulation:
+    '''
+    discrete-event simulation in the virtual time; the events are kept in the
+    heap ordered by their time and the scheduled order, and run one by one
+    without waiting, so the same `seed` makes the same run.
+
+    `call_soon()` and `call_later()` are compatible with the asyncio event
+    loop, so it can be the `loop` of `Consensus`.
+    '''
+
+    now = None
+    rng = None
+    queue = None
+    events = None
+
+    def __init__(self, seed=0):
+        self.now = 0.0
+        self.rng = random.Random(seed)
+        self.queue = list()
+        self.sequence = itertools.count()
+        self.events = 0
+
+    def __len__(self):
+        return len(self.queue)
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, fn, *args):
+        assert when >= self.now
+
+        handle = Handle(when, next(self.sequence), fn, args)
+        heapq.heappush(self.queue, handle)
+
+        return handle
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(self.now + delay, fn, *args)
+
+    def call_soon(self, fn, *args):
+        return self.call_at(self.now, fn, *args)
+
+    def run(self, until=None, max_events=None, stop=None):
+        '''
+        runs the events upto the virtual time, `until`, or `max_events`
+        events, or until `stop()` returns `True`; returns the number of the
+        events run.
+        '''
+        count = 0
+        while self.queue:
+            if max_events is not None and count >= max_events:
+                break
+
+            if until is not None and self.queue[0].when > until:
+                self.now = until
+
+                break
+
+            handle = heapq.heappop(self.queue)
+            if handle.cancelled:
+                continue
+
+            self.now = handle.when
+            handle.fn(*handle.args)
+            count += 1
+
+            if stop is not None and stop():
+                break
+
+        self.events += count
+
+        return count
+
+
+class BaseLatency:
+    '''
+    the distribution of the delay of link in seconds
+    '''
+
+    name = None
+
+    def sample(self, rng):
+        raise NotImplementedError()
+
+
+class ConstantLatency(BaseLatency):
+    name = 'constant'
+
+    delay = None
+
+    def __init__(self, delay=0.001):
+        assert delay >= 0
+
+        self.delay = delay
+
+    def __repr__(self):
+        return '<ConstantLatency: delay=%s>' % self.delay
+
+    def sample(self, rng):
+        return self.delay
+
+
+class UniformLatency(BaseLatency):
+    name = 'uniform'
+
+    low = None
+    high = None
+
+    def __init__(self, low=0.001, high=0.005):
+        assert 0 <= low <= high
+
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        return '<UniformLatency: low=%s high=%s>' % (self.low, self.high)
+
+    def sample(self, rng):
+        return rng.uniform(self.low, self.high)
+
+
+class NormalLatency(BaseLatency):
+    '''
+    the negative delay is clipped to `minimum`
+    '''
+
+    name = 'normal'
+
+    mean = None
+    stddev = None
+    minimum = None
+
+    def __init__(self, mean=0.005, stddev=0.001, minimum=0):
+        assert stddev >= 0
+        assert minimum >= 0
+
+        self.mean = mean
+        self.stddev = stddev
+        self.minimum = minimum
+
+    def __repr__(self):
+        return '<NormalLatency: mean=%s stddev=%s>' % (self.mean, self.stddev)
+
+    def sample(self, rng):
+        return max(self.minimum, rng.gauss(self.mean, self.stddev))
+
+
+class ExponentialLatency(BaseLatency):
+    '''
+    `minimum` and the exponential delay of `mean`, the long tail
+    '''
+
+    name = 'exponential'
+
+    mean = None
+    minimum = None
+
+    def __init__(self, mean=0.005, minimum=0):
+        assert mean > 0
+        assert minimum >= 0
+
+        self.mean = mean
+        self.minimum = minimum
+
+    def __repr__(self):
+        return '<ExponentialLatency: mean=%s minimum=%s>' % (self.mean, self.minimum)
+
+    def sample(self, rng):
+        return self.minimum + rng.expovariate(1 / self.mean)
+
+
+LATENCIES = dict(map(
+    lambda x: (x.name, x),
+    (ConstantLatency, UniformLatency, NormalLatency, ExponentialLatency),
+))
+
+
+def get_latency(name, *a, **kw):
+    return LATENCIES[name](*a, **kw)
+
+
+class SimulatedNetwork:
+    '''
+    delivers the frames between `SimulatedTransport`s after the delay of the
+    link; the latency of link, `(<source name>, <destination name>)`, can be
+    set by `set_latency()`, the other links have `latency`. like the tcp
+    connection, the frames of the same link are delivered in the sent order
+    if `fifo`.
+    '''
+
+    simulation = None
+    latency = None
+    fifo = None
+
+    transports = None
+    links = None
+    last_delivery = None
+
+    frames = None
+    bytes = None
+
+    def __init__(self, simulation, latency=None, fifo=True):
+        assert isinstance(simulation, Simulation)
+        assert isinstance(latency, BaseLatency) if latency is not None else True
+
+        self.simulation = simulation
+        self.latency = ConstantLatency() if latency is None else latency
+        self.fifo = fifo
+
+        self.transports = dict()
+        self.links = dict()
+        self.last_delivery = dict()
+
+        self.frames = 0
+        self.bytes = 0
+
+    def register(self, transport):
+        assert isinstance(transport, SimulatedTransport)
+
+        self.transports[transport.endpoint.uri] = transport
+
+        return
+
+    def set_latency(self, source, destination, latency):
+        assert isinstance(latency, BaseLatency)
+
+        self.links[(source, destination)] = latency
+
+        return
+
+    def get_latency(self, source, destination):
+        return self.links.get((source, destination), self.latency)
+
+    def deliver(self, source, endpoint, data):
+        transport = self.transports.get(endpoint.uri)
+        if transport is None:
+            log.transport.error('%s: unknown endpoint: %s', source, endpoint.uri)
+
+            return
+
+        self.frames += 1
+        self.bytes += len(data)
+
+        link = (source, transport.name)
+        when = self.simulation.now + self.get_latency(*link).sample(self.simulation.rng)
+        if self.fifo:
+            when = max(when, self.last_delivery.get(link, when))
+            self.last_delivery[link] = when
+
+        self.simulation.call_at(when, transport.receive, data)
+
+        return
+
+
+class SimulatedTransport(BaseTransport):
+    '''
+    the transport in `SimulatedNetwork`; the frames are not framed, every
+    delivered data is one frame.
+    '''
+
+    network = None
+
+    def __init__(self, name, endpoint, network, codec=None, metrics=None):
+        assert isinstance(network, SimulatedNetwork)
+
+        super(SimulatedTransport, self).__init__(name, endpoint, codec=codec, metrics=metrics)
+
+        self.network = network
+
+    def start(self, *a, **kw):
+        super(SimulatedTransport, self).start(*a, **kw)
+
+        self.network.register(self)
+
+        return
+
+    def receive(self, data):
+        self.count_received(1, len(data))
+        self.message_received_callback((data,))
+
+        return
+
+    def send(self, endpoint, data):
+        assert isinstance(endpoint, Endpoint)
+
+        if isinstance(data, str):
+            data = data.encode()
+
+        self.count_sent(1, len(data))
+        self.network.deliver(self.name, endpoint, data)
+
+        return
+
+    def multicast(self, endpoints, data):
+        if isinstance(data, str):
+            data = data.encode()
+
+        self.count_sent(len(endpoints), len(data) * len(endpoints))
+        for endpoint in endpoints:
+            self.network.deliver(self.name, endpoint, data)
+
+        return
@@ -55,14 +55,89 @@ log = Log()
 
 
 class BaseEnum(enum.Enum):
+    '''
+    the lookup tables of value, name and wire code are built once at the
+    first lookup; the members get the small integer wire code by the defined
+    order and the next member, so the lookups do not scan the members.
+    '''
+
+    @classmethod
+    def build_tables(cls):
+        members = list(cls)
+
+        cls._values = dict(map(lambda x: (x.value, x), members))
+        cls._names = dict(map(lambda x: (x.name, x), members))
+        cls._codes = (None,) + tuple(members)  # the wire code starts from 1
+
+        for code, (member, next_member) in enumerate(zip(members, members[1:] + [None]), 1):
+            member._code = code
+            member._next = next_member
+
+        return
+
     @classmethod
     def from_value(cls, value):
-        for i in cls:
-            if i.value == value:
-                return i
+        try:
+            values = cls._values
+        except AttributeError:
+            cls.build_tables()
+            values = cls._values
 
-        return None
+        return values.get(value)
 
     @classmethod
     def from_name(cls, name):
-        return getattr(cls, name)
+        try:
+            names = cls._names
+        except AttributeError:
+            cls.build_tables()
+            names = cls._names
+
+        try:
+            return names[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    @classmethod
+    def from_code(cls, code):
+        try:
+            codes = cls._codes
+        except AttributeError:
+            cls.build_tables()
+            codes = cls._codes
+
+        if code < 1 or code >= len(codes):
+            return None
+
+        return codes[code]
+
+    @property
+    def code(self):
+        try:
+            return self._code
+        except AttributeError:
+            self.build_tables()
+
+            return self._code
+
+    def get_next(self):
+        '''
+        the next member by the defined order
+        '''
+        try:
+            return self._next
+        except AttributeError:
+            self.build_tables()
+
+            return self._next
+
+
+def iter_bits(n):
+    '''
+    yields the indexes of set bits
+    '''
+    while n:
+        lowest = n & -n
+        yield lowest.bit_length() - 1
+
+        n ^= lowest
@@ -0,0 +1,240 @@
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import hmac
+
+from .util import log
+
+
+class BaseValidator:
+    '''
+    validator checks the messages in batch; `validate()` returns the results,
+    `True` if valid, of the given messages in the same order. the validator
+    can run in the worker of `concurrent.futures.Executor`, so it must be
+    picklable to run in `ProcessPoolExecutor`.
+    '''
+
+    name = None
+
+    def sign(self, data):
+        '''
+        the client makes the data of message to be validated
+        '''
+        return data
+
+    def validate(self, messages):
+        raise NotImplementedError()
+
+
+class NoneValidator(BaseValidator):
+    '''
+    every message is valid
+    '''
+
+    name = 'none'
+
+    def validate(self, messages):
+        return [True] * len(messages)
+
+
+class HMACValidator(BaseValidator):
+    '''
+    the local stand-in of signature scheme; the data of message ends with the
+    hmac of it's payload, `<payload>.<hex digest>`, signed by the shared
+    `key`. the hmac is repeated `rounds` times to simulate the expensive
+    verification.
+    '''
+
+    name = 'hmac'
+    separator = '.'
+
+    key = None
+    digestmod = None
+    rounds = None
+
+    def __init__(self, key=b'simple-fba', digestmod='sha256', rounds=1):
+        assert rounds > 0
+
+        self.key = key
+        self.digestmod = digestmod
+        self.rounds = rounds
+
+    def _digest(self, payload):
+        digest = payload.encode()
+        for _ in range(self.rounds):
+            digest = hmac.new(self.key, digest, self.digestmod).digest()
+
+        return digest.hex()
+
+    def sign(self, data):
+        return data + self.separator + self._digest(data)
+
+    def _validate(self, message):
+        for i in message.get_messages():
+            payload, separator, signature = i.data.rpartition(self.separator)
+            if not separator:
+                return False
+
+            if not hmac.compare_digest(signature, self._digest(payload)):
+                return False
+
+        return True
+
+    def validate(self, messages):
+        return list(map(self._validate, messages))
+
+
+VALIDATORS = dict(map(lambda x: (x.name, x), (NoneValidator, HMACValidator)))
+
+
+def get_validator(name, **kw):
+    return VALIDATORS[name](**kw)
+
+
+class ValidationQueue:
+    '''
+    the messages are validated in batches of upto `batch_size` by
+    `validator`. with `executor`, the messages requested in the same loop tick
+    are validated in the executor and the callbacks are called in the loop
+    when the results arrive; without `executor`, the message is validated at
+    once in the loop.
+
+    the results are kept upto `cache_size` by `message_id`, so the message is
+    validated once for all the states of ballot.
+
+    the flush and the results are scheduled in `loop`, `Consensus` sets it's
+    own loop if it is not given. the loop without `run_in_executor()`, like
+    `simulation.Simulation`, waits for the executor, so the results are
+    handed over in the same virtual time.
+    '''
+
+    validator = None
+    executor = None
+    batch_size = None
+    cache_size = None
+    loop = None
+
+    results = None
+    waiting = None
+    queue = None
+    flush_handle = None
+
+    def __init__(self, validator=None, executor=None, batch_size=100, cache_size=10000, loop=None):
+        assert isinstance(validator, BaseValidator) if validator is not None else True
+        assert batch_size > 0
+        assert cache_size > 0
+
+        self.validator = NoneValidator() if validator is None else validator
+        self.executor = executor
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.loop = loop
+
+        self.results = collections.OrderedDict()
+        self.waiting = dict()
+        self.queue = list()
+
+    def get_loop(self):
+        return asyncio.get_event_loop() if self.loop is None else self.loop
+
+    def get_result(self, message):
+        '''
+        `None` if the message is not validated yet
+        '''
+        return self.results.get(message.message_id)
+
+    def validate(self, message):
+        '''
+        the result of message; if the message is not validated yet, it is
+        validated at once in the loop
+        '''
+        result = self.get_result(message)
+        if result is None:
+            result = self.validator.validate([message])[0]
+            self._set_result(message, result)
+
+        return result
+
+    def request(self, message, callback):
+        '''
+        `callback(message, result)` is called when the message is validated;
+        if the result is already known, it is called at once.
+        '''
+        result = self.get_result(message)
+        if result is not None:
+            callback(message, result)
+
+            return
+
+        callbacks = self.waiting.get(message.message_id)
+        if callbacks is not None:
+            callbacks.append(callback)
+
+            return
+
+        self.waiting[message.message_id] = [callback]
+        self.queue.append(message)
+
+        if self.executor is None:
+            self.flush()
+
+            return
+
+        if self.flush_handle is None:
+            self.flush_handle = self.get_loop().call_soon(self.flush)
+
+        return
+
+    def flush(self):
+        self.flush_handle = None
+
+        loop = self.get_loop() if self.executor is not None else None
+        while self.queue:
+            batch = self.queue[:self.batch_size]
+            del self.queue[:self.batch_size]
+
+            if self.executor is None:
+                self._done(batch, self.validator.validate(batch))
+
+                continue
+
+            if hasattr(loop, 'run_in_executor'):
+                future = loop.run_in_executor(self.executor, self.validator.validate, batch)
+                future.add_done_callback(functools.partial(self._validated, batch))
+
+                continue
+
+            future = self.executor.submit(self.validator.validate, batch)
+            concurrent.futures.wait((future,))
+            loop.call_soon(self._validated, batch, future)
+
+        return
+
+    def _validated(self, batch, future):
+        try:
+            results = future.result()
+        except Exception as e:
+            log.consensus.error('failed to validate messages: %d messages: %s', len(batch), e)
+            results = [False] * len(batch)
+
+        self._done(batch, results)
+
+        return
+
+    def _set_result(self, message, result):
+        self.results[message.message_id] = result
+        while len(self.results) > self.cache_size:
+            self.results.popitem(last=False)
+
+        return
+
+    def _done(self, batch, results):
+        for message, result in zip(batch, results):
+            self._set_result(message, result)
+
+            for callback in self.waiting.pop(message.message_id, ()):
+                callback(message, result)
+
+        return
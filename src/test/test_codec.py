@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from simple_fba.codec import (
+    BinaryCodec,
+    JSONCodec,
+)
+from simple_fba.fba_consensus import (
+    BallotAggregate,
+    BallotMessage,
+    BallotVoteResult,
+    State,
+)
+from simple_fba.network import (
+    Message,
+    MessageBatch,
+    Node,
+)
+
+
+def new_ballot_message(message):
+    return BallotMessage(Node('n1', 'sock://memory:1', None), State.init, message, BallotVoteResult.agree, slot=1)
+
+
+def test_binary_round_trip():
+    codec = BinaryCodec()
+    ballot_message = new_ballot_message(MessageBatch.new([Message.new('a', node='client0'), Message.new('b', node='client0')]))
+
+    decoded = codec.decode(codec.encode(ballot_message))
+
+    assert decoded.node.name == 'n1'
+    assert decoded.slot == 1
+    assert decoded.message == ballot_message.message
+    assert decoded.message.verify()
+
+
+def test_binary_invalid_utf8():
+    codec = BinaryCodec()
+    data = codec.encode(Message.new('data'), Node('client0', None, None))
+
+    # the node name, `client0`, is replaced by the invalid utf-8 of the same length
+    offset = data.index(b'client0')
+    data = data[:offset] + b'\xff' * len(b'client0') + data[offset + len(b'client0'):]
+
+    with pytest.raises(BinaryCodec.InvalidFrameError):
+        codec.decode(data)
+
+
+@pytest.mark.parametrize('codec', (BinaryCodec(), JSONCodec()))
+@pytest.mark.parametrize('node', (None, ''))
+def test_message_without_node(codec, node):
+    data = codec.encode(Message.new('data', node=node))
+
+    with pytest.raises(Message.InvalidMessageError):
+        codec.decode(data)
+
+
+def test_binary_empty_batch():
+    codec = BinaryCodec()
+
+    buf = bytearray(codec.header.size)
+    buf += codec.ballot_header.pack(State.init.code, BallotVoteResult.agree.code, 1)
+    codec._pack_string(buf, 'n1')
+    buf += codec.u8.pack(codec.kind_batch)
+    codec._pack_id(buf, Message.new('a').message_id)
+    buf += bytes(codec.hash_size)
+    buf += codec.u32.pack(0)  # no messages
+    codec._pack_signature(buf, None)
+    codec.header.pack_into(buf, 0, len(buf) - codec.u32.size, codec.version, 2)
+
+    with pytest.raises(BinaryCodec.InvalidFrameError):
+        codec.decode(bytes(buf))
+
+
+@pytest.mark.parametrize('type_name', (['message'], {'message': 1}, 1, None))
+def test_json_invalid_type_name(type_name):
+    data = ('{"type_name": %s, "node": "client0", "message": {}}\r\n\r\n' % json.dumps(type_name)).encode()
+
+    with pytest.raises(Message.InvalidMessageError):
+        JSONCodec().decode(data)
+
+
+@pytest.mark.parametrize('slot', (-1, 1 << 64, '1', 1.0, True, None))
+def test_json_aggregate_invalid_slot(slot):
+    message = Message.new('data', node='client0')
+    aggregate = BallotAggregate(Node('n1', 'sock://memory:1', None), 1, message, [
+        (Node('n2', 'sock://memory:2', None), State.sign, BallotVoteResult.agree, None),
+    ])
+    o = json.loads(aggregate.serialize())
+    o['slot'] = slot
+
+    with pytest.raises(Message.InvalidMessageError):
+        JSONCodec().decode(('%s\r\n\r\n' % json.dumps(o)).encode())
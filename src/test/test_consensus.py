@@ -0,0 +1,223 @@
+import pytest
+
+from simple_fba.codec import get_codec
+from simple_fba.fba_consensus import (
+    Consensus,
+    Storage,
+)
+from simple_fba.ledger import FileLedger
+from simple_fba.metrics import Registry
+from simple_fba.network import (
+    Message,
+    Node,
+    Quorum,
+)
+from simple_fba.signature import (
+    Keyring,
+    SignatureVerifier,
+)
+from simple_fba.simulation import (
+    ConstantLatency,
+    SimulatedNetwork,
+    SimulatedTransport,
+    Simulation,
+)
+
+
+class TestConsensus(Consensus):
+    __test__ = False
+
+    confirmed = None
+
+    def reached_all_confirm(self, ballot_message):
+        self.confirmed.append(ballot_message)
+
+        return
+
+
+class TestNetwork:
+    '''
+    the validators, `n0` .. `n<count - 1>`, in `SimulatedNetwork`; the
+    keyword arguments of `Consensus` are given to every node and `ledgers`
+    has the `FileLedger` directories by node name.
+    '''
+
+    __test__ = False
+
+    def __init__(self, count, trs=80, codec='binary', dissemination=Quorum.dissemination_flood, ledgers=None, **kw):
+        self.simulation = Simulation()
+        self.network = SimulatedNetwork(self.simulation, latency=ConstantLatency(0.001))
+        self.trs = trs
+        self.codec = codec
+        self.dissemination = dissemination
+        self.ledgers = dict() if ledgers is None else ledgers
+        self.kw = kw
+
+        self.names = list(map(lambda x: 'n%d' % x, range(count)))
+        self.endpoints = dict(map(lambda x: (x[1], 'sock://memory:%d' % x[0]), enumerate(self.names)))
+        self.client = Node('client0', None, None)
+
+        self.consensuses = dict()
+        for name in self.names:
+            self.start(name)
+
+    def start(self, name, **kw):
+        quorum = Quorum(
+            self.trs,
+            list(map(lambda x: Node(x, self.endpoints[x], None), filter(lambda x: x != name, self.names))),
+            dissemination=self.dissemination,
+        )
+        node = Node(name, self.endpoints[name], quorum)
+
+        storage = None
+        if name in self.ledgers:
+            storage = Storage(node, ledger=FileLedger(self.ledgers[name]))
+
+        transport = SimulatedTransport(name, self.endpoints[name], self.network, codec=get_codec(self.codec))
+        consensus = TestConsensus(
+            node,
+            quorum,
+            transport,
+            storage=storage,
+            loop=self.simulation,
+            **dict(self.kw, **kw)
+        )
+        consensus.confirmed = list()
+        transport.start(consensus.receive_list)
+
+        self.consensuses[name] = consensus
+
+        return consensus
+
+    def stop(self, name):
+        '''
+        the frames to the stopped node are dropped
+        '''
+        consensus = self.consensuses.pop(name)
+        self.network.transports.pop(consensus.transport.endpoint.uri)
+        consensus.storage.close()
+
+        return consensus
+
+    def inject(self, data, name='n0'):
+        message = Message.new(data, node=self.client.name)
+        consensus = self.consensuses[name]
+        consensus.transport.send(consensus.node.endpoint, consensus.transport.codec.encode(message, self.client))
+
+        return message
+
+    def run(self, until=10):
+        self.simulation.run(until=self.simulation.now + until)
+
+        return
+
+    def is_confirmed(self, message, names=None):
+        return all(map(
+            lambda x: self.consensuses[x].storage.is_exists(message),
+            self.consensuses if names is None else names,
+        ))
+
+
+def test_confirm_across_slots():
+    network = TestNetwork(4)
+    messages = list()
+    for i in range(3):
+        messages.append(network.inject('m%d' % i))
+        network.run()
+
+    assert all(map(network.is_confirmed, messages))
+    for consensus in network.consensuses.values():
+        assert consensus.committed_slot == 3
+        assert len(consensus.confirmed) == 3
+
+
+def test_restart_from_ledger(tmp_path):
+    network = TestNetwork(4, ledgers=dict(n3=str(tmp_path)))
+    for i in range(3):
+        network.inject('m%d' % i)
+        network.run()
+
+    network.stop('n3')
+    restarted = network.start('n3')
+    assert restarted.committed_slot == 3
+
+    message = network.inject('after restart')
+    network.run()
+
+    assert network.is_confirmed(message)
+    assert restarted.committed_slot == 4
+
+
+@pytest.mark.parametrize('codec', ('binary', 'json'))
+def test_catch_up_behind_node(codec):
+    # 4 of 5 validators make the threshold, so the others go on without `n4`
+    network = TestNetwork(5, codec=codec)
+    network.stop('n4')
+
+    missed = list(map(lambda x: network.inject('m%d' % x), range(3)))
+    network.run()
+    assert all(map(lambda x: network.is_confirmed(x), missed))
+
+    behind = network.start('n4')
+    message = network.inject('after catch up')
+    network.run()
+
+    assert all(map(lambda x: behind.storage.is_exists(x), missed))
+    assert behind.committed_slot == network.consensuses['n0'].committed_slot
+    assert len(behind.future_ballot_messages) == 0
+
+    message = network.inject('next')
+    network.run()
+    assert network.is_confirmed(message)
+
+
+def test_batch_caps():
+    network = TestNetwork(4, batch_size=2)
+    messages = list(map(lambda x: network.inject('m%d' % x), range(5)))
+    network.run()
+
+    assert all(map(network.is_confirmed, messages))
+    confirmed = network.consensuses['n0'].confirmed
+    assert sum(map(lambda x: len(x.message.get_messages()), confirmed)) == 5
+    assert all(map(lambda x: len(x.message.get_messages()) <= 2, confirmed))
+
+
+def test_batch_bytes_cap():
+    # 3 characters, but 5 bytes of utf-8, so only one message fits in the batch
+    network = TestNetwork(4, batch_bytes=8)
+    messages = list(map(lambda x: network.inject('\u00e9\u00e9%d' % x), range(3)))
+    network.run()
+
+    assert all(map(network.is_confirmed, messages))
+    for consensus in network.consensuses.values():
+        assert consensus.committed_slot == 3
+        assert all(map(lambda x: len(x.message.get_messages()) == 1, consensus.confirmed))
+
+
+def test_relay_quorum():
+    network = TestNetwork(7, dissemination=Quorum.dissemination_relay, pipeline_depth=2)
+    messages = list()
+    for i in range(3):
+        messages.append(network.inject('m%d' % i, name='n%d' % i))
+        network.run()
+
+    assert all(map(network.is_confirmed, messages))
+    assert all(map(lambda x: x.relay_nodes is not None, network.consensuses.values()))
+
+
+def test_signature_rejection():
+    names = list(map(lambda x: 'n%d' % x, range(5)))
+    network = TestNetwork(5, signature_verifier=SignatureVerifier(Keyring.generate(names, 'secret')))
+
+    # `n4` signs by the wrong keys, so it's votes are rejected by the others
+    # and it rejects theirs
+    network.stop('n4')
+    metrics = Registry()
+    network.start('n4', signature_verifier=SignatureVerifier(Keyring.generate(names, 'wrong')), metrics=metrics)
+
+    message = network.inject('signed')
+    network.run()
+
+    assert network.is_confirmed(message, names=names[:4])
+    assert not network.consensuses['n4'].storage.is_exists(message)
+    assert metrics.get('simple_fba_consensus_rejected_total').labels('n4', 'signature').value > 0
@@ -0,0 +1,137 @@
+import os
+
+from simple_fba.ledger import (
+    FileLedger,
+    SequenceTable,
+)
+from simple_fba.network import Message
+
+
+def new_message(data):
+    return Message.new(data, node='client0')
+
+
+def new_messages(count):
+    return list(map(lambda x: new_message('m%d' % x), range(count)))
+
+
+def append_all(ledger, messages):
+    for message in messages:
+        ledger.append(message)
+
+    ledger.sync()
+
+    return
+
+
+def test_reopen_without_replay(tmp_path):
+    messages = new_messages(10)
+    ledger = FileLedger(str(tmp_path))
+    append_all(ledger, messages)
+    ledger.close()
+
+    ledger = FileLedger(str(tmp_path))
+    assert len(ledger) == 10
+    assert ledger.get(messages[3].message_id) == messages[3]
+    assert ledger.get_sequence(messages[7].message_id) == 7
+    assert ledger.get_by_hash(messages[5].hash_id) == [messages[5]]
+    assert not ledger.has(Message.new('missing').message_id)
+
+    ledger.close()
+
+
+def test_same_hash_id(tmp_path):
+    first = new_message('same')
+    second = new_message('same')
+
+    ledger = FileLedger(str(tmp_path))
+    append_all(ledger, (first, second))
+
+    assert ledger.get_by_hash(first.hash_id) == [first, second]
+
+    ledger.close()
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    messages = new_messages(5)
+    ledger = FileLedger(str(tmp_path))
+    append_all(ledger, messages)
+
+    # not synced, so the record is after the committed index
+    ledger.append(new_message('uncommitted'))
+    ledger.segment.flush()
+    size = ledger.size
+
+    with open(os.path.join(str(tmp_path), FileLedger.segment_name), 'ab') as f:
+        f.write(b'\x00\x00\x01\x00torn')
+
+    ledger = FileLedger(str(tmp_path))
+    assert len(ledger) == 6
+    assert ledger.get_by_sequence(5).data == 'uncommitted'
+    assert os.path.getsize(os.path.join(str(tmp_path), FileLedger.segment_name)) == size
+
+    ledger.append(new_message('after'))
+    ledger.close()
+
+    ledger = FileLedger(str(tmp_path))
+    assert len(ledger) == 7
+    assert ledger.get_by_sequence(6).data == 'after'
+
+    ledger.close()
+
+
+def test_truncated_segment(tmp_path):
+    messages = new_messages(5)
+    ledger = FileLedger(str(tmp_path))
+    append_all(ledger, messages)
+    offset, _, _, _ = ledger._entry(3)
+    ledger.close()
+
+    # the committed records are truncated by hand
+    with open(os.path.join(str(tmp_path), FileLedger.segment_name), 'ab') as f:
+        f.truncate(offset + 2)
+
+    ledger = FileLedger(str(tmp_path))
+    assert len(ledger) == 3
+    assert ledger.has(messages[2].message_id)
+    assert not ledger.has(messages[3].message_id)
+    assert ledger.get(messages[4].message_id) is None
+
+    # the dropped sequence is used by the new record
+    ledger.append(messages[4])
+    assert ledger.get_sequence(messages[4].message_id) == 3
+    assert ledger.get(messages[3].message_id) is None
+
+    ledger.close()
+
+
+def test_index_and_table_growth(tmp_path, monkeypatch):
+    monkeypatch.setattr(FileLedger, 'index_chunk', 16)
+    monkeypatch.setattr(SequenceTable, 'initial_capacity', 8)
+
+    messages = new_messages(100)
+    ledger = FileLedger(str(tmp_path), sync_every=7)
+    append_all(ledger, messages)
+
+    assert ledger.capacity >= 100
+    assert ledger.message_table.capacity >= 200
+    ledger.close()
+
+    ledger = FileLedger(str(tmp_path))
+    assert all(map(lambda x: ledger.get(x.message_id) == x, messages))
+
+    ledger.close()
+
+
+def test_missing_table_is_rebuilt(tmp_path):
+    messages = new_messages(10)
+    ledger = FileLedger(str(tmp_path))
+    append_all(ledger, messages)
+    ledger.close()
+
+    os.unlink(os.path.join(str(tmp_path), FileLedger.message_table_name))
+
+    ledger = FileLedger(str(tmp_path))
+    assert all(map(lambda x: ledger.get_sequence(x.message_id) == messages.index(x), messages))
+
+    ledger.close()
@@ -0,0 +1,56 @@
+import struct
+
+import pytest
+
+from simple_fba.network import (
+    BaseFramer,
+    DelimiterFramer,
+    LengthPrefixFramer,
+    Message,
+    MessageBatch,
+)
+
+
+def test_length_prefix_split():
+    framer = LengthPrefixFramer()
+    data = struct.pack('>I', 3) + b'abc' + struct.pack('>I', 2) + b'de'
+
+    frames = framer.feed(data[:5]) + framer.feed(data[5:9]) + framer.feed(data[9:])
+
+    assert list(map(bytes, frames)) == [data[:7], data[7:]]
+
+
+def test_length_prefix_too_large():
+    framer = LengthPrefixFramer(max_frame_size=100)
+
+    with pytest.raises(BaseFramer.FrameTooLargeError):
+        framer.feed(struct.pack('>I', 0xffffffff) + b'a')
+
+    # the prefix split across the received data
+    framer = LengthPrefixFramer(max_frame_size=100)
+    assert framer.feed(struct.pack('>I', 200)[:2]) == []
+
+    with pytest.raises(BaseFramer.FrameTooLargeError):
+        framer.feed(struct.pack('>I', 200)[2:] + b'a')
+
+    # the framer is usable after the oversized frame was dropped
+    assert list(map(bytes, framer.feed(struct.pack('>I', 1) + b'b'))) == [struct.pack('>I', 1) + b'b']
+
+
+def test_delimiter_unterminated_too_large():
+    framer = DelimiterFramer(max_frame_size=100)
+    framer.feed(b'a' * 60)
+
+    with pytest.raises(BaseFramer.FrameTooLargeError):
+        framer.feed(b'a' * 60)
+
+    assert list(map(bytes, framer.feed(b'b\r\n\r\n'))) == [b'b']
+
+
+def test_message_size_in_bytes():
+    message = Message.new('\u00e9' * 10, node='client0')
+
+    assert message.size == 20
+    assert message.size == len(message.data.encode())
+    assert Message.new('abc').size == 3
+    assert MessageBatch.new([message, Message.new('abc')]).size == 23